@@ -0,0 +1,51 @@
+"""Generate directory trees of empty files for the benchmarks."""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import tempfile
+
+
+def tmpfs_root() -> str | None:
+    """Return a tmpfs directory to build trees in, if one is available.
+
+    Building on tmpfs keeps disk latency out of the measurements.
+    """
+
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def temporary_tree() -> tempfile.TemporaryDirectory[str]:
+    """Return a temporary directory (on tmpfs when possible) for a tree."""
+
+    return tempfile.TemporaryDirectory(prefix="fm-bench-", dir=tmpfs_root())
+
+
+def build_tree(root: pathlib.Path, files: int, depth: int, fanout: int) -> int:
+    """Spread the given number of empty files across a tree of directories.
+
+    The tree has fanout subdirectories per directory down to the given depth,
+    and files are dealt round-robin into every directory. Returns the number of
+    directories in the tree, including root.
+    """
+
+    dirs: list[str] = [str(root)]
+    level: list[str] = [str(root)]
+    for _ in range(depth):
+        level = [os.path.join(d, f"dir{i}") for d in level for i in range(fanout)]
+        for d in level:
+            os.mkdir(d)
+        dirs.extend(level)
+
+    for n in range(files):
+        # Opening with O_CREAT is much cheaper than pathlib's touch()
+        os.close(
+            os.open(
+                os.path.join(dirs[n % len(dirs)], f"IMG_{n:07d}.jpg"),
+                os.O_CREAT | os.O_WRONLY,
+                0o644,
+            )
+        )
+
+    return len(dirs)
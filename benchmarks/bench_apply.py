@@ -0,0 +1,87 @@
+"""Compare applying rename rules name by name with applying them to a batch.
+
+Names are generated in memory, so only rule application is measured: building
+a pathlib.Path per name and step (as renaming once did), RenamePlan.apply() per
+name, and RenamePlan.apply_many() over the whole batch.
+
+Usage: python benchmarks/bench_apply.py [--names N] [--repeat R]
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+import pathlib
+import re
+import time
+import tracemalloc
+
+from filename_manager.filename_manager import RenamePlan
+
+
+def apply_paths(plan: RenamePlan, names: list[str]) -> list[str]:
+    """Apply plan's rules through a pathlib.Path per name, as modify_filename did."""
+
+    new_names: list[str] = []
+    for name in names:
+        path = pathlib.PurePath(name)
+        if plan.extold and plan.extnew and path.suffix == plan.extold:
+            path = pathlib.PurePath(f"{path.stem}{plan.extnew}")
+        if plan.pattern is not None:
+            path = path.with_name(re.sub(plan.pattern, plan.sub or "", path.name))
+        if plan.prefix:
+            path = pathlib.PurePath(f"{plan.prefix}{path.name}")
+        if plan.suffix:
+            path = pathlib.PurePath(f"{path.stem}{plan.suffix}{path.suffix}")
+        new_names.append(str(path))
+    return new_names
+
+
+def measure(
+    function: Callable[[list[str]], list[str]], names: list[str], repeat: int
+) -> tuple[float, int]:
+    """Return the best time of function over repeat runs and its peak memory."""
+
+    best: float = float("inf")
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function(names)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(names)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    plan = RenamePlan(
+        prefix="pre_", suffix="_suf", extold="jpg", extnew="png", regex="^IMG_", sub=""
+    )
+    names: list[str] = [f"IMG_{i:07d}.jpg" for i in range(args.names)]
+
+    assert apply_paths(plan, names[:100]) == plan.apply_many(names[:100])
+
+    baseline: float | None = None
+    for label, function in (
+        ("pathlib", lambda names: apply_paths(plan, names)),
+        ("apply", lambda names: [plan.apply(name) for name in names]),
+        ("apply_many", plan.apply_many),
+    ):
+        elapsed, peak = measure(function, names, args.repeat)
+        if baseline is None:
+            baseline = elapsed
+        print(
+            f"{label:<10} {elapsed * 1e9 / len(names):,.0f} ns/name, "
+            f"peak {peak / 2**20:,.1f} MiB ({baseline / elapsed:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare renaming a huge flat directory whole with renaming it in chunks.
+
+Reports the time and the peak memory traced by tracemalloc for each run.
+
+Usage: python benchmarks/bench_chunked.py [--files N] [--chunk-size C ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import pathlib
+import time
+import tracemalloc
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.filename_manager import RenamePlan, iter_renames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500_000)
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[0, 10_000])
+    args = parser.parse_args()
+
+    for chunk_size in args.chunk_size:
+        with temporary_tree() as tmp:
+            root = pathlib.Path(tmp)
+            build_tree(root, args.files, depth=0, fanout=0)
+
+            tracemalloc.start()
+            start: float = time.perf_counter()
+            # Discard results as they come, as the CLI does
+            collections.deque(
+                iter_renames(root, RenamePlan(prefix="new_"), chunk_size=chunk_size),
+                maxlen=0,
+            )
+            elapsed: float = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        print(
+            f"chunk_size={chunk_size:<7} {args.files:,} files in {elapsed:.3f}s, "
+            f"peak {peak / 2**20:,.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Compare renaming by path with renaming relative to a directory descriptor.
+
+Builds a deep, narrow tree so that resolving each full path is a real part of
+every rename, then executes the same renames both ways.
+
+Usage: python benchmarks/bench_dirfd.py [--files N] [--depth D] [--fanout F]
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import time
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.dirfd import DirectoryFdPool
+from filename_manager.filename_manager import RenamePlan, execute_renames, plan_renames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--depth", type=int, default=24)
+    parser.add_argument("--fanout", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    if not DirectoryFdPool.supported:
+        parser.exit(1, "renaming relative to a descriptor is not supported here\n")
+
+    baseline: float | None = None
+    for label, supported in (("path", False), ("dir_fd", True)):
+        DirectoryFdPool.supported = supported
+        with temporary_tree() as tmp:
+            root = pathlib.Path(tmp)
+            dirs: int = build_tree(root, args.files, args.depth, args.fanout)
+            renames = plan_renames(root, RenamePlan(prefix="new_"))
+
+            start: float = time.perf_counter()
+            execute_renames(renames, args.workers)
+            elapsed: float = time.perf_counter() - start
+        if baseline is None:
+            baseline = elapsed
+
+        print(
+            f"{label:<7} {len(renames):,} renames in {dirs} directories in "
+            f"{elapsed:.3f}s ({len(renames) / elapsed:,.0f} renames/s, "
+            f"{baseline / elapsed:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure rename throughput of execute_renames as the worker count grows.
+
+A fixed delay is injected into every os.replace and os.rename call to stand in for the round
+trip of a network (NFS/FUSE) filesystem.
+
+Usage: python benchmarks/bench_execute.py [--files N] [--dirs D] [--latency MS]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import pathlib
+import time
+from typing import Any
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.filename_manager import RenamePlan, execute_renames, plan_renames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2_000)
+    parser.add_argument("--dirs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=2.0, help="milliseconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    delay: float = args.latency / 1000
+    original_replace = os.replace
+    original_rename = os.rename
+
+    def slow_replace(*replace_args: Any, **kwargs: Any) -> None:
+        time.sleep(delay)
+        original_replace(*replace_args, **kwargs)
+
+    def slow_rename(*rename_args: Any, **kwargs: Any) -> None:
+        time.sleep(delay)
+        original_rename(*rename_args, **kwargs)
+
+    for workers in args.workers:
+        with temporary_tree() as tmp:
+            root = pathlib.Path(tmp)
+            build_tree(root, args.files, depth=1, fanout=args.dirs)
+
+            renames = plan_renames(root, RenamePlan(prefix="new_"))
+
+            os.replace, os.rename = slow_replace, slow_rename
+            try:
+                start = time.perf_counter()
+                execute_renames(renames, workers)
+                elapsed = time.perf_counter() - start
+            finally:
+                os.replace, os.rename = original_replace, original_rename
+
+        print(
+            f"workers={workers:<3} {len(renames)} renames in {elapsed:.3f}s "
+            f"({len(renames) / elapsed:,.0f} renames/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare applying rename rules to repeating names with and without a RuleMemo.
+
+Names are generated in memory as camera dumps would name them, so that each
+basename repeats across many directories, and are handed over a directory-sized
+batch at a time. Rules are applied with RenamePlan.apply_many(), through a
+MemoizedPlan with an empty memo (cold) and again with the filled memo (warm,
+as a later run loading a saved memo would be). An expensive regex and a cheap
+prefix are measured, since the memo only pays off for rules costing more than
+a lookup.
+
+Usage: python benchmarks/bench_memo.py [--names N] [--unique U] [--batch B]
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+import time
+
+from bench_processes import DEFAULT_REGEX
+
+from filename_manager.filename_manager import RenamePlan
+from filename_manager.memo import MemoizedPlan, RuleMemo
+
+
+def measure(
+    apply_many: Callable[[list[str]], list[str]], batches: list[list[str]]
+) -> float:
+    """Return the time taken to apply rules to every batch."""
+
+    start: float = time.perf_counter()
+    for batch in batches:
+        apply_many(batch)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--unique", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=1_000)
+    args = parser.parse_args()
+
+    names: list[str] = [f"IMG_{i % args.unique:07d}.jpg" for i in range(args.names)]
+    batches: list[list[str]] = [
+        names[i : i + args.batch] for i in range(0, len(names), args.batch)
+    ]
+
+    for label, plan in (
+        ("regex", RenamePlan(regex=DEFAULT_REGEX, sub="photo_")),
+        ("prefix", RenamePlan(prefix="pre_")),
+    ):
+        memoized = MemoizedPlan(plan, RuleMemo(args.unique))
+        assert memoized.apply_many(names[:100]) == plan.apply_many(names[:100])
+        memoized = MemoizedPlan(plan, RuleMemo(args.unique))
+
+        plain: float = measure(plan.apply_many, batches)
+        cold: float = measure(memoized.apply_many, batches)
+        warm: float = measure(memoized.apply_many, batches)
+        for name, elapsed in (("plain", plain), ("cold", cold), ("warm", warm)):
+            print(
+                f"{label:<6} {name:<5} {elapsed * 1e9 / len(names):,.0f} ns/name "
+                f"({plain / elapsed:.2f}x)"
+            )
+        print(f"{label:<6} {memoized.memo!r}")
+
+
+if __name__ == "__main__":
+    main()
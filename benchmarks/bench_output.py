@@ -0,0 +1,56 @@
+"""Measure the cost of writing a record of every rename with --output.
+
+Writes the same results as records of each format, in batches, and as one
+print() per file for comparison, to a file on tmpfs when available.
+
+Usage: python benchmarks/bench_output.py [--results N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from _tree import temporary_tree
+
+from filename_manager.filename_manager import RENAMED, RenameResult
+from filename_manager.output import OUTPUT_FORMATS, RecordWriter
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    results: list[RenameResult] = [
+        RenameResult(
+            f"photos/2024/IMG_{i:07d}.jpg", f"photos/2024/{i:07d}.jpg", RENAMED
+        )
+        for i in range(args.results)
+    ]
+
+    with temporary_tree() as tmp:
+        path: str = os.path.join(tmp, "records")
+
+        start: float = time.perf_counter()
+        with open(path, "w") as file:
+            for old, new, status, _ in results:
+                print(status, old, new, sep="\t", file=file, flush=True)
+        baseline: float = time.perf_counter() - start
+        print(f"print     {baseline * 1e9 / len(results):,.0f} ns/record")
+
+        for output in OUTPUT_FORMATS:
+            start = time.perf_counter()
+            with open(path, "wb") as binary, RecordWriter(binary, output) as writer:
+                for result in results:
+                    writer.write(result)
+            elapsed: float = time.perf_counter() - start
+            print(
+                f"{output:<9} {elapsed * 1e9 / len(results):,.0f} ns/record "
+                f"({baseline / elapsed:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
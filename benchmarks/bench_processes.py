@@ -0,0 +1,56 @@
+"""Compare planning renames in one process with planning them in a process pool.
+
+Uses a deliberately backtracking-heavy regular expression so that applying the
+rules, not scanning, dominates the run, as with expensive real-world patterns.
+
+Usage: python benchmarks/bench_processes.py [--files N] [--processes P ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import time
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.filename_manager import RenamePlan, plan_renames
+
+# Matches the IMG_ prefix, but only after the lookahead has backtracked through
+# every way of splitting the digits that follow it
+DEFAULT_REGEX: str = r"^IMG_(?!(?:\d|\d\d|\d\d\d)+x)"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200_000)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--regex", type=str, default=DEFAULT_REGEX)
+    parser.add_argument("--sub", type=str, default="photo_")
+    args = parser.parse_args()
+
+    plan = RenamePlan(regex=args.regex, sub=args.sub)
+
+    with temporary_tree() as tmp:
+        root = pathlib.Path(tmp)
+        build_tree(root, args.files, args.depth, args.fanout)
+
+        baseline: float | None = None
+        for processes in args.processes:
+            start: float = time.perf_counter()
+            renames = plan_renames(root, plan, processes=processes)
+            elapsed: float = time.perf_counter() - start
+            if baseline is None:
+                baseline = elapsed
+
+            print(
+                f"processes={processes:<3} {len(renames):,} names in {elapsed:.3f}s "
+                f"({len(renames) / elapsed:,.0f} names/s, "
+                f"{baseline / elapsed:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare a rule pipeline with a run per rule, and regexes with their prefilter.
+
+First, a tree is renamed by three rules: once in a run per rule (walking the tree
+three times, as before rule files) and once by a RulePipeline in a single run.
+Then a regex is applied to names in memory, few of which contain its required
+literal: with pattern.sub() on every name, and with RenamePlan.apply_many(),
+which only runs the regex on names containing the literal.
+
+Usage: python benchmarks/bench_rules.py [--files N] [--names N] [--match-every K]
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import time
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.filename_manager import RenamePlan, iter_renames
+from filename_manager.rules import RulePipeline
+
+RULES: list[dict[str, str]] = [
+    {"regex": r"^IMG_", "sub": ""},
+    {"case": "lower"},
+    {"prefix": "vacation_"},
+]
+
+
+def time_runs(files: int, plans: list[RenamePlan]) -> float:
+    """Return the time taken to rename a fresh tree by each plan in turn."""
+
+    with temporary_tree() as tmp:
+        root = pathlib.Path(tmp)
+        build_tree(root, files, depth=2, fanout=8)
+
+        start: float = time.perf_counter()
+        for plan in plans:
+            for result in iter_renames(root, plan):
+                assert result.error is None
+        elapsed: float = time.perf_counter() - start
+
+        assert all(p.name.startswith("vacation_") for p in root.rglob("*.jpg"))
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--match-every", type=int, default=20, metavar="K")
+    args = parser.parse_args()
+
+    per_rule: float = time_runs(args.files, [RulePipeline([rule]) for rule in RULES])
+    pipeline: float = time_runs(args.files, [RulePipeline(RULES)])
+    print(f"run per rule {per_rule * 1e6 / args.files:,.2f} µs/file")
+    print(
+        f"pipeline     {pipeline * 1e6 / args.files:,.2f} µs/file "
+        f"({per_rule / pipeline:.2f}x)"
+    )
+
+    plan = RenamePlan(regex=r"_(\d+)_final", sub="")
+    assert plan.pattern is not None
+    sub, pattern = plan.pattern.sub, plan.pattern
+    names: list[str] = [
+        f"IMG_{i:07d}_final.jpg" if i % args.match_every == 0 else f"IMG_{i:07d}.jpg"
+        for i in range(args.names)
+    ]
+    assert plan.apply_many(names) == [sub("", name) for name in names]
+
+    start: float = time.perf_counter()
+    [sub("", name) for name in names]
+    unfiltered: float = time.perf_counter() - start
+    start = time.perf_counter()
+    plan.apply_many(names)
+    filtered: float = time.perf_counter() - start
+    print(f"regex        {unfiltered * 1e9 / args.names:,.0f} ns/name ({pattern!r})")
+    print(
+        f"prefiltered  {filtered * 1e9 / args.names:,.0f} ns/name "
+        f"({unfiltered / filtered:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure how long the CLI takes to start, and check it against a budget.
+
+Runs a short dry run over a small tree in fresh interpreters and reports the
+best wall time, along with the cumulative import time of the filename_manager
+modules from 'python -X importtime'. Exits with status 1 if the import time
+exceeds --budget.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--budget MS]
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import subprocess
+import sys
+import time
+
+from _tree import build_tree, temporary_tree
+
+MODULE: str = "filename_manager.filename_manager"
+
+
+def import_time_ms() -> float:
+    """Return the cumulative time to import MODULE in a fresh interpreter."""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if name.strip() == MODULE:
+            return int(cumulative) / 1000
+    raise RuntimeError(f"{MODULE} was not imported")
+
+
+def cli_time_ms(root: pathlib.Path) -> float:
+    """Return the wall time of one dry run of the CLI over root."""
+
+    start: float = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", MODULE, str(root), "-p", "new_", "--dry-run"],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=40.0,
+        metavar="MS",
+        help="most milliseconds importing the CLI may take (default: 40)",
+    )
+    args = parser.parse_args()
+
+    with temporary_tree() as tmp:
+        root = pathlib.Path(tmp)
+        build_tree(root, args.files, depth=1, fanout=2)
+
+        imports: float = min(import_time_ms() for _ in range(args.runs))
+        cli: float = min(cli_time_ms(root) for _ in range(args.runs))
+
+    print(f"import {MODULE}: {imports:.1f} ms (budget {args.budget:.1f} ms)")
+    print(f"CLI dry run over {args.files} files: {cli:.1f} ms")
+    if imports > args.budget:
+        print("REGRESSION: import time is over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare recursive Path.iterdir traversal with the scandir-based walk_files.
+
+Counts calls to os.stat (which every Path.is_file/is_dir check goes through) and
+measures wall time for both approaches over a generated directory tree.
+
+Usage: python benchmarks/bench_walk.py [--files N] [--depth D] [--fanout F]
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Iterator
+import contextlib
+import os
+import pathlib
+import time
+from typing import Any
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.filename_manager import walk_files
+
+
+def recursive_iterdir(path: pathlib.Path) -> list[pathlib.Path]:
+    """Collect files the way modify_filenames originally traversed a tree."""
+
+    filepaths: list[pathlib.Path] = []
+    for path_item in path.iterdir():
+        if path_item.is_file():
+            filepaths.append(path_item)
+        elif path_item.is_dir():
+            filepaths.extend(recursive_iterdir(path_item))
+    return filepaths
+
+
+@contextlib.contextmanager
+def count_stat_calls() -> Iterator[list[int]]:
+    """Count calls to os.stat made within the context."""
+
+    counter: list[int] = [0]
+    original_stat = os.stat
+
+    def counting_stat(*args: Any, **kwargs: Any) -> os.stat_result:
+        counter[0] += 1
+        return original_stat(*args, **kwargs)
+
+    os.stat = counting_stat
+    try:
+        yield counter
+    finally:
+        os.stat = original_stat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=8)
+    args = parser.parse_args()
+
+    with temporary_tree() as tmp:
+        root = pathlib.Path(tmp)
+        build_tree(root, args.files, args.depth, args.fanout)
+
+        with count_stat_calls() as stats:
+            start = time.perf_counter()
+            found = len(recursive_iterdir(root))
+            elapsed = time.perf_counter() - start
+        print(f"iterdir:    {found} files, {stats[0]} stat calls, {elapsed:.3f}s")
+
+        with count_stat_calls() as stats:
+            start = time.perf_counter()
+            found = sum(1 for _ in walk_files(root))
+            elapsed = time.perf_counter() - start
+        print(f"walk_files: {found} files, {stats[0]} stat calls, {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Benchmark traversal, rule evaluation and rename execution at scale.
+
+Each case builds a tree of empty files (on tmpfs when available) and times three
+phases separately in a fresh process: walking the tree, planning the renames and
+executing them. Every phase reports files per second, and each case reports the
+peak resident set size of its process.
+
+Results are written as JSON so that a later run can be checked against them:
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --compare before.json --threshold 0.15
+
+Usage: python benchmarks/suite.py [--files N ...] [--depth D] [--fanout F]
+"""
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import pathlib
+import platform
+import subprocess
+import sys
+import time
+from typing import Any
+
+from _tree import build_tree, temporary_tree
+
+from filename_manager.filename_manager import (
+    RenamePlan,
+    execute_renames,
+    plan_renames,
+    walk_files,
+)
+
+PHASES: tuple[str, ...] = ("walk", "plan", "execute")
+
+
+def peak_rss_kb() -> int | None:
+    """Return the peak resident set size of this process in KiB, if known."""
+
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - not available on Windows
+        return None
+
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_case(files: int, depth: int, fanout: int) -> dict[str, Any]:
+    """Build one tree and time each phase over it."""
+
+    plan = RenamePlan(prefix="Vacation_", regex=r"^IMG_", sub="")
+    timings: dict[str, float] = {}
+
+    with temporary_tree() as tmp:
+        root = pathlib.Path(tmp)
+        directories: int = build_tree(root, files, depth, fanout)
+
+        start: float = time.perf_counter()
+        walked: int = sum(1 for _ in walk_files(root))
+        timings["walk"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        renames = plan_renames(root, plan)
+        timings["plan"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        execute_renames(renames)
+        timings["execute"] = time.perf_counter() - start
+
+    assert walked == files == len(renames)
+
+    return {
+        "files": files,
+        "depth": depth,
+        "fanout": fanout,
+        "directories": directories,
+        "seconds": timings,
+        "files_per_second": {
+            phase: files / seconds if seconds else float("inf")
+            for phase, seconds in timings.items()
+        },
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def run_suite(sizes: list[int], depth: int, fanout: int) -> dict[str, Any]:
+    """Run every case, each in its own process so peak RSS is per case."""
+
+    cases: list[dict[str, Any]] = []
+    context = multiprocessing.get_context("spawn")
+    for files in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            case: dict[str, Any] = executor.submit(
+                run_case, files, depth, fanout
+            ).result()
+        cases.append(case)
+        print(format_case(case), flush=True)
+
+    return {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+def current_commit() -> str | None:
+    """Return the git commit being benchmarked, if run from a git checkout."""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_case(case: dict[str, Any]) -> str:
+    """Return one human-readable line summarising a case."""
+
+    rates: str = "  ".join(
+        f"{phase} {case['files_per_second'][phase]:>12,.0f}/s" for phase in PHASES
+    )
+    rss: str = f"{case['peak_rss_kb'] / 1024:,.1f} MiB" if case["peak_rss_kb"] else "?"
+    return (
+        f"{case['files']:>9,} files (depth {case['depth']}, fanout "
+        f"{case['fanout']}):  {rates}  peak RSS {rss}"
+    )
+
+
+def compare(
+    baseline: dict[str, Any], results: dict[str, Any], threshold: float
+) -> list[str]:
+    """Return a description of every phase slower than baseline by threshold."""
+
+    regressions: list[str] = []
+    baseline_cases: dict[tuple[int, int, int], dict[str, Any]] = {
+        (c["files"], c["depth"], c["fanout"]): c for c in baseline["cases"]
+    }
+    for case in results["cases"]:
+        old = baseline_cases.get((case["files"], case["depth"], case["fanout"]))
+        if old is None:
+            continue
+        for phase in PHASES:
+            before: float = old["files_per_second"][phase]
+            after: float = case["files_per_second"][phase]
+            if after < before * (1 - threshold):
+                regressions.append(
+                    f"{case['files']:,} files, {phase}: {before:,.0f}/s -> "
+                    f"{after:,.0f}/s ({after / before - 1:+.0%})"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--files", type=int, nargs="+", default=[10_000, 100_000], metavar="N"
+    )
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--output", type=pathlib.Path, help="write results as JSON")
+    parser.add_argument(
+        "--compare", type=pathlib.Path, help="JSON results of an earlier run"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="fractional slowdown that counts as a regression (default: 0.15)",
+    )
+    args = parser.parse_args()
+
+    results: dict[str, Any] = run_suite(args.files, args.depth, args.fanout)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.compare is not None:
+        regressions: list[str] = compare(
+            json.loads(args.compare.read_text()), results, args.threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,14 @@
-from importlib.metadata import version
+from __future__ import annotations
 
-__version__ = version("filename-manager")
+__version__: str
+
+
+def __getattr__(name: str) -> str:
+    # Resolve the version on first use, as importlib.metadata is slow to import
+    if name == "__version__":
+        from importlib.metadata import version
+
+        global __version__
+        __version__ = version("filename-manager")
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,216 @@
+"""Asynchronous Filename Manager
+
+This module contains an asyncio interface for renaming files, so that a single
+event loop can drive rename jobs over many directory trees at once.
+
+Blocking work (scanning a directory and planning its renames, then performing
+them) runs on a bounded thread pool. A ConcurrencyLimit caps how many of these
+operations are in flight across every job sharing it; callers wait for a free
+slot instead of queueing unbounded work. By default all jobs share one limit.
+
+This file can be imported as a module and contains the following classes and
+functions:
+
+    * ConcurrencyLimit
+    * aiter_renames
+    * amodify_filenames
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pathlib
+from typing import TypeVar
+import weakref
+
+from filename_manager.dirfd import DirectoryFdPool
+from filename_manager.filename_manager import (
+    PLANNED,
+    UNCHANGED,
+    Rename,
+    RenamePlan,
+    RenameResult,
+    _check_others,
+    _is_dependent,
+    _run_batch,
+    _scan_directory,
+    iter_renames,
+    order_renames,
+)
+
+_T = TypeVar("_T")
+
+DEFAULT_CONCURRENCY: int = 32
+
+
+class ConcurrencyLimit:
+    """A bounded thread pool and a cap on the operations in flight through it.
+
+    One limit may be shared by any number of jobs and event loops.
+    """
+
+    def __init__(self, limit: int = DEFAULT_CONCURRENCY) -> None:
+        self.limit: int = limit
+        self.__executor = ThreadPoolExecutor(
+            max_workers=limit, thread_name_prefix="filename-manager"
+        )
+        # Semaphores belong to an event loop, so keep one per running loop
+        self.__semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    async def run(self, function: Callable[..., _T], *args: object) -> _T:
+        """Run function(*args) on the thread pool once a slot is free."""
+
+        loop = asyncio.get_running_loop()
+        semaphore: asyncio.Semaphore | None = self.__semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self.__semaphores[loop] = asyncio.Semaphore(self.limit)
+
+        async with semaphore:
+            return await loop.run_in_executor(self.__executor, function, *args)
+
+    def shutdown(self) -> None:
+        """Stop the thread pool once its pending work is done."""
+
+        self.__executor.shutdown()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__qualname__}(limit = {self.limit})"
+
+
+_default_limit: ConcurrencyLimit | None = None
+
+
+def _get_default_limit() -> ConcurrencyLimit:
+    """Return the limit shared by every job not given one of its own."""
+
+    global _default_limit
+    if _default_limit is None:
+        _default_limit = ConcurrencyLimit()
+    return _default_limit
+
+
+async def aiter_renames(
+    path: pathlib.Path,
+    plan: RenamePlan,
+    follow_symlinks: bool = False,
+    dry_run: bool = False,
+    limit: ConcurrencyLimit | None = None,
+) -> AsyncIterator[RenameResult]:
+    """Rename the files in given path, yielding a result as each file is handled.
+
+    This is the asynchronous counterpart of iter_renames(): each directory is
+    scanned and planned in one pooled operation and its renames performed in
+    another, with at most one operation per job in flight at a time.
+    """
+
+    if limit is None:
+        limit = _get_default_limit()
+
+    # A single file (or an invalid path) is handled exactly as iter_renames() does
+    if not await limit.run(path.is_dir):
+        for result in await limit.run(
+            lambda: list(iter_renames(path, plan, follow_symlinks, dry_run))
+        ):
+            yield result
+        return
+
+    stack: list[str] = [os.fspath(path)]
+    visited: set[tuple[int, int]] = set()
+    if follow_symlinks:
+        stat = await limit.run(os.stat, stack[0])
+        visited.add((stat.st_dev, stat.st_ino))
+
+    files_found = False
+    join = os.path.join
+    fds: DirectoryFdPool | None = None
+    if DirectoryFdPool.supported and not dry_run:
+        fds = DirectoryFdPool()
+
+    try:
+        while stack:
+            renames, subdirs = await limit.run(
+                _plan_directory, stack.pop(), plan, follow_symlinks, visited
+            )
+            stack.extend(subdirs)
+            if not renames:
+                continue
+            files_found = True
+
+            if dry_run:
+                for directory, old, new in renames:
+                    yield RenameResult(
+                        join(directory, old),
+                        join(directory, new),
+                        UNCHANGED if old == new else PLANNED,
+                    )
+                continue
+
+            results, _ = await limit.run(
+                _run_batch, renames, _is_dependent(renames), fds
+            )
+            for result in results:
+                yield result
+    finally:
+        if fds is not None:
+            fds.close()
+
+    if not files_found:
+        raise FileNotFoundError(f"No files found in path: '{path.absolute()}'")
+
+
+async def amodify_filenames(
+    path: pathlib.Path,
+    prefix: str | None = None,
+    suffix: str | None = None,
+    extold: str | None = None,
+    extnew: str | None = None,
+    regex: str | None = None,
+    sub: str | None = None,
+    follow_symlinks: bool = False,
+    plan: RenamePlan | None = None,
+    dry_run: bool = False,
+    limit: ConcurrencyLimit | None = None,
+) -> bool:
+    """Modify all filenames contained in given directory path.
+
+    This is the asynchronous counterpart of modify_filenames(); the first rename
+    that fails raises its error.
+    """
+
+    if plan is None:
+        plan = RenamePlan(prefix, suffix, extold, extnew, regex, sub)
+
+    async for result in aiter_renames(path, plan, follow_symlinks, dry_run, limit):
+        if result.error is not None:
+            raise result.error
+
+    return False
+
+
+def _plan_directory(
+    directory: str,
+    plan: RenamePlan,
+    follow_symlinks: bool,
+    visited: set[tuple[int, int]],
+) -> tuple[list[Rename], list[str]]:
+    """Scan one directory and return its ordered renames and its subdirectories.
+
+    Renames onto the name of an entry left alone (such as a symlink not followed)
+    raise FileExistsError, as they do in iter_renames().
+    """
+
+    files, subdirs, others, _, _ = _scan_directory(directory, follow_symlinks, visited)
+    new_names: list[str] = plan.apply_directory(
+        directory, [entry.name for entry in files], lambda i: files[i].stat()
+    )
+    unordered: list[Rename] = [
+        Rename(directory, entry.name, new) for entry, new in zip(files, new_names)
+    ]
+    if others:
+        _check_others(directory, unordered, others)
+    return order_renames(unordered), subdirs
@@ -0,0 +1,296 @@
+"""Chunked Renaming
+
+This module contains a rename engine for huge flat directories, which handles
+each directory in chunks of a fixed number of files instead of all at once.
+
+A directory is read chunk by chunk, keeping only the names of its entries. The
+rules are then applied one chunk at a time to check every rename against the
+directory's target set, so a collision anywhere in the directory is found before
+any of its files are renamed. Finally the rules are applied again one chunk at a
+time, and each chunk's renames are made before the next chunk is planned.
+
+Memory therefore holds the directory's names and a set of the names being
+renamed and given out, but the directory entries, renames and results of only
+one chunk at a time. The exception is renames onto the old name of another file
+being renamed, which must wait until that file has moved: these are held back
+and made together, in dependency order, once the directory's other chunks are
+done.
+
+This file can be imported as a module and contains the following functions:
+
+    * iter_chunked_renames
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from itertools import islice
+import os
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from filename_manager.filename_manager import (
+    RENAMED,
+    SKIPPED,
+    Rename,
+    RenamePlan,
+    RenameResult,
+    _classify_entries,
+    _collision_error,
+    _execute,
+    _order_batches,
+    _planned_results,
+    iter_renames,
+)
+
+if TYPE_CHECKING:
+    import pathlib
+
+    from filename_manager.filters import EntryFilter
+    from filename_manager.journal import Journal
+    from filename_manager.stats import RenameStats
+
+# Number of files planned and renamed at a time
+DEFAULT_CHUNK_SIZE: int = 10_000
+
+
+def iter_chunked_renames(
+    path: pathlib.Path,
+    plan: RenamePlan,
+    follow_symlinks: bool = False,
+    dry_run: bool = False,
+    workers: int = 1,
+    journal: Journal | None = None,
+    stats: RenameStats | None = None,
+    entry_filter: EntryFilter | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    atomic: bool = False,
+) -> Iterator[RenameResult]:
+    """Rename the files in given path, chunk_size files at a time.
+
+    A directory whose renames collide raises FileExistsError before any of its
+    files are renamed. With atomic, a chunk in which a rename fails has its other
+    renames reversed (as REVERTED); renames held back onto a name that is still
+    taken as a result are SKIPPED. Templates cannot be used, as a directory's
+    files are not numbered together. See iter_renames() for the remaining
+    arguments.
+    """
+
+    # Confirm arguments are valid
+    if chunk_size < 1:
+        raise ValueError(f"chunk size must be positive: '{chunk_size}'")
+    if plan.template is not None:
+        raise ValueError("a template cannot be used with chunks")
+
+    # A single file (or an invalid path) is handled exactly as iter_renames() does
+    if not path.is_dir():
+        yield from iter_renames(
+            path,
+            plan,
+            follow_symlinks,
+            dry_run,
+            workers,
+            journal=journal,
+            stats=stats,
+            entry_filter=entry_filter,
+            atomic=atomic,
+        )
+        return
+
+    # Directories to walk, with their depth below path
+    stack: list[tuple[str, int]] = [(os.fspath(path), 0)]
+    visited: set[tuple[int, int]] = set()
+    if follow_symlinks:
+        stat = os.stat(stack[0][0])
+        visited.add((stat.st_dev, stat.st_ino))
+
+    files_found = False
+    while stack:
+        directory, depth = stack.pop()
+        names, subdirs, present = _scan_names(
+            directory, follow_symlinks, visited, entry_filter, depth, chunk_size, stats
+        )
+        stack.extend((subdir, depth + 1) for subdir in subdirs)
+        if not names:
+            continue
+        files_found = True
+
+        sources: set[str] = _check_chunks(directory, names, present, plan, chunk_size)
+        del present
+        yield from _rename_chunks(
+            directory,
+            names,
+            sources,
+            plan,
+            chunk_size,
+            dry_run,
+            workers,
+            journal,
+            stats,
+            atomic,
+        )
+
+    if not files_found:
+        raise FileNotFoundError(f"No files found in path: '{path.absolute()}'")
+
+
+def _scan_names(
+    directory: str,
+    follow_symlinks: bool,
+    visited: set[tuple[int, int]],
+    entry_filter: EntryFilter | None,
+    depth: int,
+    chunk_size: int,
+    stats: RenameStats | None,
+) -> tuple[list[str], list[str], set[str]]:
+    """Return the filenames, subdirectories and every entry name of a directory.
+
+    Entries are read and classified chunk_size at a time, as _scan_directory()
+    classifies them, so that only names outlive the scan.
+    """
+
+    start: float = perf_counter()
+    names: list[str] = []
+    subdirs: list[str] = []
+    present: set[str] = set()
+    n_entries: int = 0
+    stat_calls: int = 0
+
+    with os.scandir(directory) as scan:
+        while entries := list(islice(scan, chunk_size)):
+            files, chunk_subdirs, _, chunk_stat_calls = _classify_entries(
+                entries, follow_symlinks, visited, entry_filter, depth
+            )
+            names.extend(entry.name for entry in files)
+            subdirs.extend(chunk_subdirs)
+            present.update(entry.name for entry in entries)
+            n_entries += len(entries)
+            stat_calls += chunk_stat_calls
+
+    if stats is not None:
+        stats.add(
+            "scan",
+            perf_counter() - start,
+            directories=1,
+            entries=n_entries,
+            stat_calls=stat_calls,
+        )
+    return names, subdirs, present
+
+
+def _check_chunks(
+    directory: str,
+    names: list[str],
+    present: set[str],
+    plan: RenamePlan,
+    chunk_size: int,
+) -> set[str]:
+    """Return the names of the files that the rules change in a directory.
+
+    Raises FileExistsError if two files would be given the same name, or a file
+    would be given the name of an entry that keeps it.
+    """
+
+    join = os.path.join
+    sources: set[str] = set()
+    targets: set[str] = set()
+    collisions: list[str] = []
+    # Renames onto an existing name, which collide unless its file moves away
+    onto_present: list[tuple[str, str]] = []
+
+    for i in range(0, len(names), chunk_size):
+        olds: list[str] = names[i : i + chunk_size]
+        for old, new in zip(olds, plan.apply_many(olds)):
+            if new == old:
+                continue
+            if new in targets:
+                collisions.append(f"'{old}' -> '{join(directory, new)}'")
+            targets.add(new)
+            sources.add(old)
+            if new in present:
+                onto_present.append((old, new))
+
+    collisions.extend(
+        f"'{old}' -> '{join(directory, new)}'"
+        for old, new in onto_present
+        if new not in sources
+    )
+    if collisions:
+        raise _collision_error(collisions)
+    return sources
+
+
+def _rename_chunks(
+    directory: str,
+    names: list[str],
+    sources: set[str],
+    plan: RenamePlan,
+    chunk_size: int,
+    dry_run: bool,
+    workers: int,
+    journal: Journal | None,
+    stats: RenameStats | None,
+    atomic: bool,
+) -> Iterator[RenameResult]:
+    """Rename a checked directory's files one chunk at a time.
+
+    Renames onto the old name of another file being renamed are held back until
+    every chunk is done, then made in dependency order.
+    """
+
+    held: list[Rename] = []
+    # Old names of files that failed to move away, so are still taken
+    taken: set[str] = set()
+    basename = os.path.basename
+
+    for i in range(0, len(names), chunk_size):
+        olds: list[str] = names[i : i + chunk_size]
+        start: float = perf_counter()
+        news: list[str] = plan.apply_many(olds)
+        if stats is not None:
+            stats.add("rules", perf_counter() - start, rules_applied=len(olds))
+
+        chunk: list[Rename] = []
+        for old, new in zip(olds, news):
+            if new != old and new in sources:
+                held.append(Rename(directory, old, new))
+            else:
+                chunk.append(Rename(directory, old, new))
+        if not chunk:
+            continue
+
+        if dry_run:
+            yield from _planned_results([chunk], stats)
+            continue
+        for result in _execute([chunk], workers, journal, stats, atomic):
+            if result.status != RENAMED and basename(result.old) in sources:
+                taken.add(basename(result.old))
+            yield result
+
+    if not held:
+        return
+
+    # A held rename onto a name still taken stays put, so its own name is taken
+    by_new: dict[str, Rename] = {rename.new: rename for rename in held}
+    queue: list[str] = list(taken)
+    while queue:
+        blocked: Rename | None = by_new.get(queue.pop())
+        if blocked is not None and blocked.old not in taken:
+            taken.add(blocked.old)
+            queue.append(blocked.old)
+
+    join = os.path.join
+    for rename in held:
+        if rename.new in taken:
+            yield RenameResult(
+                join(directory, rename.old), join(directory, rename.new), SKIPPED
+            )
+    held = [rename for rename in held if rename.new not in taken]
+    if not held:
+        return
+
+    batches: Iterator[list[Rename]] = _order_batches([held], stats)
+    if dry_run:
+        yield from _planned_results(batches, stats)
+    else:
+        yield from _execute(batches, workers, journal, stats, atomic)
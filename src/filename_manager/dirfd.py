@@ -0,0 +1,126 @@
+"""Directory File Descriptors
+
+This module contains a bounded pool of open directory file descriptors, so that
+files can be renamed relative to their directory instead of by full path.
+
+Renaming by path makes the kernel resolve every component of both paths again
+for each file, which adds up in deep trees. With a descriptor of the directory,
+each rename (os.rename with src_dir_fd and dst_dir_fd, i.e. renameat) resolves
+just the filename. Each directory is opened once and kept open while it is in
+use; once more than the pool's size are open, the least recently used
+descriptors not in use are closed.
+
+Where the platform cannot rename relative to a directory descriptor (see
+DirectoryFdPool.supported), callers should rename by path instead.
+
+This file can be imported as a module and contains the following classes:
+
+    * DirectoryFdPool
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import os
+import threading
+from types import TracebackType
+
+DEFAULT_SIZE: int = 64
+
+# O_PATH descriptors (Linux) serve only as anchors for *at calls, which is all
+# that is needed, and cost no read permission on the directory
+_OPEN_FLAGS: int = (
+    getattr(os, "O_PATH", os.O_RDONLY)
+    | getattr(os, "O_DIRECTORY", 0)
+    | getattr(os, "O_CLOEXEC", 0)
+)
+
+
+class DirectoryFdPool:
+    """A thread-safe, least-recently-used pool of open directory descriptors.
+
+    A descriptor is borrowed with acquire() and must be handed back with
+    release(); descriptors in use are never closed, so the pool may briefly hold
+    more than size of them.
+    """
+
+    supported: bool = os.rename in os.supports_dir_fd
+
+    __slots__ = ("size", "opened", "__fds", "__lock")
+
+    def __init__(self, size: int = DEFAULT_SIZE) -> None:
+        # Confirm size is valid
+        if size < 1:
+            raise ValueError(f"size must be positive: '{size}'")
+
+        self.size: int = size
+        # Number of directories opened, including ones opened again after eviction
+        self.opened: int = 0
+        # Open descriptors and how many borrowers each has, least recent first
+        self.__fds: OrderedDict[str, list[int]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def acquire(self, directory: str) -> int:
+        """Return an open descriptor of directory, opening it if need be."""
+
+        with self.__lock:
+            entry: list[int] | None = self.__fds.get(directory)
+            if entry is not None:
+                self.__fds.move_to_end(directory)
+                entry[1] += 1
+                return entry[0]
+
+        fd: int = os.open(directory, _OPEN_FLAGS)
+        with self.__lock:
+            entry = self.__fds.get(directory)
+            if entry is not None:
+                # Another thread opened it meanwhile, so use theirs
+                os.close(fd)
+                self.__fds.move_to_end(directory)
+                entry[1] += 1
+                return entry[0]
+            self.__fds[directory] = [fd, 1]
+            self.opened += 1
+            self.__evict()
+        return fd
+
+    def release(self, directory: str) -> None:
+        """Hand back a descriptor borrowed with acquire()."""
+
+        with self.__lock:
+            self.__fds[directory][1] -= 1
+            self.__evict()
+
+    def __evict(self) -> None:
+        """Close least recently used descriptors not in use, down to size."""
+
+        if len(self.__fds) <= self.size:
+            return
+        for directory in [d for d, (_, users) in self.__fds.items() if not users]:
+            os.close(self.__fds.pop(directory)[0])
+            if len(self.__fds) <= self.size:
+                return
+
+    def close(self) -> None:
+        """Close every descriptor in the pool."""
+
+        with self.__lock:
+            while self.__fds:
+                os.close(self.__fds.popitem()[1][0])
+
+    def __len__(self) -> int:
+        return len(self.__fds)
+
+    def __enter__(self) -> DirectoryFdPool:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__qualname__}(size = {self.size})"
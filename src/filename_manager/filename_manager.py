@@ -3,57 +3,1560 @@
 This script contains functionality to modify all filenames within a given directory
 path.
 
-This file can also be imported as a module and contains the following functions:
+This file can also be imported as a module and contains the following classes and
+functions:
 
+    * RenamePlan
+    * Rename
+    * RenameResult
+    * walk_files
+    * plan_renames
+    * order_renames
+    * execute_renames
+    * iter_renames
+    * read_manifest
+    * iter_manifest_renames
     * modify_filenames
     * modify_filename
 """
 
 from __future__ import annotations
 
-import argparse
-import pathlib
-import re
+from collections import deque
+from collections.abc import Callable, Container, Iterable, Iterator, Mapping
+from itertools import repeat
+import os
+import sys
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple
+
+# Modules that only some runs need are imported where they are used, so that the
+# CLI starts quickly (see benchmarks/bench_startup.py)
+if TYPE_CHECKING:
+    import argparse
+    from concurrent.futures import Future
+    import cProfile
+    from datetime import datetime
+    import pathlib
+    import re
+
+    from filename_manager.dirfd import DirectoryFdPool
+    from filename_manager.filters import EntryFilter, FileInfo
+    from filename_manager.index import DirectoryIndex
+    from filename_manager.journal import Journal
+    from filename_manager.output import RecordWriter
+    from filename_manager.stats import RenameStats
 
 FORBIDDEN_CHARACTERS: str = '<>:"/\\|?*'
 ALL: str = "ALL"
 
+# Statuses of a RenameResult
+RENAMED: str = "renamed"
+PLANNED: str = "planned"
+FAILED: str = "failed"
+SKIPPED: str = "skipped"
+UNCHANGED: str = "unchanged"
+REVERTED: str = "reverted"
 
-def modify_filenames(
+# Exit statuses of the CLI: every rename made, some made, none made
+EXIT_SUCCESS: int = 0
+EXIT_PARTIAL: int = 1
+EXIT_FAILURE: int = 2
+
+# Fields that a template may use
+TEMPLATE_FIELDS: tuple[str, ...] = ("n", "stem", "ext", "parent", "mtime")
+
+# Number of filenames sent to a worker process at a time
+PROCESS_CHUNK_SIZE: int = 4096
+
+# Number of bytes of a manifest read at a time
+MANIFEST_BLOCK_SIZE: int = 1 << 16
+
+
+def walk_files(
+    path: str | os.PathLike[str],
+    follow_symlinks: bool = False,
+    entry_filter: EntryFilter | None = None,
+) -> Iterator[os.DirEntry[str]]:
+    """Yield an entry for every file contained in given directory path.
+
+    Directories are walked with an explicit stack rather than recursion, and the
+    file type cached on each os.DirEntry is reused, so no extra stat call is made
+    per entry. Symbolic links are skipped unless follow_symlinks is True. With an
+    entry_filter (see filename_manager.filters), only the files it accepts are
+    yielded and only the directories it accepts are walked.
+    """
+
+    for _, files, _, _ in _scan_directories(path, follow_symlinks, entry_filter):
+        yield from files
+
+
+def _scan_directories(
+    path: str | os.PathLike[str],
+    follow_symlinks: bool = False,
+    entry_filter: EntryFilter | None = None,
+    index: DirectoryIndex | None = None,
+    stats: RenameStats | None = None,
+) -> Iterator[tuple[str, list[os.DirEntry[str]], list[str], list[str]]]:
+    """Yield each directory beneath path with its files, subdirectories and the
+    names of its other entries.
+
+    Directories that index reports as unchanged are not scanned or yielded; their
+    recorded subdirectories are walked instead.
+    """
+
+    start: float = 0.0
+    stat_calls: int = 0
+
+    # Directories to walk, with their depth below path
+    stack: list[tuple[str, int]] = [(os.fspath(path), 0)]
+    visited: set[tuple[int, int]] = set()
+    if follow_symlinks:
+        stat = os.stat(stack[0][0])
+        visited.add((stat.st_dev, stat.st_ino))
+
+    while stack:
+        directory, depth = stack.pop()
+        if stats is not None:
+            start = perf_counter()
+            stat_calls = 0
+
+        if index is not None:
+            unchanged_subdirs: list[str] | None = index.unchanged_subdirs(directory)
+            stat_calls += 1
+            if unchanged_subdirs is not None:
+                stack.extend((subdir, depth + 1) for subdir in unchanged_subdirs)
+                if stats is not None:
+                    stats.add("scan", perf_counter() - start, stat_calls=1)
+                continue
+
+        files, subdirs, others, entries, scan_stat_calls = _scan_directory(
+            directory, follow_symlinks, visited, entry_filter, depth
+        )
+        stat_calls += scan_stat_calls
+
+        if stats is not None:
+            stats.add(
+                "scan",
+                perf_counter() - start,
+                directories=1,
+                entries=entries,
+                stat_calls=stat_calls,
+            )
+        yield directory, files, subdirs, others
+        stack.extend((subdir, depth + 1) for subdir in subdirs)
+
+
+def _scan_directory(
+    directory: str,
+    follow_symlinks: bool,
+    visited: set[tuple[int, int]],
+    entry_filter: EntryFilter | None = None,
+    depth: int = 0,
+) -> tuple[list[os.DirEntry[str]], list[str], list[str], int, int]:
+    """Return the files, subdirectories and names of other entries in a directory.
+
+    Also returns the number of entries read and of stat calls made. Subdirectories
+    already in visited (as (st_dev, st_ino)) are left out when following links.
+    Entries rejected by entry_filter are left out (as other entries) from their
+    name alone, before their type is checked; files are then checked against its
+    size and age limits, if any, with at most one stat each.
+    """
+
+    # Read the directory fully before returning so callers may rename its files
+    # without the scan picking up the new names
+    with os.scandir(directory) as scan:
+        entries: list[os.DirEntry[str]] = list(scan)
+
+    files, subdirs, others, stat_calls = _classify_entries(
+        entries, follow_symlinks, visited, entry_filter, depth
+    )
+    return files, subdirs, others, len(entries), stat_calls
+
+
+def _classify_entries(
+    entries: Iterable[os.DirEntry[str]],
+    follow_symlinks: bool,
+    visited: set[tuple[int, int]],
+    entry_filter: EntryFilter | None = None,
+    depth: int = 0,
+) -> tuple[list[os.DirEntry[str]], list[str], list[str], int]:
+    """Split directory entries as _scan_directory() does, counting stat calls."""
+
+    files: list[os.DirEntry[str]] = []
+    subdirs: list[str] = []
+    # Names that renames must not take, though their entries are left alone
+    others: list[str] = []
+    stat_calls: int = 0
+    file_ok: bool = True
+    dir_ok: bool = True
+    accepts_info: Callable[[FileInfo], bool] | None = None
+    if entry_filter is not None and entry_filter.uses_metadata:
+        from filename_manager.filters import FileInfo
+
+        accepts_info = entry_filter.accepts_info
+    for entry in entries:
+        if entry_filter is not None:
+            file_ok = entry_filter.accepts_file(entry.name)
+            dir_ok = entry_filter.descends(entry.name, depth + 1)
+            if not (file_ok or dir_ok):
+                others.append(entry.name)
+                continue
+
+        if entry.is_file(follow_symlinks=follow_symlinks):
+            if file_ok and accepts_info is not None:
+                stat_calls += 1
+                file_ok = accepts_info(FileInfo.from_entry(entry))
+            if file_ok:
+                files.append(entry)
+                continue
+        elif entry.is_dir(follow_symlinks=follow_symlinks):
+            if dir_ok:
+                # Guard against symlink loops when following links
+                if follow_symlinks:
+                    stat = entry.stat()
+                    stat_calls += 1
+                    if (stat.st_dev, stat.st_ino) in visited:
+                        others.append(entry.name)
+                        continue
+                    visited.add((stat.st_dev, stat.st_ino))
+                subdirs.append(entry.path)
+                continue
+        others.append(entry.name)
+
+    return files, subdirs, others, stat_calls
+
+
+class RenamePlan:
+    """Rename rules validated and compiled once, ready to apply to many filenames.
+
+    Construct a RenamePlan with the same arguments as modify_filename(); all
+    argument checks and regex compilation happen here so that apply() is left with
+    nothing but string operations per filename.
+
+    A template (such as "Vacation_{n:04d}{ext}") replaces each filename before the
+    other rules are applied. Its fields are {n}, the file's number within its
+    directory counting from 1 in order of filename; {stem} and {ext}, the parts of
+    the old filename; {parent}, the name of the directory; and {mtime}, the file's
+    modification time as a datetime (for example {mtime:%Y%m%d}).
+    """
+
+    __slots__ = (
+        "prefix",
+        "suffix",
+        "extold",
+        "extnew",
+        "pattern",
+        "sub",
+        "template",
+        "__uses_mtime",
+        "__literal",
+    )
+
+    def __init__(
+        self,
+        prefix: str | None = None,
+        suffix: str | None = None,
+        extold: str | None = None,
+        extnew: str | None = None,
+        regex: str | None = None,
+        sub: str | None = None,
+        template: str | None = None,
+    ) -> None:
+        # Confirm existing arguments are valid
+        for arg in (prefix, suffix, extold, extnew, sub):
+            if arg is not None and (
+                not arg.isprintable() or any(ch in FORBIDDEN_CHARACTERS for ch in arg)
+            ):
+                raise ValueError(
+                    f"argument contains forbidden character: '{arg}'"
+                    + f"\n(forbidden characters = {FORBIDDEN_CHARACTERS})"
+                )
+
+        # Verify both extension arguments exist if one is provided
+        if (extold is None) ^ (extnew is None):
+            missing_arg = "extnew" if extold is not None else "extold"
+            raise TypeError(
+                f'{type(self).__name__}() missing 1 argument: "{missing_arg}".'
+            )
+
+        # Verify both substring arguments exist if one is provided
+        if (regex is None) ^ (sub is None):
+            missing_arg = "sub" if regex is not None else "regex"
+            raise TypeError(
+                f'{type(self).__name__}() missing 1 argument: "{missing_arg}".'
+            )
+
+        self.prefix: str = prefix or ""
+        self.suffix: str = suffix or ""
+
+        # Store extensions with their leading dot (extold is None if unused)
+        self.extold: str | None = None
+        self.extnew: str = ""
+        if extold and extnew:
+            extold = extold.replace(".", "")
+            self.extold = ALL if extold == ALL else f".{extold}"
+            self.extnew = f".{extnew.replace('.', '')}"
+
+        self.pattern: re.Pattern[str] | None = None
+        # Text that any match must contain, so that other names skip the regex
+        self.__literal: str | None = None
+        if regex is not None:
+            import re
+
+            self.pattern = re.compile(regex)
+            self.__literal = _required_literal(self.pattern)
+        self.sub: str = sub or ""
+
+        self.template: str | None = template
+        self.__uses_mtime: bool = False
+        if template is not None:
+            self.__uses_mtime = _check_template(template)
+
+    def apply(self, name: str) -> str:
+        """Return the new filename for given filename (no directory component).
+
+        A template is filled in as for the only file of a directory, so {n} is 1
+        and {parent} is empty; use apply_directory() to number a directory's files.
+        """
+
+        if self.template is not None:
+            if self.__uses_mtime:
+                raise ValueError("templates using {mtime} need apply_directory()")
+            name = _fill_template(self.template, name, 1, "", None)
+        return self.__apply_rules(name)
+
+    def apply_directory(
+        self,
+        directory: str,
+        names: list[str],
+        stat: Callable[[int], os.stat_result] | None = None,
+    ) -> list[str]:
+        """Return the new filename for each of the filenames in one directory.
+
+        Files are numbered in a single sorted pass over names. Only a template
+        using {mtime} looks up file metadata, calling stat(i) for the i-th name
+        (by default, os.stat on its path) once per file.
+        """
+
+        if self.template is None:
+            return self.apply_many(names)
+
+        from datetime import datetime
+
+        template: str = self.template
+        parent: str = os.path.basename(os.path.abspath(directory))
+        if stat is None:
+            join = os.path.join
+
+            def stat(i: int) -> os.stat_result:
+                return os.stat(join(directory, names[i]))
+
+        new_names: list[str] = names.copy()
+        for n, i in enumerate(sorted(range(len(names)), key=names.__getitem__), 1):
+            mtime: datetime | None = (
+                datetime.fromtimestamp(stat(i).st_mtime) if self.__uses_mtime else None
+            )
+            new_names[i] = self.__apply_rules(
+                _fill_template(template, names[i], n, parent, mtime)
+            )
+        return new_names
+
+    def apply_many(self, names: Iterable[str]) -> list[str]:
+        """Return the new filename for each of given filenames, as apply() does.
+
+        Each rule is applied to the whole batch in turn, on plain strings, so the
+        per-file work is little more than building the new name. A template is
+        filled in as apply() does; use apply_directory() to number files.
+        """
+
+        if self.template is not None:
+            apply = self.apply
+            return [apply(name) for name in names]
+
+        batch: list[str] = list(names)
+
+        # Replace extension if provided (only filenames with extold, or ALL)
+        if self.extold == ALL:
+            extnew: str = self.extnew
+            batch = [stem + extnew for stem, _ in map(_split_ext, batch)]
+        elif self.extold is not None and len(self.extold) > 1:
+            # An extension without dots matches exactly when it ends the name
+            extold: str = self.extold
+            extnew = self.extnew
+            cut: int = -len(extold)
+            batch = [
+                n[:cut] + extnew if n.endswith(extold) and len(n) > -cut else n
+                for n in batch
+            ]
+
+        # Replace substrings if provided
+        if self.pattern is not None:
+            sub = self.pattern.sub
+            repl: str = self.sub
+            literal: str | None = self.__literal
+            if literal is not None:
+                batch = [sub(repl, n) if literal in n else n for n in batch]
+            else:
+                batch = [sub(repl, n) for n in batch]
+            for name in batch:
+                if not name or "/" in name or name in (".", ".."):
+                    raise ValueError(
+                        f"regex substitution produced invalid name: '{name}'"
+                    )
+
+        prefix: str = self.prefix
+        suffix: str = self.suffix
+        if suffix and "." not in prefix:
+            # Build each name in one step; a prefix gives a leading dot a stem
+            first: int = 0 if prefix else 1
+            batch = [
+                f"{prefix}{n[:i]}{suffix}{n[i:]}"
+                if first <= (i := n.rfind(".")) < len(n) - 1
+                else f"{prefix}{n}{suffix}"
+                for n in batch
+            ]
+        elif suffix:
+            batch = [
+                f"{stem}{suffix}{ext}"
+                for stem, ext in map(_split_ext, [prefix + n for n in batch])
+            ]
+        elif prefix:
+            batch = [prefix + n for n in batch]
+
+        return batch
+
+    def __apply_rules(self, name: str) -> str:
+        """Apply every rule but the template to given filename."""
+
+        # Replace extension if provided (only filenames with extold, or ALL)
+        if self.extold is not None:
+            stem, ext = _split_ext(name)
+            if self.extold == ALL or ext == self.extold:
+                name = stem + self.extnew
+
+        # Replace substrings if provided (and the name could match at all)
+        if self.pattern is not None and (
+            self.__literal is None or self.__literal in name
+        ):
+            name = self.pattern.sub(self.sub, name)
+            if not name or "/" in name or name in (".", ".."):
+                raise ValueError(f"regex substitution produced invalid name: '{name}'")
+
+        # Insert prefix if one is provided
+        if self.prefix:
+            name = self.prefix + name
+
+        # Insert suffix if one is provided
+        if self.suffix:
+            stem, ext = _split_ext(name)
+            name = stem + self.suffix + ext
+
+        return name
+
+    @property
+    def arguments(self) -> dict[str, Any]:
+        """The keyword arguments that would construct an identical RenamePlan."""
+
+        return {
+            "prefix": self.prefix or None,
+            "suffix": self.suffix or None,
+            "extold": self.extold,
+            "extnew": self.extnew if self.extold is not None else None,
+            "regex": self.pattern.pattern if self.pattern is not None else None,
+            "sub": self.sub if self.pattern is not None else None,
+            "template": self.template,
+        }
+
+    @property
+    def fingerprint(self) -> str:
+        """A digest identifying these rules, stable across processes."""
+
+        import hashlib
+        import json
+
+        # Not repr(), which shortens long patterns
+        return hashlib.sha256(
+            json.dumps(self.arguments, sort_keys=True).encode()
+        ).hexdigest()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(prefix = {self.prefix!r}, "
+            f"suffix = {self.suffix!r}, extold = {self.extold!r}, "
+            f"extnew = {self.extnew!r}, pattern = {self.pattern!r}, "
+            f"sub = {self.sub!r}, template = {self.template!r})"
+        )
+
+
+def _required_literal(pattern: re.Pattern[str]) -> str | None:
+    """Return the longest text that every match of pattern contains, if any.
+
+    Only literals that the pattern matches in sequence are found, including those
+    of groups and of repeats that match at least once, but not of alternatives or
+    optional parts; a pattern ignoring case has none.
+    """
+    import re
+
+    if pattern.flags & re.IGNORECASE:
+        return None
+
+    if sys.version_info >= (3, 11):
+        from re import _parser as parser  # type: ignore[attr-defined]
+    else:
+        import sre_parse as parser
+
+    literals: list[str] = []
+
+    def collect(items: Iterable[tuple[Any, Any]]) -> None:
+        run: list[str] = []
+        for op, av in items:
+            if op == parser.LITERAL:
+                run.append(chr(av))
+                continue
+            literals.append("".join(run))
+            run = []
+            if op == parser.SUBPATTERN and not av[1] & re.IGNORECASE:
+                collect(av[-1])
+            elif op in (parser.MAX_REPEAT, parser.MIN_REPEAT) and av[0] >= 1:
+                collect(av[2])
+        literals.append("".join(run))
+
+    collect(parser.parse(pattern.pattern, pattern.flags))
+    return max(literals, key=len) or None
+
+
+def _plan_from_arguments(arguments: dict[str, Any]) -> RenamePlan:
+    """Return the rules described by the arguments property of a RenamePlan."""
+
+    if "rules" in arguments:
+        from filename_manager.rules import RulePipeline
+
+        return RulePipeline(arguments["rules"])
+    return RenamePlan(**arguments)
+
+
+def _check_template(template: str) -> bool:
+    """Raise ValueError if template is invalid; return whether it uses {mtime}."""
+    from datetime import datetime
+    import re
+    import string
+
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise ValueError(f"invalid template: '{template}' ({e})") from None
+
+    fields: set[str] = set()
+    for literal, field, _, _ in parsed:
+        if not literal.isprintable() or any(
+            ch in FORBIDDEN_CHARACTERS for ch in literal
+        ):
+            raise ValueError(
+                f"argument contains forbidden character: '{template}'"
+                + f"\n(forbidden characters = {FORBIDDEN_CHARACTERS})"
+            )
+        if field is not None:
+            # Keep only the name of fields such as {stem[0]} or {mtime.year}
+            fields.add(re.split(r"[.\[]", field, maxsplit=1)[0])
+
+    unknown: set[str] = fields - set(TEMPLATE_FIELDS)
+    if unknown:
+        raise ValueError(
+            f"unknown template field(s): {', '.join(repr(f) for f in sorted(unknown))}"
+            + f"\n(template fields = {', '.join(TEMPLATE_FIELDS)})"
+        )
+
+    # Fill in sample values to find bad format specs up front
+    try:
+        _fill_template(template, "name.ext", 1, "parent", datetime(2000, 1, 1))
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid template: '{template}' ({e})") from None
+
+    return "mtime" in fields
+
+
+def _fill_template(
+    template: str, name: str, n: int, parent: str, mtime: datetime | None
+) -> str:
+    """Return template filled in for one file, raising ValueError if invalid."""
+
+    stem, ext = _split_ext(name)
+    new: str = template.format(n=n, stem=stem, ext=ext, parent=parent, mtime=mtime)
+    if not new or "/" in new or new in (".", ".."):
+        raise ValueError(f"template produced invalid name: '{new}'")
+    return new
+
+
+def _split_ext(name: str) -> tuple[str, str]:
+    """Split filename into stem and suffix the way pathlib does."""
+
+    i = name.rfind(".")
+    if 0 < i < len(name) - 1:
+        return name[:i], name[i:]
+    return name, ""
+
+
+class Rename(NamedTuple):
+    """A planned rename of one file within its directory."""
+
+    directory: str
+    old: str
+    new: str
+
+
+class RenameResult(NamedTuple):
+    """The outcome of handling one file: its old and new path, status and error."""
+
+    old: str
+    new: str
+    status: str
+    error: OSError | None = None
+
+
+def plan_renames(
     path: pathlib.Path,
-    prefix: str | None = None,
-    suffix: str | None = None,
-    extold: str | None = None,
-    extnew: str | None = None,
-    regex: str | None = None,
-    sub: str | None = None,
-) -> bool:
-    """Modify all filenames contained in given directory path."""
+    plan: RenamePlan,
+    follow_symlinks: bool = False,
+    processes: int = 1,
+    entry_filter: EntryFilter | None = None,
+) -> list[Rename]:
+    """Return the renames given plan would make to the files in given path.
+
+    Nothing on the filesystem is modified. Renames for the same directory share a
+    single directory string so that large plans stay compact in memory. The
+    renames are checked for collisions and ordered by order_renames(). With more
+    than one process, the rules are applied in a process pool. With an
+    entry_filter, only the files and directories it accepts are handled.
+    """
+
+    return order_renames(
+        rename
+        for batch in _walk_renames(
+            path, plan, follow_symlinks, processes=processes, entry_filter=entry_filter
+        )
+        for rename in batch
+    )
+
+
+def _walk_renames(
+    path: pathlib.Path,
+    plan: RenamePlan,
+    follow_symlinks: bool = False,
+    index: DirectoryIndex | None = None,
+    keep: Mapping[str, Container[str]] | None = None,
+    stats: RenameStats | None = None,
+    processes: int = 1,
+    entry_filter: EntryFilter | None = None,
+) -> Iterator[list[Rename]]:
+    """Yield the unordered renames for the files in path, one directory at a time.
+
+    With an index, files it has recorded keep their names and each directory's
+    resulting filenames are recorded in it. Otherwise, files named in keep (by
+    directory) keep their names. With more than one process, the rules are
+    applied in a process pool. Only files and directories accepted by
+    entry_filter are handled, and renames onto any other entry are collisions.
+    """
 
     # Confirm path is a valid directory or file
     if path.is_file():
-        modify_filename(path)
+        rename = Rename(
+            str(path.parent),
+            path.name,
+            plan.apply_directory(str(path.parent), [path.name])[0],
+        )
+        if rename.new != rename.old and os.path.lexists(path.with_name(rename.new)):
+            raise FileExistsError(
+                f"rename target already exists: '{path.with_name(rename.new)}'"
+            )
+        yield [rename]
+        return
     elif not path.is_dir():
         raise NotADirectoryError(
             f"path provided is not a directory: '{path.absolute()}'"
         )
 
-    no_files_found = True
+    if index is not None:
+        lookup: Callable[[str], Container[str] | None] = index.names
+    elif keep is not None:
+        lookup = keep.get
+    else:
+        lookup = _no_known_names
 
-    # Iterate through directory
-    for path_item in path.iterdir():
-        if path_item.is_file():
-            no_files_found = False
-            modify_filename(path_item, prefix, suffix, extold, extnew, regex, sub)
-        elif path_item.is_dir():
-            no_files_found = modify_filenames(
-                path_item, prefix, suffix, extold, extnew, regex, sub
-            )
+    scanned = _scan_directories(path, follow_symlinks, entry_filter, index, stats)
+    # Numbering with a template needs a whole directory at once
+    if processes > 1 and plan.template is None:
+        named = _apply_rules_in_processes(scanned, plan, lookup, processes, stats)
+    else:
+        named = _apply_rules(scanned, plan, lookup, stats)
 
-    if no_files_found:
+    files_found = False
+    for directory, renames, subdirs, others in named:
+        if others:
+            _check_others(directory, renames, others)
+        if index is not None:
+            index.record(directory, [rename.new for rename in renames], subdirs)
+            if not renames:
+                # Nothing will be renamed in it, so its mtime is final already
+                index.stamp(directory)
+        if renames:
+            files_found = True
+            yield renames
+
+    # An index may have skipped every directory, so it can't tell that none exist
+    if not files_found and index is None:
         raise FileNotFoundError(f"No files found in path: '{path.absolute()}'")
 
-    return no_files_found
+
+def _check_others(directory: str, renames: list[Rename], others: list[str]) -> None:
+    """Raise FileExistsError if a rename would take the name of another entry.
+
+    Other entries are those left alone, such as subdirectories and files rejected
+    by a filter.
+    """
+
+    taken: set[str] = set(others)
+    collisions: list[str] = [
+        f"'{old}' -> '{os.path.join(directory, new)}'"
+        for _, old, new in renames
+        if new in taken
+    ]
+    if collisions:
+        raise _collision_error(collisions)
+
+
+def _collision_error(collisions: list[str], hint: str = "") -> FileExistsError:
+    """Return an error listing (the first few of) given collisions.
+
+    A hint, if given, is appended to explain a likely cause.
+    """
+
+    return FileExistsError(
+        f"{len(collisions)} rename(s) would overwrite another file: "
+        + ", ".join(collisions[:10])
+        + (", ..." if len(collisions) > 10 else "")
+        + (f" ({hint})" if hint else "")
+    )
+
+
+def _no_known_names(directory: str) -> None:
+    """Return no names to keep, for runs with neither an index nor keep."""
+
+    return None
+
+
+def _apply_rules(
+    scanned: Iterable[tuple[str, list[os.DirEntry[str]], list[str], list[str]]],
+    plan: RenamePlan,
+    lookup: Callable[[str], Container[str] | None],
+    stats: RenameStats | None = None,
+) -> Iterator[tuple[str, list[Rename], list[str], list[str]]]:
+    """Apply plan to each scanned directory's files, leaving known names alone."""
+
+    apply = plan.apply
+    apply_many = plan.apply_many
+    start: float = 0.0
+
+    for directory, files, subdirs, others in scanned:
+        if stats is not None:
+            start = perf_counter()
+
+        known: Container[str] | None = lookup(directory)
+        if plan.template is not None:
+            renames = _template_renames(plan, directory, files, known)
+        elif known:
+            renames = [
+                Rename(directory, e.name, e.name if e.name in known else apply(e.name))
+                for e in files
+            ]
+        else:
+            olds: list[str] = [e.name for e in files]
+            renames = list(map(Rename, repeat(directory), olds, apply_many(olds)))
+
+        if stats is not None:
+            stats.add(
+                "rules",
+                perf_counter() - start,
+                rules_applied=sum(e.name not in known for e in files)
+                if known
+                else len(files),
+            )
+        yield directory, renames, subdirs, others
+
+
+def _template_renames(
+    plan: RenamePlan,
+    directory: str,
+    files: list[os.DirEntry[str]],
+    known: Container[str] | None,
+) -> list[Rename]:
+    """Number one directory's files with plan's template.
+
+    A directory with known names was numbered whole by an earlier run, and
+    numbering its other files would start again from 1, so all of its files are
+    left alone. File metadata comes from each entry's own stat cache.
+    """
+
+    if known and any(e.name in known for e in files):
+        return [Rename(directory, e.name, e.name) for e in files]
+    new_names: list[str] = plan.apply_directory(
+        directory, [e.name for e in files], lambda i: files[i].stat()
+    )
+    return list(map(Rename, repeat(directory), [e.name for e in files], new_names))
+
+
+def _apply_rules_in_processes(
+    scanned: Iterable[tuple[str, list[os.DirEntry[str]], list[str], list[str]]],
+    plan: RenamePlan,
+    lookup: Callable[[str], Container[str] | None],
+    processes: int,
+    stats: RenameStats | None = None,
+    chunk_size: int = 0,
+) -> Iterator[tuple[str, list[Rename], list[str], list[str]]]:
+    """Apply plan to each scanned directory's files in a pool of processes.
+
+    Names are gathered across directories into chunks of about chunk_size and
+    sent to workers that each hold their own compiled copy of plan; only the new
+    names come back. At most two chunks per process are in flight, and results
+    are yielded in scan order.
+    """
+
+    chunk_size = chunk_size or PROCESS_CHUNK_SIZE
+
+    # Each chunk's directories: (directory, old names, known names, subdirs,
+    # other entries)
+    pending: deque[
+        tuple[
+            Future[list[str]],
+            list[tuple[str, list[str], Container[str] | None, list[str], list[str]]],
+        ]
+    ] = deque()
+    group: list[tuple[str, list[str], Container[str] | None, list[str], list[str]]] = []
+    names: list[str] = []
+
+    def collect() -> Iterator[tuple[str, list[Rename], list[str], list[str]]]:
+        future, directories = pending.popleft()
+        start: float = perf_counter()
+        new_names: Iterator[str] = iter(future.result())
+        if stats is not None:
+            stats.add("rules", perf_counter() - start)
+        for directory, olds, known, subdirs, others in directories:
+            if known:
+                renames = [
+                    Rename(directory, old, old if old in known else next(new_names))
+                    for old in olds
+                ]
+            else:
+                renames = [Rename(directory, old, next(new_names)) for old in olds]
+            yield directory, renames, subdirs, others
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    executor = ProcessPoolExecutor(
+        processes, initializer=_init_worker, initargs=(plan.arguments,)
+    )
+    try:
+        for directory, files, subdirs, others in scanned:
+            olds: list[str] = [e.name for e in files]
+            known: Container[str] | None = lookup(directory)
+            applied: list[str] = [n for n in olds if n not in known] if known else olds
+            group.append((directory, olds, known, subdirs, others))
+            names.extend(applied)
+            if stats is not None:
+                stats.add("rules", 0.0, rules_applied=len(applied))
+            if len(names) < chunk_size:
+                continue
+
+            pending.append((executor.submit(_apply_chunk, names), group))
+            group, names = [], []
+            if len(pending) >= 2 * processes:
+                yield from collect()
+
+        if group:
+            pending.append((executor.submit(_apply_chunk, names), group))
+        while pending:
+            yield from collect()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+_worker_plan: RenamePlan | None = None
+
+
+def _init_worker(arguments: dict[str, Any]) -> None:
+    """Compile the rename rules once in each worker process."""
+
+    global _worker_plan
+    _worker_plan = _plan_from_arguments(arguments)
+
+
+def _apply_chunk(names: list[str]) -> list[str]:
+    """Return the new name of each name, in a worker process."""
+
+    assert _worker_plan is not None
+    return _worker_plan.apply_many(names)
+
+
+def order_renames(renames: Iterable[Rename]) -> list[Rename]:
+    """Return given renames ordered so that none overwrites another file.
+
+    Each directory's renames must include every file in that directory, so
+    that a rename onto an untouched file is seen as a collision. Renames are
+    ordered so each target is vacated before it is used, and cycles (a -> b
+    plus b -> a) are broken by moving one file to a temporary name first. The
+    temporary name is one that no entry on disk holds, including entries that
+    were filtered out or left off a manifest.
+
+    Raises FileExistsError, before anything is renamed, if two files would be
+    given the same name.
+    """
+
+    by_directory: dict[str, list[Rename]] = {}
+    for rename in renames:
+        by_directory.setdefault(rename.directory, []).append(rename)
+
+    ordered: list[Rename] = []
+    collisions: list[str] = []
+    for directory, batch in by_directory.items():
+        # Index targets by name to find collisions in a single pass
+        targets: dict[str, str] = {}
+        for _, old, new in batch:
+            if targets.setdefault(new, old) != old:
+                collisions.append(
+                    f"'{targets[new]}' and '{old}' -> '{os.path.join(directory, new)}'"
+                )
+        if not collisions:
+            ordered.extend(_order_directory(directory, batch, targets))
+
+    if collisions:
+        raise _collision_error(collisions)
+
+    return ordered
+
+
+def _order_directory(
+    directory: str, renames: list[Rename], targets: dict[str, str]
+) -> list[Rename]:
+    """Order one directory's collision-free renames, breaking cycles."""
+
+    # Unchanged filenames need no ordering
+    ordered: list[Rename] = [r for r in renames if r.old == r.new]
+    changed: dict[str, Rename] = {r.old: r for r in renames if r.old != r.new}
+    by_new: dict[str, Rename] = {r.new: r for r in changed.values()}
+    done: set[str] = set()
+
+    def unwind(rename: Rename | None, stop: Rename | None = None) -> None:
+        """Append rename, then each rename waiting on the name it vacates."""
+        while rename is not None and rename is not stop:
+            ordered.append(rename)
+            done.add(rename.old)
+            rename = by_new.get(rename.old)
+
+    # Chains end in a target nobody currently holds; perform them back to front
+    for rename in changed.values():
+        if rename.new not in changed:
+            unwind(rename)
+
+    # Whatever remains forms cycles
+    for rename in changed.values():
+        if rename.old in done:
+            continue
+        temp: str = f".{rename.old}.tmp"
+        # Entries the renames don't cover (filtered, or off a manifest) may
+        # still hold the name, so check the directory too
+        while (
+            temp in targets
+            or temp in changed
+            or os.path.lexists(os.path.join(directory, temp))
+        ):
+            temp = f".{temp}"
+        ordered.append(Rename(directory, rename.old, temp))
+        done.add(rename.old)
+        unwind(by_new.get(rename.old), stop=rename)
+        ordered.append(Rename(directory, temp, rename.new))
+
+    return ordered
+
+
+def execute_renames(renames: Iterable[Rename], workers: int = 1) -> None:
+    """Perform given renames on the filesystem, raising the first error.
+
+    With more than one worker, renames are spread over a bounded thread pool,
+    which helps on filesystems where each rename is a network round trip.
+    Renames within a directory that depend on one another (one's new name is
+    another's old name) always run in their planned order.
+    """
+
+    by_directory: dict[str, list[Rename]] = {}
+    for rename in renames:
+        by_directory.setdefault(rename.directory, []).append(rename)
+
+    for result in _execute(by_directory.values(), workers):
+        if result.error is not None:
+            raise result.error
+
+
+def iter_renames(
+    path: pathlib.Path,
+    plan: RenamePlan,
+    follow_symlinks: bool = False,
+    dry_run: bool = False,
+    workers: int = 1,
+    index: DirectoryIndex | None = None,
+    journal: Journal | None = None,
+    keep: Mapping[str, Container[str]] | None = None,
+    stats: RenameStats | None = None,
+    processes: int = 1,
+    entry_filter: EntryFilter | None = None,
+    chunk_size: int = 0,
+    atomic: bool = False,
+    check_first: bool = False,
+) -> Iterator[RenameResult]:
+    """Rename the files in given path, yielding a result as each file is handled.
+
+    The tree is planned and renamed one directory at a time, so memory use is
+    bounded by the largest directory rather than by the whole tree. A directory
+    whose renames collide raises FileExistsError before any of its files are
+    renamed; directories handled earlier have already been renamed, unless
+    check_first is given, in which case the whole tree is planned (walking it
+    twice) before anything is renamed. Failed
+    renames are yielded with their error rather than raised. Files that no rule
+    changes are yielded as UNCHANGED without touching the filesystem. With
+    dry_run each other rename is yielded as PLANNED and nothing is renamed.
+
+    With an index (see filename_manager.index), unchanged directories are skipped
+    and only files new since the last run are renamed. The index is committed
+    once every file has been handled; directories with a failed rename are left
+    out of it. If the run stops early, the directories already renamed are kept.
+
+    With a journal (see filename_manager.journal), every rename is recorded
+    before it is made, so that the run can later be undone or resumed. Files
+    named in keep (a set of filenames by directory) are left as they are.
+
+    With stats (see filename_manager.stats), counters and timings are collected
+    for each phase of the job.
+
+    With more than one process, new names are computed in a pool of worker
+    processes, each holding its own compiled copy of the rules. This pays off for
+    expensive regular expressions on large trees; renames are still made by this
+    process.
+
+    With an entry_filter (see filename_manager.filters), only the files it
+    accepts are renamed and only the directories it accepts are walked. A rename
+    onto the name of any entry left alone is a collision.
+
+    With a chunk_size, each directory is planned and renamed chunk_size files at
+    a time (see filename_manager.chunked), bounding the memory a huge directory
+    takes; an index and processes cannot be used with it. With atomic, a
+    directory (or chunk) in which a rename fails has its other renames reversed,
+    and they are yielded as REVERTED.
+
+    A template numbers each directory whole, so it cannot be used with an index;
+    directories holding files named in keep are left alone by it.
+    """
+
+    # Confirm arguments are valid
+    if index is not None and plan.template is not None:
+        raise ValueError("a template cannot be used with an index")
+
+    if check_first and not dry_run:
+        # A dry run raises on the first collision anywhere, renaming nothing
+        for _ in iter_renames(
+            path,
+            plan,
+            follow_symlinks,
+            True,
+            index=index,
+            keep=keep,
+            processes=processes,
+            entry_filter=entry_filter,
+            chunk_size=chunk_size,
+        ):
+            pass
+
+    if chunk_size:
+        # Confirm arguments are valid
+        if index is not None or processes > 1:
+            raise ValueError("an index or processes cannot be used with chunks")
+        from filename_manager.chunked import iter_chunked_renames
+
+        yield from iter_chunked_renames(
+            path,
+            plan,
+            follow_symlinks,
+            dry_run,
+            workers,
+            journal,
+            stats,
+            entry_filter,
+            chunk_size,
+            atomic,
+        )
+        return
+
+    batches: Iterator[list[Rename]] = _order_batches(
+        _walk_renames(
+            path, plan, follow_symlinks, index, keep, stats, processes, entry_filter
+        ),
+        stats,
+    )
+
+    if dry_run:
+        try:
+            yield from _planned_results(batches, stats)
+        finally:
+            if index is not None:
+                index.rollback()
+        return
+
+    if index is None:
+        yield from _execute(batches, workers, journal, stats, atomic)
+        return
+
+    completed = False
+    # A directory's results arrive together, so once another directory's come
+    # its renames are done and its mtime can be stamped
+    current: str | None = None
+    try:
+        for result in _execute(batches, workers, journal, stats, atomic):
+            directory: str = os.path.dirname(result.old)
+            if directory != current:
+                if current is not None:
+                    index.stamp(current)
+                current = directory
+            if result.error is not None or result.status in (SKIPPED, REVERTED):
+                index.discard(directory)
+            yield result
+        if current is not None:
+            index.stamp(current)
+        completed = True
+    except Exception:
+        # Every batch handed out has been reported by now, so the directory last
+        # reported is finished
+        if current is not None:
+            index.stamp(current)
+        raise
+    finally:
+        if completed:
+            index.commit()
+        else:
+            # Keep the directories already renamed, whatever stopped the run
+            index.abandon()
+
+
+def read_manifest(file: BinaryIO, separator: bytes = b"\n") -> Iterator[str]:
+    """Yield each path listed in a manifest, such as the output of find or fd.
+
+    Paths are separated by separator (a newline, or NUL for the output of
+    'find -print0') and read in blocks, so a manifest of any size is streamed.
+    Empty entries are ignored, and paths are decoded as os.fsdecode() does so
+    that any filename survives.
+    """
+
+    tail: bytes = b""
+    while True:
+        block: bytes = file.read(MANIFEST_BLOCK_SIZE)
+        if not block:
+            break
+        entries: list[bytes] = (tail + block).split(separator)
+        tail = entries.pop()
+        for entry in entries:
+            if entry:
+                yield os.fsdecode(entry)
+    if tail:
+        yield os.fsdecode(tail)
+
+
+def iter_manifest_renames(
+    paths: Iterable[str],
+    plan: RenamePlan,
+    dry_run: bool = False,
+    workers: int = 1,
+    journal: Journal | None = None,
+    stats: RenameStats | None = None,
+) -> Iterator[RenameResult]:
+    """Rename the files listed in paths, yielding a result as each file is handled.
+
+    No directory is walked: consecutive paths in the same directory form one
+    batch, which is checked, ordered and renamed like a directory of
+    iter_renames(). Paths are renamed as listed, so list files only. A rename
+    onto a name outside its batch is a collision if that name exists, which
+    costs one lstat per changed filename. A directory whose paths are not listed
+    together, or a path listed twice apart, is therefore likely to be reported
+    as a collision. See iter_renames() for the remaining arguments.
+    """
+
+    batches: Iterator[list[Rename]] = _order_batches(
+        _manifest_renames(paths, plan, stats), stats
+    )
+
+    if dry_run:
+        yield from _planned_results(batches, stats)
+    else:
+        yield from _execute(batches, workers, journal, stats)
+
+
+def _manifest_renames(
+    paths: Iterable[str], plan: RenamePlan, stats: RenameStats | None = None
+) -> Iterator[list[Rename]]:
+    """Yield the unordered renames for paths, one run of a directory at a time."""
+
+    split = os.path.split
+    directory: str | None = None
+    # Filenames of the current run, in order and without duplicates
+    olds: dict[str, None] = {}
+
+    for path in paths:
+        head, name = split(path)
+        if head != directory:
+            if olds:
+                yield _manifest_batch(plan, directory or "", list(olds), stats)
+            directory, olds = head, {}
+        # A path listed twice is renamed once
+        if name:
+            olds[name] = None
+
+    if olds:
+        yield _manifest_batch(plan, directory or "", list(olds), stats)
+
+
+def _manifest_batch(
+    plan: RenamePlan,
+    directory: str,
+    olds: list[str],
+    stats: RenameStats | None = None,
+) -> list[Rename]:
+    """Return one directory's renames, checking targets outside them on disk."""
+
+    start: float = perf_counter()
+    names: dict[str, str] = dict(zip(olds, plan.apply_directory(directory, olds)))
+    if stats is not None:
+        stats.add("rules", perf_counter() - start, rules_applied=len(names))
+
+    # Unlisted files in the directory are unknown, so look for each target
+    collisions: list[str] = [
+        f"'{old}' -> '{os.path.join(directory, new)}'"
+        for old, new in names.items()
+        if new != old
+        and new not in names
+        and os.path.lexists(os.path.join(directory, new))
+    ]
+    if collisions:
+        # Paths of a directory split across runs are batched apart, so one run
+        # sees the names another has already given out
+        raise _collision_error(
+            collisions,
+            "a manifest must list the paths of each directory together and each "
+            "path once; sort it, e.g. with 'sort -u' or 'sort -zu'",
+        )
+
+    return [Rename(directory, old, new) for old, new in names.items()]
+
+
+def _planned_results(
+    batches: Iterable[list[Rename]], stats: RenameStats | None = None
+) -> Iterator[RenameResult]:
+    """Yield each of the renames in batches as PLANNED, without making them.
+
+    Files that keep their name are yielded as UNCHANGED.
+    """
+
+    join = os.path.join
+    for batch in batches:
+        if stats is not None:
+            unchanged: int = sum(old == new for _, old, new in batch)
+            stats.add(
+                "rename", 0.0, planned=len(batch) - unchanged, unchanged=unchanged
+            )
+        for directory, old, new in batch:
+            yield RenameResult(
+                join(directory, old),
+                join(directory, new),
+                UNCHANGED if old == new else PLANNED,
+            )
+
+
+def _order_batches(
+    batches: Iterable[list[Rename]], stats: RenameStats | None = None
+) -> Iterator[list[Rename]]:
+    """Check and order each directory's renames with order_renames()."""
+
+    for batch in batches:
+        if stats is None:
+            yield order_renames(batch)
+        else:
+            start: float = perf_counter()
+            ordered: list[Rename] = order_renames(batch)
+            stats.add("order", perf_counter() - start)
+            yield ordered
+
+
+def _execute(
+    batches: Iterable[list[Rename]],
+    workers: int,
+    journal: Journal | None = None,
+    stats: RenameStats | None = None,
+    atomic: bool = False,
+) -> Iterator[RenameResult]:
+    """Perform batches of renames, each holding one directory's ordered renames.
+
+    Each batch is written to journal before any of its renames are made, and
+    marked finished once all of them have been handled. Where the platform
+    allows, files are renamed relative to an open descriptor of their directory
+    (see filename_manager.dirfd). With atomic, a batch in which a rename fails
+    has its other renames reversed.
+    """
+
+    from filename_manager.dirfd import DirectoryFdPool
+
+    fds: DirectoryFdPool | None = None
+    if DirectoryFdPool.supported:
+        fds = DirectoryFdPool()
+    try:
+        yield from _execute_with(batches, workers, journal, stats, fds, atomic)
+    finally:
+        if fds is not None:
+            fds.close()
+
+
+def _execute_with(
+    batches: Iterable[list[Rename]],
+    workers: int,
+    journal: Journal | None,
+    stats: RenameStats | None,
+    fds: DirectoryFdPool | None,
+    atomic: bool = False,
+) -> Iterator[RenameResult]:
+    """Perform batches of renames as _execute() does, with given descriptors."""
+
+    batch_id: int = -1
+    results: list[RenameResult]
+    seconds: float
+
+    if workers <= 1:
+        for batch in batches:
+            if journal is not None:
+                batch_id = journal.write_batch(batch)
+            if stats is None:
+                yield from _execute_batch(batch, _is_dependent(batch), fds, atomic)
+            else:
+                results, seconds = _run_batch(batch, _is_dependent(batch), fds, atomic)
+                _add_rename_stats(stats, results, seconds)
+                yield from results
+            if journal is not None:
+                journal.finish_batch(batch_id)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of batches in flight, yielding in submission order
+        pending: deque[tuple[int, Future[tuple[list[RenameResult], float]]]] = deque()
+        error: Exception | None = None
+        try:
+            for batch, dependent in _split_batches(batches, workers, atomic):
+                if journal is not None:
+                    batch_id = journal.write_batch(batch)
+                pending.append(
+                    (
+                        batch_id,
+                        executor.submit(_run_batch, batch, dependent, fds, atomic),
+                    )
+                )
+                if len(pending) < 2 * workers:
+                    continue
+                batch_id, future = pending.popleft()
+                results, seconds = future.result()
+                if stats is not None:
+                    _add_rename_stats(stats, results, seconds)
+                yield from results
+                if journal is not None:
+                    journal.finish_batch(batch_id)
+        except Exception as e:
+            # Batches in flight are renamed all the same, so report them first
+            error = e
+        while pending:
+            batch_id, future = pending.popleft()
+            results, seconds = future.result()
+            if stats is not None:
+                _add_rename_stats(stats, results, seconds)
+            yield from results
+            if journal is not None:
+                journal.finish_batch(batch_id)
+        if error is not None:
+            raise error
+
+
+def _add_rename_stats(
+    stats: RenameStats, results: list[RenameResult], seconds: float
+) -> None:
+    """Add the time taken by a batch of renames and a count of each status."""
+
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    stats.add("rename", seconds, **counts)
+
+
+def _execute_batch(
+    renames: list[Rename],
+    dependent: bool,
+    fds: DirectoryFdPool | None = None,
+    atomic: bool = False,
+) -> Iterator[RenameResult]:
+    """Perform given renames, all within one directory, one after another.
+
+    With a pool of directory descriptors (see filename_manager.dirfd), files are
+    renamed relative to their directory rather than by path. If a rename fails
+    in a dependent batch, the renames after it are skipped, as they may rely on
+    the failed rename having vacated its old name. If a rename fails in an
+    atomic batch, the renames after it are skipped and those before it reversed.
+    """
+
+    if atomic:
+        yield from _revert_on_failure(list(_execute_batch(renames, True, fds)))
+        return
+
+    fd: int | None = None
+    if fds is not None and renames:
+        try:
+            fd = fds.acquire(renames[0].directory or os.curdir)
+        except OSError:
+            # Rename by path instead, so that each file reports its own error
+            fd = None
+
+    join = os.path.join
+    try:
+        for i, (directory, old, new) in enumerate(renames):
+            old_path: str = join(directory, old)
+            # Files no rule changed need no syscall at all
+            if old == new:
+                yield RenameResult(old_path, old_path, UNCHANGED)
+                continue
+            new_path: str = join(directory, new)
+            try:
+                if fd is None:
+                    os.replace(old_path, new_path)
+                else:
+                    os.rename(old, new, src_dir_fd=fd, dst_dir_fd=fd)
+            except OSError as e:
+                yield RenameResult(old_path, new_path, FAILED, e)
+                if dependent:
+                    for directory, old, new in renames[i + 1 :]:
+                        yield RenameResult(
+                            join(directory, old), join(directory, new), SKIPPED
+                        )
+                    return
+            else:
+                yield RenameResult(old_path, new_path, RENAMED)
+    finally:
+        if fd is not None and fds is not None:
+            fds.release(renames[0].directory or os.curdir)
+
+
+def _revert_on_failure(results: list[RenameResult]) -> list[RenameResult]:
+    """Reverse the renames of a batch if any failed, last first.
+
+    Reversed renames become REVERTED; one that cannot be reversed stays RENAMED,
+    with the error that prevented it.
+    """
+
+    if all(result.error is None for result in results):
+        return results
+
+    for i in reversed(range(len(results))):
+        old, new, status, _ = results[i]
+        if status != RENAMED:
+            continue
+        try:
+            os.replace(new, old)
+        except OSError as e:
+            results[i] = RenameResult(old, new, RENAMED, e)
+        else:
+            results[i] = RenameResult(old, new, REVERTED)
+    return results
+
+
+def _run_batch(
+    renames: list[Rename],
+    dependent: bool,
+    fds: DirectoryFdPool | None = None,
+    atomic: bool = False,
+) -> tuple[list[RenameResult], float]:
+    """Perform given renames, collecting their results and the time taken."""
+
+    start: float = perf_counter()
+    results: list[RenameResult] = list(_execute_batch(renames, dependent, fds, atomic))
+    return results, perf_counter() - start
+
+
+def _is_dependent(renames: list[Rename]) -> bool:
+    """Return whether any rename targets the old name of another."""
+
+    sources: set[str] = {rename.old for rename in renames}
+    return any(r.new != r.old and r.new in sources for r in renames)
+
+
+def _split_batches(
+    batches: Iterable[list[Rename]], workers: int, atomic: bool = False
+) -> Iterator[tuple[list[Rename], bool]]:
+    """Split batches into smaller ones that are safe to execute concurrently.
+
+    Atomic batches are never split, so that each is reversed as a whole.
+    """
+
+    for batch in batches:
+        if atomic or _is_dependent(batch):
+            # Keep dependent renames together, in planned order
+            yield batch, _is_dependent(batch)
+        else:
+            size: int = -(-len(batch) // workers)
+            for i in range(0, len(batch), size):
+                yield batch[i : i + size], False
+
+
+def modify_filenames(
+    path: pathlib.Path,
+    prefix: str | None = None,
+    suffix: str | None = None,
+    extold: str | None = None,
+    extnew: str | None = None,
+    regex: str | None = None,
+    sub: str | None = None,
+    follow_symlinks: bool = False,
+    plan: RenamePlan | None = None,
+    dry_run: bool = False,
+    workers: int = 1,
+    processes: int = 1,
+    entry_filter: EntryFilter | None = None,
+    chunk_size: int = 0,
+    atomic: bool = False,
+) -> bool:
+    """Modify all filenames contained in given directory path.
+
+    Rename rules may be given either as individual arguments or as an already
+    compiled RenamePlan. See iter_renames() for the remaining arguments; the
+    first rename that fails raises its error.
+    """
+
+    if plan is None:
+        plan = RenamePlan(prefix, suffix, extold, extnew, regex, sub)
+
+    for result in iter_renames(
+        path,
+        plan,
+        follow_symlinks,
+        dry_run,
+        workers,
+        processes=processes,
+        entry_filter=entry_filter,
+        chunk_size=chunk_size,
+        atomic=atomic,
+    ):
+        if result.error is not None:
+            raise result.error
+
+    return False
 
 
 def modify_filename(
@@ -64,77 +1567,86 @@ def modify_filename(
     extnew: str | None = None,
     regex: str | None = None,
     sub: str | None = None,
+    plan: RenamePlan | None = None,
 ) -> None:
     """Modify given filename."""
 
-    # Confirm existing arguments are valid
-    for arg in (prefix, suffix, extold, extnew, sub):
-        if arg is not None and (
-            not arg.isprintable() or any(ch in FORBIDDEN_CHARACTERS for ch in arg)
-        ):
-            raise ValueError(
-                f"argument contains forbidden character: '{arg}'"
-                + f"\n(forbidden characters = {FORBIDDEN_CHARACTERS})"
-            )
+    if plan is None:
+        plan = RenamePlan(prefix, suffix, extold, extnew, regex, sub)
 
-    new_filepath: pathlib.Path = path
-    missing_arg: str = ""
+    # Replace old file with new, unless no rule changed its name
+    new_path: pathlib.Path = path.with_name(
+        plan.apply_directory(str(path.parent), [path.name])[0]
+    )
+    if new_path != path:
+        path.replace(new_path)
 
-    # Verify both extension arguments exist if one is provided
-    extold_provided: bool = extold is not None
-    extnew_provided: bool = extnew is not None
-    if extold_provided ^ extnew_provided:
-        missing_arg = "extnew" if extold_provided else "extold"
-        raise TypeError(
-            f'{modify_filename.__name__}() missing 1 argument: "{missing_arg}".'
-        )
 
-    # Verify both substring arguments exist if one is provided
-    regex_provided: bool = regex is not None
-    sub_provided: bool = sub is not None
-    if regex_provided ^ sub_provided:
-        missing_arg = "sub" if regex_provided else "regex"
-        raise TypeError(
-            f'{modify_filename.__name__}() missing 1 argument: "{missing_arg}".'
-        )
+def _print_results(
+    results: Iterable[RenameResult],
+    counts: dict[str, int] | None = None,
+    writer: RecordWriter | None = None,
+) -> None:
+    """Write planned renames that change a filename, and failures, to stdout.
+
+    With a writer, every result is written as a record instead. Results are
+    counted by status into counts as they are handled.
+    """
+
+    for result in results:
+        old, new, status, error = result
+        if counts is not None:
+            counts[status] = counts.get(status, 0) + 1
+        if writer is not None:
+            writer.write(result)
+        elif error is not None:
+            print(error)
+        elif status == PLANNED and old != new:
+            sys.stdout.write(f"{old} -> {new}\n")
+
+
+def _exit_status(counts: dict[str, int], aborted: bool = False) -> int:
+    """Return the CLI's exit status for results counted by status.
+
+    A run is a failure if nothing was renamed (or planned) but something went
+    wrong, and a partial failure if some renames were made and others not.
+    Renames are only skipped or reversed because another failed, so failures
+    alone decide whether something went wrong.
+    """
+
+    made: int = counts.get(RENAMED, 0) + counts.get(PLANNED, 0)
+    if not aborted and not counts.get(FAILED):
+        return EXIT_SUCCESS
+    return EXIT_PARTIAL if made else EXIT_FAILURE
 
-    # Replace extension if provided
-    if extold and extnew:
-        extnew = extnew.replace(".", "")
-        extold = extold.replace(".", "")
-
-        # Replace only filenames with oldext (or ALL)
-        if extold == ALL or new_filepath.suffix == f".{extold}":
-            new_filepath = pathlib.Path(f"{path.parent}/{new_filepath.stem}.{extnew}")
-
-    # Replace substrings if provided
-    if regex_provided and sub_provided:
-        new_filename: str = re.sub(regex or "", sub or "", new_filepath.name)
-        new_filepath = new_filepath.with_name(new_filename)
-        # new_filepath = pathlib.Path(re.sub(r"^\d+\.? ?", "", new_filepath))
-
-    # Insert prefix if one is provided
-    if prefix:
-        new_filepath = pathlib.Path(f"{path.parent}/{prefix}{new_filepath.name}")
-
-    # Insert suffix if one is provided
-    if suffix:
-        new_filepath = pathlib.Path(
-            f"{path.parent}/{new_filepath.stem}{suffix}{new_filepath.suffix}"
-        )
 
-    # Replace old file with new
-    path.replace(new_filepath)
+def main() -> int:
+    """Parse command-line arguments and invoke filename modification logic.
 
+    Returns EXIT_SUCCESS, EXIT_PARTIAL or EXIT_FAILURE.
+    """
+    import argparse
+    from contextlib import ExitStack
+    import pathlib
+    import re
+
+    argv: list[str] = sys.argv[1:]
+    if argv[:1] == ["undo"] or argv[:1] == ["resume"]:
+        return _journal_main(argv)
 
-def main() -> None:
-    """Parse command-line arguments and invoke filename modification logic."""
     parser = argparse.ArgumentParser(
         prog="FilenameManager",
         description="Modify all filenames in a given directory.",
+        epilog="Run 'FilenameManager undo JOURNAL' or 'FilenameManager resume "
+        "JOURNAL' to reverse or finish a run recorded with --journal. Exits with "
+        f"status {EXIT_SUCCESS} if every rename succeeded, {EXIT_PARTIAL} if some "
+        f"failed and {EXIT_FAILURE} if none succeeded.",
     )
     parser.add_argument(
-        "path", type=pathlib.Path, help="the path to directory of files to modify"
+        "path",
+        type=pathlib.Path,
+        nargs="?",
+        help="the path to directory of files to modify",
     )
     parser.add_argument("-p", "--prefix", type=str, help="what to put before filenames")
     parser.add_argument(
@@ -149,22 +1661,514 @@ def main() -> None:
         "-r", "--regex", type=str, help="regular expression to check in filenames"
     )
     parser.add_argument("--sub", type=str, help="substring to replace based on regex")
-    args = parser.parse_args()
+    parser.add_argument(
+        "-t",
+        "--template",
+        type=str,
+        help="template for new filenames, with fields {n} (number within the "
+        "directory, in order of filename), {stem}, {ext}, {parent} and {mtime}, "
+        "e.g. 'Vacation_{n:04d}{ext}'",
+    )
+    parser.add_argument(
+        "--rules",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="TOML or JSON file of rules to apply in order, instead of the options "
+        "above",
+    )
+    parser.add_argument(
+        "--follow-symlinks",
+        action="store_true",
+        help="follow symbolic links to files and directories",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="only rename files whose names match GLOB (may be repeated)",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="leave files and skip directories whose names match GLOB, such as "
+        "'.git' or 'node_modules' (may be repeated)",
+    )
+    parser.add_argument(
+        "--ext",
+        action="append",
+        default=[],
+        metavar="EXT",
+        help="only rename files with extension EXT (may be repeated)",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        metavar="N",
+        help="descend at most N directories below path (0 for path only)",
+    )
+    parser.add_argument(
+        "--min-size",
+        type=int,
+        metavar="BYTES",
+        help="only rename files of at least BYTES bytes",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        metavar="BYTES",
+        help="only rename files of at most BYTES bytes",
+    )
+    parser.add_argument(
+        "--older-than",
+        type=float,
+        metavar="DAYS",
+        help="only rename files last modified more than DAYS days ago",
+    )
+    parser.add_argument(
+        "--newer-than",
+        type=float,
+        metavar="DAYS",
+        help="only rename files last modified less than DAYS days ago",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        metavar="FILE",
+        help="rename the files listed in FILE ('-' for stdin) instead of walking "
+        "a directory",
+    )
+    parser.add_argument(
+        "-0",
+        "--null",
+        action="store_true",
+        help="manifest paths are separated by NUL, as from 'find -print0', rather "
+        "than by newlines",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running, renaming files as they arrive in path (files already "
+        "there are left alone)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        metavar="SECONDS",
+        help="with --watch, rename a file once no event has been seen for it for "
+        "SECONDS (default: 0.2)",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        metavar="SECONDS",
+        help="with --watch, poll directories every SECONDS instead of using inotify",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the renames that would be made without making them",
+    )
+    parser.add_argument(
+        "--check-first",
+        action="store_true",
+        help="check the whole tree for collisions before renaming anything, "
+        "rather than directory by directory (walks the tree twice)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="number of threads to perform renames with (default: 1)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        metavar="N",
+        help="number of processes to apply rename rules with, for expensive "
+        "regular expressions on large trees (default: 1)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=0,
+        metavar="N",
+        help="plan and rename each directory N files at a time, bounding the "
+        "memory a huge directory takes",
+    )
+    parser.add_argument(
+        "--atomic",
+        action="store_true",
+        help="reverse the other renames of a directory (or chunk) in which a "
+        "rename fails",
+    )
+    parser.add_argument(
+        "--index",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="SQLite file recording handled directories, so that later runs with "
+        "the same rules skip unchanged directories",
+    )
+    parser.add_argument(
+        "--memo",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="JSON file caching the new names the rules give filenames, so that "
+        "names repeating within and across runs have the rules applied once",
+    )
+    parser.add_argument(
+        "--memo-size",
+        type=int,
+        default=100_000,
+        metavar="N",
+        help="with --memo, keep the N most recently used names (default: 100000)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="new file to record every rename in before it is made, for use with "
+        "the 'undo' and 'resume' commands",
+    )
+    parser.add_argument(
+        "--fsync-every",
+        type=int,
+        default=10_000,
+        metavar="N",
+        help="force the journal to disk after every N renames (default: 10000)",
+    )
+    _add_output_argument(parser)
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="print counters and timings for each phase to stderr, as a table "
+        "(default) or JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="profile the run with cProfile and save the results to FILE",
+    )
+    args = parser.parse_args(argv)
+    if (args.path is None) == (args.manifest is None):
+        parser.error("give either a path or --manifest")
+    if args.rules is not None:
+        options = ("prefix", "suffix", "extold", "extnew", "regex", "sub", "template")
+        for option in options:
+            if getattr(args, option) is not None:
+                parser.error(f"--{option} cannot be used with --rules")
+    # Worker processes apply the rules without the memo
+    if args.memo is not None and args.processes > 1:
+        parser.error("--memo cannot be used with --processes")
+    if args.manifest is not None and args.index is not None:
+        parser.error("--index cannot be used with --manifest")
+    # Numbering new files would start again from 1 in an indexed directory
+    if args.template is not None and args.index is not None:
+        parser.error("--template cannot be used with --index")
+    # A manifest is streamed a directory at a time, leaving nothing to share out
+    if args.manifest is not None and args.processes > 1:
+        parser.error("--processes cannot be used with --manifest")
+    # Every listed path is renamed as given, so filter the list before it instead
+    if args.manifest is not None:
+        for option in (
+            "include",
+            "exclude",
+            "ext",
+            "max_depth",
+            "min_size",
+            "max_size",
+            "older_than",
+            "newer_than",
+        ):
+            if getattr(args, option) not in (None, []):
+                parser.error(
+                    f"--{option.replace('_', '-')} cannot be used with --manifest"
+                )
+    # Files age between runs, but an indexed run skips unchanged directories
+    if args.index is not None and (
+        args.older_than is not None or args.newer_than is not None
+    ):
+        parser.error("--index cannot be used with --older-than or --newer-than")
+    if args.chunk_size and (
+        args.manifest is not None
+        or args.watch
+        or args.index is not None
+        or args.processes > 1
+        or args.template is not None
+    ):
+        parser.error(
+            "--chunk-size cannot be used with --manifest, --watch, --index, "
+            "--processes or --template"
+        )
+    # A manifest can only be read once, and a watch has no tree to check
+    if args.check_first and (args.manifest is not None or args.watch):
+        parser.error("--check-first cannot be used with --manifest or --watch")
+    if args.atomic and (args.manifest is not None or args.watch):
+        parser.error("--atomic cannot be used with --manifest or --watch")
+    if args.watch:
+        if args.path is None:
+            parser.error("--watch needs a path")
+        for option in ("index", "template", "older_than", "newer_than"):
+            if getattr(args, option) is not None:
+                parser.error(
+                    f"--{option.replace('_', '-')} cannot be used with --watch"
+                )
+
+    stats: RenameStats | None = None
+    if args.stats is not None:
+        from filename_manager.stats import RenameStats
+
+        stats = RenameStats()
+
+    profiler: cProfile.Profile | None = None
+    if args.profile is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
 
+    counts: dict[str, int] = {}
+    aborted = False
+    # Errors that stop the run, reported rather than raised (renames that fail are
+    # reported as results instead)
+    errors: tuple[type[Exception], ...] = (OSError, TypeError, ValueError, re.error)
     try:
-        modify_filenames(
-            args.path,
-            args.prefix,
-            args.suffix,
-            args.extold,
-            args.extnew,
-            args.regex,
-            args.sub,
+        start: float = perf_counter()
+        plan: RenamePlan
+        if args.rules is not None:
+            from filename_manager.rules import load_rules
+
+            plan = load_rules(args.rules)
+        else:
+            plan = RenamePlan(
+                args.prefix,
+                args.suffix,
+                args.extold,
+                args.extnew,
+                args.regex,
+                args.sub,
+                args.template,
+            )
+        entry_filter: EntryFilter | None = None
+        limits: list[float | None] = [
+            args.max_depth,
+            args.min_size,
+            args.max_size,
+            args.older_than,
+            args.newer_than,
+        ]
+        if args.include or args.exclude or args.ext or limits != [None] * 5:
+            from filename_manager.filters import EntryFilter
+
+            day: int = 24 * 60 * 60
+            entry_filter = EntryFilter(
+                args.include,
+                args.exclude,
+                args.ext,
+                args.max_depth,
+                args.min_size,
+                args.max_size,
+                None if args.older_than is None else args.older_than * day,
+                None if args.newer_than is None else args.newer_than * day,
+            )
+        if stats is not None:
+            stats.add("validate", perf_counter() - start)
+
+        with ExitStack() as stack:
+            writer: RecordWriter | None = None
+            if args.output is not None:
+                from filename_manager.output import DEFAULT_BATCH_SIZE, RecordWriter
+
+                # A watch waits for files between batches, so write each record
+                writer = stack.enter_context(
+                    RecordWriter(
+                        sys.stdout.buffer,
+                        args.output,
+                        1 if args.watch else DEFAULT_BATCH_SIZE,
+                    )
+                )
+
+            if args.memo is not None:
+                from filename_manager.memo import MemoizedPlan, RuleMemo
+
+                memo = RuleMemo.load(args.memo, args.memo_size)
+                stack.callback(memo.save, args.memo)
+                plan = MemoizedPlan(plan, memo, stats)
+
+            index: DirectoryIndex | None = None
+            if args.index is not None:
+                import sqlite3
+
+                from filename_manager.index import DirectoryIndex
+
+                errors += (sqlite3.Error,)
+                index = stack.enter_context(
+                    DirectoryIndex(
+                        args.index,
+                        f"{plan.fingerprint}:{args.follow_symlinks}:{entry_filter!r}",
+                    )
+                )
+
+            journal: Journal | None = None
+            if args.journal is not None and not args.dry_run:
+                from filename_manager.journal import Journal
+
+                journal = stack.enter_context(Journal(args.journal, args.fsync_every))
+                # Resuming a watch must not rename the files that were already there
+                journal.write_header(
+                    None if args.watch else args.path,
+                    plan,
+                    args.follow_symlinks,
+                    entry_filter,
+                )
+
+            results: Iterator[RenameResult]
+            if args.watch:
+                from filename_manager.watch import watch_renames
+
+                results = watch_renames(
+                    args.path,
+                    plan,
+                    args.follow_symlinks,
+                    args.dry_run,
+                    args.workers,
+                    journal,
+                    stats,
+                    entry_filter,
+                    args.debounce,
+                    args.poll,
+                )
+            elif args.manifest is None:
+                results = iter_renames(
+                    args.path,
+                    plan,
+                    args.follow_symlinks,
+                    args.dry_run,
+                    args.workers,
+                    index,
+                    journal,
+                    stats=stats,
+                    processes=args.processes,
+                    entry_filter=entry_filter,
+                    chunk_size=args.chunk_size,
+                    atomic=args.atomic,
+                    check_first=args.check_first,
+                )
+            else:
+                manifest: BinaryIO = (
+                    sys.stdin.buffer
+                    if args.manifest == "-"
+                    else stack.enter_context(open(args.manifest, "rb"))
+                )
+                results = iter_manifest_renames(
+                    read_manifest(manifest, b"\0" if args.null else b"\n"),
+                    plan,
+                    args.dry_run,
+                    args.workers,
+                    journal,
+                    stats,
+                )
+            try:
+                _print_results(results, counts, writer)
+            except KeyboardInterrupt:
+                # Watching only ends when interrupted
+                if not args.watch:
+                    raise
+    except errors as e:
+        # Keep stdout for records when writing them
+        print(e, file=sys.stdout if args.output is None else sys.stderr)
+        aborted = True
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if stats is not None:
+            print(
+                stats.to_json() if args.stats == "json" else stats.summary(),
+                file=sys.stderr,
+            )
+    if args.output is None:
+        print()
+    return _exit_status(counts, aborted)
+
+
+def _add_output_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the --output option, shared by every command."""
+
+    parser.add_argument(
+        "--output",
+        choices=["jsonl", "tsv", "null"],
+        help="write a record of every file handled to stdout, as JSON lines, "
+        "tab-separated lines or NUL-terminated fields (status, old, new, error)",
+    )
+
+
+def _journal_main(argv: list[str]) -> int:
+    """Parse the arguments of the 'undo' and 'resume' commands and run them."""
+    import argparse
+    from contextlib import ExitStack
+    import pathlib
+
+    from filename_manager.journal import resume_journal, undo_journal
+
+    command: str = argv[0]
+    parser = argparse.ArgumentParser(
+        prog=f"FilenameManager {command}",
+        description="Reverse every rename recorded in a journal."
+        if command == "undo"
+        else "Finish the interrupted job recorded in a journal.",
+    )
+    parser.add_argument("journal", type=pathlib.Path, help="the journal file")
+    if command == "resume":
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            metavar="N",
+            help="number of threads to perform renames with (default: 1)",
+        )
+        parser.add_argument(
+            "--fsync-every",
+            type=int,
+            default=10_000,
+            metavar="N",
+            help="force the journal to disk after every N renames (default: 10000)",
         )
-    except (NotADirectoryError, ValueError) as e:
-        print(e)
-    print()
+    _add_output_argument(parser)
+    args = parser.parse_args(argv[1:])
+
+    counts: dict[str, int] = {}
+    aborted = False
+    try:
+        with ExitStack() as stack:
+            writer: RecordWriter | None = None
+            if args.output is not None:
+                from filename_manager.output import RecordWriter
+
+                writer = stack.enter_context(
+                    RecordWriter(sys.stdout.buffer, args.output)
+                )
+
+            if command == "undo":
+                results: Iterator[RenameResult] = undo_journal(args.journal)
+            else:
+                results = resume_journal(args.journal, args.fsync_every, args.workers)
+            _print_results(results, counts, writer)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stdout if args.output is None else sys.stderr)
+        aborted = True
+    if args.output is None:
+        print()
+    return _exit_status(counts, aborted)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
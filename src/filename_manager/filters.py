@@ -0,0 +1,194 @@
+"""Entry Filters
+
+This module contains a filter deciding, while a tree is walked, which files are
+renamed and which directories are descended into.
+
+Include and exclude glob patterns (matched against entry names, as fnmatch does,
+case-sensitively), file extensions and a maximum depth are compiled once into a
+single regular expression for files and one for directories. These decisions are
+made from an entry's name alone, so rejected entries cost no stat call, and an
+excluded directory such as .git or node_modules is never scanned at all.
+
+Size and age limits are checked afterwards, only for files the name rules
+accept, against a compact FileInfo record taken from the single stat that
+os.DirEntry caches.
+
+This file can be imported as a module and contains the following classes:
+
+    * FileInfo
+    * EntryFilter
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+import fnmatch
+import os
+import re
+import time
+from typing import Any
+
+
+class FileInfo:
+    """The metadata of one file that filters read, taken from a single stat."""
+
+    __slots__ = ("size", "mtime")
+
+    def __init__(self, size: int, mtime: float) -> None:
+        self.size: int = size
+        self.mtime: float = mtime
+
+    @classmethod
+    def from_entry(cls, entry: os.DirEntry[str]) -> FileInfo:
+        """Return the metadata of entry, reusing its cached stat if it has one."""
+
+        stat: os.stat_result = entry.stat()
+        return cls(stat.st_size, stat.st_mtime)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(size = {self.size}, mtime = {self.mtime})"
+        )
+
+
+class EntryFilter:
+    """Include/exclude globs, extensions and a depth limit, compiled once.
+
+    A file is renamed if its name matches an include pattern (or none are given),
+    matches no exclude pattern and has one of the extensions (or none are given).
+    A directory is descended into if its name matches no exclude pattern and it
+    lies no deeper than max_depth, where the directory being walked has depth 0.
+
+    A file accepted by name must also lie within the given sizes (in bytes) and
+    ages (in seconds since last modified, measured from when the filter was
+    made, or from now if given). These limits cost one stat per file, and only
+    when given.
+    """
+
+    __slots__ = (
+        "include",
+        "exclude",
+        "extensions",
+        "max_depth",
+        "min_size",
+        "max_size",
+        "min_age",
+        "max_age",
+        "now",
+        "__file_match",
+        "__directory_match",
+    )
+
+    def __init__(
+        self,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        extensions: Iterable[str] = (),
+        max_depth: int | None = None,
+        min_size: int | None = None,
+        max_size: int | None = None,
+        min_age: float | None = None,
+        max_age: float | None = None,
+        now: float | None = None,
+    ) -> None:
+        # Confirm limits are valid
+        for arg, value in (
+            ("max depth", max_depth),
+            ("min size", min_size),
+            ("max size", max_size),
+            ("min age", min_age),
+            ("max age", max_age),
+        ):
+            if value is not None and value < 0:
+                raise ValueError(f"{arg} must not be negative: '{value}'")
+
+        self.include: tuple[str, ...] = tuple(include)
+        self.exclude: tuple[str, ...] = tuple(exclude)
+        # Store extensions without their leading dot, as given to RenamePlan
+        self.extensions: tuple[str, ...] = tuple(
+            ext.replace(".", "") for ext in extensions
+        )
+        self.max_depth: int | None = max_depth
+        self.min_size: int | None = min_size
+        self.max_size: int | None = max_size
+        self.min_age: float | None = min_age
+        self.max_age: float | None = max_age
+        self.now: float = time.time() if now is None else now
+
+        excluded: str = "|".join(fnmatch.translate(p) for p in self.exclude)
+        included: str = "|".join(fnmatch.translate(p) for p in self.include)
+        # Extensions follow a non-empty stem, as with pathlib's suffix
+        extended: str = "|".join(
+            rf"(?s:.+\.{re.escape(ext)})\Z" for ext in self.extensions
+        )
+
+        # Combine every file rule into lookaheads of a single expression
+        self.__file_match: Callable[[str], re.Match[str] | None] = re.compile(
+            (f"(?!{excluded})" if excluded else "")
+            + (f"(?={included})" if included else "")
+            + (f"(?={extended})" if extended else "")
+        ).match
+        self.__directory_match: Callable[[str], re.Match[str] | None] | None = (
+            re.compile(f"(?!{excluded})").match if excluded else None
+        )
+
+    def accepts_file(self, name: str) -> bool:
+        """Return whether a file of given name should be renamed."""
+
+        return self.__file_match(name) is not None
+
+    @property
+    def uses_metadata(self) -> bool:
+        """Whether files must be stat'ed to be checked by accepts_info()."""
+
+        return not (
+            self.min_size is None
+            and self.max_size is None
+            and self.min_age is None
+            and self.max_age is None
+        )
+
+    def accepts_info(self, info: FileInfo) -> bool:
+        """Return whether a file with given metadata should be renamed."""
+
+        age: float = self.now - info.mtime
+        return not (
+            (self.min_size is not None and info.size < self.min_size)
+            or (self.max_size is not None and info.size > self.max_size)
+            or (self.min_age is not None and age < self.min_age)
+            or (self.max_age is not None and age > self.max_age)
+        )
+
+    def descends(self, name: str, depth: int) -> bool:
+        """Return whether a directory of given name and depth should be walked."""
+
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        return (
+            self.__directory_match is None or self.__directory_match(name) is not None
+        )
+
+    @property
+    def arguments(self) -> dict[str, Any]:
+        """The keyword arguments that would construct an identical EntryFilter."""
+
+        return {
+            "include": list(self.include),
+            "exclude": list(self.exclude),
+            "extensions": list(self.extensions),
+            "max_depth": self.max_depth,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "min_age": self.min_age,
+            "max_age": self.max_age,
+            "now": self.now,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(include = {self.include!r}, "
+            f"exclude = {self.exclude!r}, extensions = {self.extensions!r}, "
+            f"max_depth = {self.max_depth!r}, min_size = {self.min_size!r}, "
+            f"max_size = {self.max_size!r}, min_age = {self.min_age!r}, "
+            f"max_age = {self.max_age!r})"
+        )
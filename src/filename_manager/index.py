@@ -0,0 +1,190 @@
+"""Directory Index
+
+This module contains a persistent snapshot of a directory tree, stored in SQLite,
+that lets repeated runs with the same rename rules skip directories that have not
+changed since the previous run.
+
+Each directory is recorded with its modification time, the names of the files it
+held after renaming and the names of its subdirectories. A directory whose mtime
+is unchanged is not scanned at all; in a changed directory only the files that
+were not recorded are passed through the rename rules.
+
+This file can be imported as a module and contains the following classes:
+
+    * DirectoryIndex
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from types import TracebackType
+import zlib
+
+_SEPARATOR: str = "\0"
+
+
+class DirectoryIndex:
+    """A SQLite-backed record of directories handled by earlier runs.
+
+    The index is tied to a fingerprint of the rename rules it was built with; if
+    the fingerprint differs when the index is opened, every record is discarded.
+    Records made during a run only become visible to later runs after commit(),
+    or after abandon() for the directories whose renames were finished.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], fingerprint: str) -> None:
+        self.path: str = os.fspath(path)
+        self.fingerprint: str = fingerprint
+        # Records of directories whose renames are not done yet, by absolute path;
+        # they are only written once stamped, so an abandoned run leaves them out
+        self.__pending: dict[str, tuple[bytes, bytes]] = {}
+        self.__connection: sqlite3.Connection = sqlite3.connect(self.path)
+        self.__connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                names BLOB NOT NULL,
+                subdirs BLOB NOT NULL
+            );
+            """
+        )
+
+        # Discard every record if the rename rules have changed
+        row = self.__connection.execute(
+            "SELECT value FROM meta WHERE key = 'fingerprint'"
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            self.__connection.execute("DELETE FROM directories")
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,)
+            )
+            self.__connection.commit()
+
+    def unchanged_subdirs(self, directory: str) -> list[str] | None:
+        """Return the subdirectories of directory if it is unchanged, else None."""
+
+        try:
+            mtime_ns: int = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            self.discard(directory)
+            return None
+
+        row = self.__connection.execute(
+            "SELECT subdirs FROM directories WHERE path = ? AND mtime_ns = ?",
+            (os.path.abspath(directory), mtime_ns),
+        ).fetchone()
+        if row is None:
+            return None
+        return [os.path.join(directory, name) for name in _unpack(row[0])]
+
+    def names(self, directory: str) -> set[str]:
+        """Return the filenames recorded for directory (empty if unrecorded)."""
+
+        row = self.__connection.execute(
+            "SELECT names FROM directories WHERE path = ?",
+            (os.path.abspath(directory),),
+        ).fetchone()
+        return set(_unpack(row[0])) if row is not None else set()
+
+    def record(self, directory: str, names: list[str], subdirs: list[str]) -> None:
+        """Record the filenames a directory will hold once it has been renamed.
+
+        The record is held back until stamp() reads the directory's mtime once
+        its renames are done (or commit() does, for directories never stamped).
+        """
+
+        self.__pending[os.path.abspath(directory)] = (
+            _pack(names),
+            _pack([os.path.basename(subdir) for subdir in subdirs]),
+        )
+
+    def stamp(self, directory: str) -> None:
+        """Record the mtime of a directory recorded during this run.
+
+        Call it as soon as the directory's renames are done, so that files that
+        arrive in it later in the run change its mtime and are renamed next time.
+        """
+
+        path: str = os.path.abspath(directory)
+        record: tuple[bytes, bytes] | None = self.__pending.pop(path, None)
+        if record is None:
+            return
+        try:
+            mtime_ns: int = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.discard(path)
+            return
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)",
+            (path, mtime_ns, *record),
+        )
+
+    def discard(self, directory: str) -> None:
+        """Forget directory, so that it is fully scanned on the next run."""
+
+        path: str = os.path.abspath(directory)
+        self.__pending.pop(path, None)
+        self.__connection.execute("DELETE FROM directories WHERE path = ?", (path,))
+
+    def commit(self) -> None:
+        """Stamp directories not yet stamped with their mtime and save."""
+
+        for directory in list(self.__pending):
+            self.stamp(directory)
+        self.__connection.commit()
+
+    def abandon(self) -> None:
+        """Save the directories stamped so far, dropping those never stamped.
+
+        Call it when a run stops early, so that directories already renamed are
+        not renamed again by the next run.
+        """
+
+        self.__pending.clear()
+        self.__connection.commit()
+
+    def rollback(self) -> None:
+        """Drop every record made since the last commit()."""
+
+        self.__pending.clear()
+        self.__connection.rollback()
+
+    def close(self) -> None:
+        """Close the index, dropping uncommitted records."""
+
+        self.__connection.close()
+
+    def __enter__(self) -> DirectoryIndex:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(path = {self.path}, "
+            f"fingerprint = {self.fingerprint})"
+        )
+
+
+def _pack(names: list[str]) -> bytes:
+    """Compress a list of names into a single blob."""
+
+    return zlib.compress(_SEPARATOR.join(names).encode("utf-8", "surrogateescape"))
+
+
+def _unpack(blob: bytes) -> list[str]:
+    """Expand a blob made by _pack() back into a list of names."""
+
+    if not blob:
+        return []
+    text: str = zlib.decompress(blob).decode("utf-8", "surrogateescape")
+    return text.split(_SEPARATOR) if text else []
@@ -0,0 +1,315 @@
+"""Rename Journal
+
+This module contains an append-only journal of renames, written before the renames
+are made, so that an interrupted run can be undone or resumed.
+
+A journal is a text file of JSON lines. The first line describes the job (the
+path, rename rules, symlink handling and entry filter); every following line is
+either a batch of renames within one directory, written and flushed before any
+of them is made, or a marker recording that a batch has been handled. Forcing
+the journal to disk with fsync happens once per fsync_every renames rather than
+once per file.
+
+This file can be imported as a module and contains the following classes and
+functions:
+
+    * Journal
+    * undo_journal
+    * resume_journal
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+import json
+import os
+import pathlib
+from types import TracebackType
+from typing import TYPE_CHECKING, Any
+
+from filename_manager.filename_manager import (
+    FAILED,
+    RENAMED,
+    SKIPPED,
+    Rename,
+    RenamePlan,
+    RenameResult,
+    _plan_from_arguments,
+    iter_renames,
+)
+
+if TYPE_CHECKING:
+    from filename_manager.filters import EntryFilter
+
+_BATCH: str = "B"
+_DONE: str = "D"
+
+
+class Journal:
+    """An append-only record of renames, written before the renames are made.
+
+    A journal for a new job must be given its header with write_header() before
+    it is passed to iter_renames(). Opening a new journal fails if the file
+    already exists, so that the record of an earlier run is never overwritten;
+    with append, an existing journal is continued instead.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        fsync_every: int = 10_000,
+        append: bool = False,
+    ) -> None:
+        self.path: str = os.fspath(path)
+        self.fsync_every: int = fsync_every
+        self.__next_batch: int = 0
+        self.__unsynced: int = 0
+        if append:
+            for record in _read_records(self.path):
+                self.__next_batch = max(self.__next_batch, record[1] + 1)
+        self.__file = open(self.path, "a" if append else "x", encoding="utf-8")
+
+    def write_header(
+        self,
+        path: pathlib.Path | None,
+        plan: RenamePlan,
+        follow_symlinks: bool = False,
+        entry_filter: EntryFilter | None = None,
+    ) -> None:
+        """Record the job being run, so that it can later be resumed.
+
+        The path is None for a job renaming the files of a manifest.
+        """
+
+        self.__write(
+            {
+                "path": None if path is None else os.path.abspath(path),
+                "rules": plan.arguments,
+                "follow_symlinks": follow_symlinks,
+                "filter": None if entry_filter is None else entry_filter.arguments,
+            }
+        )
+        self.__sync()
+
+    def write_batch(self, renames: list[Rename]) -> int:
+        """Record a batch of renames within one directory, returning its id.
+
+        The batch reaches the operating system before this returns, and is forced
+        to disk once fsync_every renames have been written since the last fsync.
+        """
+
+        batch_id: int = self.__next_batch
+        self.__next_batch += 1
+        pairs: list[tuple[str, str]] = [
+            (r.old, r.new) for r in renames if r.old != r.new
+        ]
+        if not pairs:
+            return batch_id
+
+        self.__write([_BATCH, batch_id, os.path.abspath(renames[0].directory), pairs])
+        self.__unsynced += len(pairs)
+        if self.fsync_every and self.__unsynced >= self.fsync_every:
+            self.__sync()
+        return batch_id
+
+    def finish_batch(self, batch_id: int) -> None:
+        """Record that every rename in a batch has been handled."""
+
+        self.__write([_DONE, batch_id])
+
+    def close(self) -> None:
+        """Force the journal to disk and close it."""
+
+        if not self.__file.closed:
+            self.__sync()
+            self.__file.close()
+
+    def __write(self, record: Any) -> None:
+        # Keep the default ASCII escaping so undecodable (surrogate) names survive
+        self.__file.write(json.dumps(record) + "\n")
+        self.__file.flush()
+
+    def __sync(self) -> None:
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__unsynced = 0
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(path = {self.path}, "
+            f"fsync_every = {self.fsync_every})"
+        )
+
+
+def undo_journal(path: str | os.PathLike[str]) -> Iterator[RenameResult]:
+    """Reverse every rename recorded in journal, yielding a result for each.
+
+    Batches are undone last first, read one at a time, so that a name given out
+    by one batch and renamed again by a later one is freed before it is needed.
+    Renames that were never made are yielded as SKIPPED; a rename is not reversed
+    if its old name has since been taken by another file.
+    """
+
+    # A rename was made if its old name is gone, or was given out by a later
+    # rename made (and so undone already), as resume_journal() finds
+    join = os.path.join
+    lexists = os.path.lexists
+    given_out: dict[str, set[str]] = {}
+    for _, directory, pairs in _read_batches(path, reverse=True):
+        later: set[str] = given_out.setdefault(directory, set())
+        for old, new in reversed(pairs):
+            old_path: str = join(directory, old)
+            new_path: str = join(directory, new)
+            if old not in later and lexists(old_path):
+                # The rename was recorded but never made
+                yield RenameResult(new_path, old_path, SKIPPED)
+                continue
+            later.add(new)
+            if lexists(old_path):
+                error = FileExistsError(f"cannot undo, name is taken: '{old_path}'")
+                yield RenameResult(new_path, old_path, FAILED, error)
+                continue
+            try:
+                os.replace(new_path, old_path)
+            except OSError as e:
+                yield RenameResult(new_path, old_path, FAILED, e)
+            else:
+                yield RenameResult(new_path, old_path, RENAMED)
+
+
+def resume_journal(
+    path: str | os.PathLike[str], fsync_every: int = 10_000, workers: int = 1
+) -> Iterator[RenameResult]:
+    """Finish the job recorded in journal, yielding a result for each file.
+
+    Renames from batches that were not finished are completed first. The job's
+    path is then walked again with its rules and entry filter (measuring ages
+    from when the job started), leaving alone every file the journal shows was
+    already renamed, and the new renames are appended to the journal.
+    A job that renamed the files of a manifest has no path to walk, so only its
+    unfinished batches are completed.
+    """
+
+    with open(path, encoding="utf-8") as file:
+        header: dict[str, Any] = json.loads(file.readline())
+
+    finished: set[int] = {
+        record[1] for record in _read_records(path) if record[0] == _DONE
+    }
+
+    # Which renames of each unfinished batch were made, found last first: a rename
+    # was made if its old name is gone, or was given out by a later rename made
+    join = os.path.join
+    lexists = os.path.lexists
+    given_out: dict[str, set[str]] = {}
+    made: dict[int, list[bool]] = {}
+    for batch_id, directory, pairs in _read_batches(path, reverse=True):
+        later: set[str] = given_out.setdefault(directory, set())
+        flags: list[bool] = []
+        for old, new in reversed(pairs):
+            flags.append(old in later or not lexists(join(directory, old)))
+            if flags[-1]:
+                later.add(new)
+        if batch_id not in finished:
+            made[batch_id] = flags[::-1]
+    del given_out
+
+    # Names already given out, by directory, which the rules must not touch again
+    keep: dict[str, set[str]] = {}
+    for batch_id, directory, pairs in _read_batches(path):
+        keep.setdefault(directory, set()).update(new for _, new in pairs)
+        if batch_id in finished:
+            continue
+        for (old, new), was_made in zip(pairs, made[batch_id]):
+            old_path: str = join(directory, old)
+            new_path: str = join(directory, new)
+            if was_made:
+                # Already made before the run was interrupted
+                yield RenameResult(old_path, new_path, SKIPPED)
+            elif os.path.lexists(new_path):
+                error = FileExistsError(f"rename target already exists: '{new_path}'")
+                yield RenameResult(old_path, new_path, FAILED, error)
+            else:
+                try:
+                    os.replace(old_path, new_path)
+                except OSError as e:
+                    yield RenameResult(old_path, new_path, FAILED, e)
+                else:
+                    yield RenameResult(old_path, new_path, RENAMED)
+
+    if header["path"] is None:
+        return
+
+    entry_filter: EntryFilter | None = None
+    if header.get("filter") is not None:
+        from filename_manager.filters import EntryFilter
+
+        entry_filter = EntryFilter(**header["filter"])
+
+    with Journal(path, fsync_every, append=True) as journal:
+        yield from iter_renames(
+            pathlib.Path(header["path"]),
+            _plan_from_arguments(header["rules"]),
+            header["follow_symlinks"],
+            workers=workers,
+            journal=journal,
+            keep=keep,
+            entry_filter=entry_filter,
+        )
+
+
+def _read_records(path: str | os.PathLike[str]) -> Iterator[list[Any]]:
+    """Yield every record after the header, reading the journal line by line.
+
+    A final line left incomplete by a crash is ignored.
+    """
+
+    with open(path, encoding="utf-8") as file:
+        file.readline()
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
+
+
+def _read_batches(
+    path: str | os.PathLike[str], reverse: bool = False
+) -> Iterator[tuple[int, str, list[list[str]]]]:
+    """Yield the id, directory and (old, new) name pairs of every batch.
+
+    With reverse, the batches are yielded last first. Only the offset of each
+    batch's line is held, and the lines are read again in reverse.
+    """
+
+    if not reverse:
+        for record in _read_records(path):
+            if record[0] == _BATCH:
+                yield record[1], record[2], record[3]
+        return
+
+    prefix: bytes = json.dumps([_BATCH]).encode()[:-1]
+    offsets: list[int] = []
+    with open(path, "rb") as file:
+        offset: int = len(file.readline())
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            if line.startswith(prefix):
+                offsets.append(offset)
+            offset += len(line)
+
+        for offset in reversed(offsets):
+            file.seek(offset)
+            batch: list[Any] = json.loads(file.readline())
+            yield batch[1], batch[2], batch[3]
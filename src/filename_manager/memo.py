@@ -0,0 +1,270 @@
+"""Rule Memoization
+
+This module contains a bounded cache of the new names that rename rules give
+filenames, so that names repeating across directories, shards and runs (such as
+the IMG_0001.jpg of every camera dump) have the rules applied to them once.
+
+Entries are keyed by the fingerprint of the rules and the filename, so one
+cache can be shared by jobs with different rules. Once it holds more than its
+size, the least recently used entries of the least recently used rules are
+dropped. A cache can be saved to a JSON file and loaded again by a later run.
+
+A MemoizedPlan wraps a RenamePlan to look up each batch of filenames in a cache
+before applying the rules to those it misses. Templates depend on more than the
+filename, so a plan with one bypasses the cache.
+
+This file can be imported as a module and contains the following classes:
+
+    * RuleMemo
+    * MemoizedPlan
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+import os
+import threading
+from typing import TYPE_CHECKING, Any
+
+from filename_manager.filename_manager import RenamePlan
+
+if TYPE_CHECKING:
+    from filename_manager.stats import RenameStats
+
+DEFAULT_SIZE: int = 100_000
+
+# Version of the saved file's layout
+_FORMAT: int = 1
+
+
+class RuleMemo:
+    """A thread-safe, least-recently-used cache of the new names of filenames.
+
+    Look names up with lookup() and add the new names of those missed with
+    store(); hits and misses count the names looked up over the cache's life.
+    """
+
+    __slots__ = ("size", "hits", "misses", "__entries", "__count", "__lock")
+
+    def __init__(self, size: int = DEFAULT_SIZE) -> None:
+        # Confirm size is valid
+        if size < 1:
+            raise ValueError(f"size must be positive: '{size}'")
+
+        self.size: int = size
+        self.hits: int = 0
+        self.misses: int = 0
+        # New names by old name, by fingerprint, each least recent first; nesting
+        # them saves building a (fingerprint, name) key per name looked up
+        self.__entries: OrderedDict[str, OrderedDict[str, str]] = OrderedDict()
+        self.__count: int = 0
+        self.__lock = threading.Lock()
+
+    def lookup(self, fingerprint: str, names: list[str]) -> list[str | None]:
+        """Return the cached new name of each of names, or None where missed."""
+
+        with self.__lock:
+            entries: OrderedDict[str, str] | None = self.__entries.get(fingerprint)
+            if entries is None:
+                self.misses += len(names)
+                return [None] * len(names)
+            self.__entries.move_to_end(fingerprint)
+
+            new_names: list[str | None] = list(map(entries.get, names))
+            n_misses: int = new_names.count(None)
+            move_to_end = entries.move_to_end
+            if n_misses:
+                for name, new in zip(names, new_names):
+                    if new is not None:
+                        move_to_end(name)
+            else:
+                for name in names:
+                    move_to_end(name)
+            self.hits += len(names) - n_misses
+            self.misses += n_misses
+        return new_names
+
+    def store(self, fingerprint: str, names: Iterable[tuple[str, str]]) -> None:
+        """Add the new name of each (old name, new name), dropping old entries."""
+
+        with self.__lock:
+            entries: OrderedDict[str, str] | None = self.__entries.get(fingerprint)
+            if entries is None:
+                entries = self.__entries[fingerprint] = OrderedDict()
+            self.__entries.move_to_end(fingerprint)
+
+            for old, new in names:
+                if old in entries:
+                    entries.move_to_end(old)
+                else:
+                    self.__count += 1
+                entries[old] = new
+
+            while self.__count > self.size:
+                oldest_fingerprint, oldest = next(iter(self.__entries.items()))
+                oldest.popitem(last=False)
+                self.__count -= 1
+                if not oldest:
+                    del self.__entries[oldest_fingerprint]
+
+    def save(self, path: str | os.PathLike[str]) -> None:
+        """Write the cache to a JSON file, replacing it in one step.
+
+        The cache is written to a new temporary file next to path, which then
+        replaces it, so a failed or concurrent save never leaves a partial file.
+        """
+        import json
+        import tempfile
+
+        with self.__lock:
+            fingerprints: dict[str, int] = {}
+            entries: list[list[Any]] = [
+                [fingerprints.setdefault(fingerprint, len(fingerprints)), old, new]
+                for fingerprint, names in self.__entries.items()
+                for old, new in names.items()
+            ]
+
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".memo-", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path))
+        )
+        try:
+            with open(fd, "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        "format": _FORMAT,
+                        "fingerprints": list(fingerprints),
+                        "entries": entries,
+                    },
+                    file,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str | os.PathLike[str], size: int = DEFAULT_SIZE) -> RuleMemo:
+        """Return a cache of given size holding what a file saved by save() does.
+
+        A missing file gives an empty cache; of a file holding more than size
+        entries, the most recently used are kept.
+        """
+        import json
+
+        memo = cls(size)
+        try:
+            with open(path, encoding="utf-8") as file:
+                document: Any = json.load(file)
+        except FileNotFoundError:
+            return memo
+        except ValueError as e:
+            raise ValueError(f"invalid memo file: '{path}' ({e})") from None
+
+        # Confirm the file is one that save() wrote
+        if not isinstance(document, dict) or document.get("format") != _FORMAT:
+            raise ValueError(f"unknown memo file format: '{path}'")
+
+        fingerprints: list[str] = document["fingerprints"]
+        for i, old, new in document["entries"][-size:]:
+            memo.__entries.setdefault(fingerprints[i], OrderedDict())[old] = new
+        memo.__count = sum(map(len, memo.__entries.values()))
+        return memo
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(size = {self.size}, "
+            f"entries = {self.__count}, hits = {self.hits}, "
+            f"misses = {self.misses})"
+        )
+
+
+class MemoizedPlan(RenamePlan):
+    """A RenamePlan whose new names are looked up in a RuleMemo first.
+
+    It can be used wherever the plan it wraps can, and is identified (by its
+    fingerprint and arguments) as that plan. Hits and misses of each batch are
+    added to stats, if given, as the memo_hits and memo_misses counts.
+    """
+
+    __slots__ = ("plan", "memo", "__fingerprint", "__stats")
+
+    def __init__(
+        self, plan: RenamePlan, memo: RuleMemo, stats: RenameStats | None = None
+    ) -> None:
+        super().__init__()
+        self.plan: RenamePlan = plan
+        self.memo: RuleMemo = memo
+        self.template = plan.template
+        self.__fingerprint: str = plan.fingerprint
+        self.__stats: RenameStats | None = stats
+
+    def apply(self, name: str) -> str:
+        """Return the new filename for given filename, as RenamePlan.apply() does."""
+
+        if self.template is not None:
+            return self.plan.apply(name)
+        return self.apply_many([name])[0]
+
+    def apply_directory(
+        self,
+        directory: str,
+        names: list[str],
+        stat: Callable[[int], os.stat_result] | None = None,
+    ) -> list[str]:
+        """Return the new filename for each of the filenames in one directory."""
+
+        if self.template is not None:
+            return self.plan.apply_directory(directory, names, stat)
+        return self.apply_many(names)
+
+    def apply_many(self, names: Iterable[str]) -> list[str]:
+        """Return the new filename for each of given filenames, as apply() does.
+
+        Only the names missing from the memo have the rules applied to them, as
+        one batch.
+        """
+
+        if self.template is not None:
+            return self.plan.apply_many(names)
+
+        batch: list[str] = list(names)
+        new_names: list[str | None] = self.memo.lookup(self.__fingerprint, batch)
+        missed: list[int] = []
+        if None in new_names:
+            missed = [i for i, new in enumerate(new_names) if new is None]
+            olds: list[str] = [batch[i] for i in missed]
+            computed: list[str] = self.plan.apply_many(olds)
+            self.memo.store(self.__fingerprint, zip(olds, computed))
+            for i, new in zip(missed, computed):
+                new_names[i] = new
+
+        if self.__stats is not None:
+            self.__stats.add(
+                "rules",
+                0.0,
+                memo_hits=len(batch) - len(missed),
+                memo_misses=len(missed),
+            )
+        # Every name missed has been filled in
+        return new_names  # type: ignore[return-value]
+
+    @property
+    def arguments(self) -> dict[str, Any]:
+        """The keyword arguments that would construct the wrapped plan."""
+
+        return self.plan.arguments
+
+    @property
+    def fingerprint(self) -> str:
+        """The fingerprint of the wrapped plan."""
+
+        return self.__fingerprint
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(plan = {self.plan!r}, memo = {self.memo!r})"
+        )
@@ -0,0 +1,139 @@
+"""Machine-Readable Output
+
+This module contains a writer of rename results as machine-readable records,
+one per file, so that a caller can tell what a run did without walking the tree
+again.
+
+The formats are:
+
+    * jsonl - one JSON object per line, with keys old, new, status and error
+      (null if none); non-ASCII characters are escaped, so undecodable filenames
+      survive as their surrogate escapes
+    * tsv - one line of status, old, new and error (empty if none) separated by
+      tabs, with backslashes, tabs, newlines and carriage returns in a field
+      escaped as \\\\, \\t, \\n and \\r
+    * null - the same four fields, each terminated by a NUL byte, as with
+      'find -print0'; fields are written as os.fsencode() encodes them
+
+Records are encoded as they come but written in batches, so that reporting
+millions of renames costs a few large writes rather than one per file.
+
+This file can be imported as a module and contains the following classes:
+
+    * RecordWriter
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from json.encoder import encode_basestring_ascii
+import os
+from types import TracebackType
+from typing import BinaryIO
+
+from filename_manager.filename_manager import RenameResult
+
+OUTPUT_FORMATS: tuple[str, ...] = ("jsonl", "tsv", "null")
+
+# Number of records written at a time
+DEFAULT_BATCH_SIZE: int = 8192
+
+_TSV_ESCAPES: dict[int, str] = {
+    ord("\\"): "\\\\",
+    ord("\t"): "\\t",
+    ord("\n"): "\\n",
+    ord("\r"): "\\r",
+}
+
+
+class RecordWriter:
+    """Rename results written to a binary file as records of a given format."""
+
+    __slots__ = ("format", "batch_size", "__file", "__records", "__encode")
+
+    def __init__(
+        self, file: BinaryIO, format: str, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> None:
+        # Confirm arguments are valid
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(f"unknown output format: '{format}'")
+        if batch_size < 1:
+            raise ValueError(f"batch size must be positive: '{batch_size}'")
+
+        self.format: str = format
+        self.batch_size: int = batch_size
+        self.__file: BinaryIO = file
+        self.__records: list[bytes] = []
+        self.__encode: Callable[[RenameResult], bytes] = _ENCODERS[format]
+
+    def write(self, result: RenameResult) -> None:
+        """Add the record of result, writing the batch once it is full."""
+
+        self.__records.append(self.__encode(result))
+        if len(self.__records) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every record not yet written."""
+
+        if self.__records:
+            self.__file.write(b"".join(self.__records))
+            self.__records.clear()
+        self.__file.flush()
+
+    def __enter__(self) -> RecordWriter:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.flush()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(format = {self.format!r}, "
+            f"batch_size = {self.batch_size})"
+        )
+
+
+def _encode_jsonl(result: RenameResult) -> bytes:
+    """Return result as a line of JSON."""
+
+    old, new, status, error = result
+    return (
+        f'{{"old": {encode_basestring_ascii(old)}, '
+        f'"new": {encode_basestring_ascii(new)}, '
+        f'"status": "{status}", "error": '
+        f"{'null' if error is None else encode_basestring_ascii(str(error))}}}\n"
+    ).encode("ascii")
+
+
+def _encode_tsv(result: RenameResult) -> bytes:
+    """Return result as a line of tab-separated, escaped fields."""
+
+    old, new, status, error = result
+    message: str = "" if error is None else str(error)
+    line: str = f"{status}\t{old}\t{new}\t{message}"
+    # Most lines need no escapes, which is quicker to check than to apply
+    if line.count("\t") != 3 or "\\" in line or "\n" in line or "\r" in line:
+        line = "\t".join(
+            field.translate(_TSV_ESCAPES) for field in (status, old, new, message)
+        )
+    return os.fsencode(line) + b"\n"
+
+
+def _encode_null(result: RenameResult) -> bytes:
+    """Return result as four NUL-terminated fields."""
+
+    old, new, status, error = result
+    return os.fsencode(f"{status}\0{old}\0{new}\0{'' if error is None else error}\0")
+
+
+_ENCODERS: dict[str, Callable[[RenameResult], bytes]] = {
+    "jsonl": _encode_jsonl,
+    "tsv": _encode_tsv,
+    "null": _encode_null,
+}
@@ -0,0 +1,247 @@
+"""Rule Pipelines
+
+This module contains a pipeline of rename rules applied in order, so that what
+would otherwise take one run (and one walk of the tree) per rule takes one.
+
+A pipeline is usually read from a rule file, in TOML or JSON, holding a list
+named rules. Each rule is a table with the keys of one kind of rule:
+
+    * regex and sub - replace matches of a regular expression
+    * prefix - put text before filenames
+    * suffix - put text after filenames (but before the extension)
+    * extold and extnew - replace an extension
+    * case - change the case of whole filenames: lower, upper or casefold
+    * template - replace filenames by a template, as RenamePlan does
+
+For example, in TOML:
+
+    [[rules]]
+    regex = "^IMG_"
+    sub = ""
+
+    [[rules]]
+    case = "lower"
+
+    [[rules]]
+    prefix = "vacation_"
+
+Each rule is applied to the names the rule before it produced. A regular
+expression is only run on names containing the text that all of its matches
+contain (as RenamePlan does), which most names of a tree usually do not.
+
+This file can be imported as a module and contains the following classes/functions:
+
+    * RulePipeline
+    * load_rules
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Mapping
+import os
+import sys
+from typing import Any, BinaryIO, Union
+
+from filename_manager.filename_manager import RenamePlan
+
+# The keys of each kind of rule
+RULE_KEYS: dict[str, tuple[str, ...]] = {
+    "regex": ("regex", "sub"),
+    "prefix": ("prefix",),
+    "suffix": ("suffix",),
+    "extension": ("extold", "extnew"),
+    "case": ("case",),
+    "template": ("template",),
+}
+
+CASES: tuple[str, ...] = ("lower", "upper", "casefold")
+
+
+class RulePipeline(RenamePlan):
+    """Rename rules applied in order, each to the names the one before produced.
+
+    Construct a RulePipeline with a list of rules, each a mapping holding the keys
+    of one kind of rule (see RULE_KEYS). It can be used wherever a RenamePlan can.
+
+    A pipeline may hold one template, which numbers a directory's files in order
+    of the names that reach it; its template attribute is then set as a
+    RenamePlan's would be.
+    """
+
+    __slots__ = ("rules", "__steps")
+
+    def __init__(self, rules: Iterable[Mapping[str, str]]) -> None:
+        super().__init__()
+        self.rules: list[dict[str, str]] = []
+        self.__steps: list[_Step] = []
+
+        for n, rule in enumerate(rules, 1):
+            kind: str = _rule_kind(rule, n)
+            self.rules.append(dict(rule))
+            if kind == "template" and self.template is not None:
+                raise ValueError(f"rule {n}: a pipeline can hold only one template")
+            self.__steps.append(_compile_rule(kind, rule, n))
+            if kind == "template":
+                self.template = rule["template"]
+
+        # Confirm there is something to do
+        if not self.rules:
+            raise ValueError("a rule pipeline needs at least one rule")
+
+    def apply(self, name: str) -> str:
+        """Return the new filename for given filename, as RenamePlan.apply() does."""
+
+        for step in self.__steps:
+            name = step.apply(name)
+        return name
+
+    def apply_directory(
+        self,
+        directory: str,
+        names: list[str],
+        stat: Callable[[int], os.stat_result] | None = None,
+    ) -> list[str]:
+        """Return the new filename for each of the filenames in one directory.
+
+        See RenamePlan.apply_directory(); stat(i) still looks up the file that
+        names[i] names on disk, whatever the rules before a template made of it.
+        """
+
+        if stat is None and self.template is not None:
+            join = os.path.join
+            olds: list[str] = names
+
+            def stat(i: int) -> os.stat_result:
+                return os.stat(join(directory, olds[i]))
+
+        for step in self.__steps:
+            names = step.apply_directory(directory, names, stat)
+        return names
+
+    def apply_many(self, names: Iterable[str]) -> list[str]:
+        """Return the new filename for each of given filenames, as apply() does.
+
+        Each rule is applied to the whole batch in turn.
+        """
+
+        if self.template is not None:
+            apply = self.apply
+            return [apply(name) for name in names]
+
+        batch: list[str] = list(names)
+        for step in self.__steps:
+            batch = step.apply_many(batch)
+        return batch
+
+    @property
+    def arguments(self) -> dict[str, Any]:
+        """The keyword arguments that would construct an identical RulePipeline."""
+
+        return {"rules": [dict(rule) for rule in self.rules]}
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__qualname__}(rules = {self.rules!r})"
+
+
+class _CaseRule:
+    """A rule changing the case of whole filenames."""
+
+    __slots__ = ("case", "__convert")
+
+    def __init__(self, case: str) -> None:
+        # Confirm argument is valid
+        if case not in CASES:
+            raise ValueError(
+                f"unknown case: '{case}' (expected one of {', '.join(CASES)})"
+            )
+
+        self.case: str = case
+        self.__convert: Callable[[str], str] = getattr(str, case)
+
+    def apply(self, name: str) -> str:
+        return self.__convert(name)
+
+    def apply_directory(
+        self,
+        directory: str,
+        names: list[str],
+        stat: Callable[[int], os.stat_result] | None = None,
+    ) -> list[str]:
+        return self.apply_many(names)
+
+    def apply_many(self, names: Iterable[str]) -> list[str]:
+        return list(map(self.__convert, names))
+
+
+_Step = Union[RenamePlan, _CaseRule]
+
+
+def load_rules(path: str | os.PathLike[str]) -> RulePipeline:
+    """Return the pipeline of rules held in a rule file.
+
+    A file whose name ends in .json is read as JSON, any other as TOML. Raises
+    ValueError if the file or one of its rules is invalid.
+    """
+
+    with open(path, "rb") as file:
+        try:
+            if os.fspath(path).endswith(".json"):
+                import json
+
+                document: Any = json.load(file)
+            else:
+                document = _load_toml(file)
+        except ValueError as e:
+            raise ValueError(f"invalid rule file: '{path}' ({e})") from None
+
+    # Confirm the file holds a list of rules
+    if not isinstance(document, dict) or not isinstance(document.get("rules"), list):
+        raise ValueError(f"rule file holds no list named 'rules': '{path}'")
+    return RulePipeline(document["rules"])
+
+
+def _load_toml(file: BinaryIO) -> Any:
+    """Return the document of a TOML file."""
+
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ValueError(
+                "TOML needs Python 3.11 or the tomli package; use a .json file"
+            ) from None
+
+    return tomllib.load(file)
+
+
+def _rule_kind(rule: Any, n: int) -> str:
+    """Return the kind of the n-th rule, raising ValueError if it is invalid."""
+
+    if not isinstance(rule, Mapping):
+        raise ValueError(f"rule {n}: expected a table of keys, got {rule!r}")
+    for key, value in rule.items():
+        if not isinstance(value, str):
+            raise ValueError(f"rule {n}: '{key}' must be a string, got {value!r}")
+
+    for kind, keys in RULE_KEYS.items():
+        if set(rule) == set(keys):
+            return kind
+    raise ValueError(
+        f"rule {n}: expected the keys of one kind of rule, got "
+        f"{', '.join(sorted(rule)) or 'none'}"
+        + f"\n(rules = {'; '.join(' and '.join(keys) for keys in RULE_KEYS.values())})"
+    )
+
+
+def _compile_rule(kind: str, rule: Mapping[str, str], n: int) -> _Step:
+    """Return the n-th rule, of given kind, ready to apply."""
+    import re
+
+    try:
+        if kind == "case":
+            return _CaseRule(rule["case"])
+        return RenamePlan(**rule)
+    except (ValueError, re.error) as e:
+        raise ValueError(f"rule {n}: {e}") from None
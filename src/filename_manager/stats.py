@@ -0,0 +1,94 @@
+"""Rename Statistics
+
+This module contains a collector of counters and cumulative timings for each phase
+of a rename job, for finding out where a slow run spends its time.
+
+The phases are:
+
+    * validate - checking and compiling the rename rules (measured by the CLI)
+    * scan - reading directories and classifying their entries
+    * rules - applying the rename rules to filenames
+    * order - checking for collisions and ordering each directory's renames
+    * rename - performing renames on the filesystem
+
+Instrumentation is per directory or per batch of renames, never per file, and is
+skipped entirely when no collector is given.
+
+This file can be imported as a module and contains the following classes:
+
+    * RenameStats
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+import json
+
+PHASES: tuple[str, ...] = ("validate", "scan", "rules", "order", "rename")
+COUNTERS: tuple[str, ...] = (
+    "directories",
+    "entries",
+    "stat_calls",
+    "rules_applied",
+    "renamed",
+    "unchanged",
+    "planned",
+    "skipped",
+    "failed",
+    "reverted",
+    "memo_hits",
+    "memo_misses",
+)
+
+
+class RenameStats:
+    """Counters and cumulative timings for each phase of a rename job.
+
+    Pass an instance to iter_renames() to collect them. An optional callback is
+    called with the phase, elapsed seconds and counts of every measurement as it
+    is added, for forwarding to other metrics systems.
+    """
+
+    def __init__(
+        self, callback: Callable[[str, float, dict[str, int]], None] | None = None
+    ) -> None:
+        self.callback: Callable[[str, float, dict[str, int]], None] | None = callback
+        self.seconds: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.counts: dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, phase: str, seconds: float, **counts: int) -> None:
+        """Add time spent in a phase, along with any counts to increase."""
+
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        if self.callback is not None:
+            self.callback(phase, seconds, counts)
+
+    def as_dict(self) -> dict[str, dict[str, float] | dict[str, int]]:
+        """Return the timings and counts as plain dictionaries."""
+
+        return {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+    def to_json(self) -> str:
+        """Return the timings and counts as a JSON object."""
+
+        return json.dumps(self.as_dict())
+
+    def summary(self) -> str:
+        """Return a human-readable table of the timings and counts."""
+
+        total: float = sum(self.seconds.values())
+        lines: list[str] = ["phase      seconds      share"]
+        for phase, seconds in self.seconds.items():
+            share: float = seconds / total if total else 0.0
+            lines.append(f"{phase:<8} {seconds:>9.3f} {share:>10.1%}")
+        lines.append("")
+        lines.extend(f"{name:<14} {count:>12,}" for name, count in self.counts.items())
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__qualname__}(seconds = {self.seconds}, "
+            f"counts = {self.counts})"
+        )
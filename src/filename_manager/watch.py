@@ -0,0 +1,445 @@
+"""Watch Mode
+
+This module contains a watch mode that renames files as they arrive in a
+directory tree, instead of walking the whole tree again on every run.
+
+The tree's directories are scanned once, when watching begins, and files already
+in them are left alone. From then on only files created in, or moved into, the
+tree are passed through the rename rules. On Linux, arrivals are reported by
+inotify (through ctypes, so no third-party package is needed); elsewhere, or if
+asked to, each watched directory is polled with a single stat and rescanned only
+when its modification time changes.
+
+Events come in bursts (a copy of many files, or a file created then written), so
+a file is renamed once no event has been seen for it for a short debounce delay.
+The files due in a directory are then renamed as one batch, which is checked and
+ordered as a manifest batch is (see iter_manifest_renames()). The tool's own
+renames are not mistaken for arrivals.
+
+This file can be imported as a module and contains the following classes and
+functions:
+
+    * InotifyWatcher
+    * PollingWatcher
+    * watch_renames
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+import errno
+import os
+import stat as stat_module
+import struct
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from filename_manager.filename_manager import (
+    FAILED,
+    RENAMED,
+    RenamePlan,
+    RenameResult,
+    _scan_directory,
+    iter_manifest_renames,
+)
+
+if TYPE_CHECKING:
+    import pathlib
+
+    from filename_manager.filters import EntryFilter, FileInfo
+    from filename_manager.journal import Journal
+    from filename_manager.stats import RenameStats
+
+# Seconds without events for a file before it is renamed
+DEFAULT_DEBOUNCE: float = 0.2
+
+# Seconds between checks of whether to stop, while no file is due
+_WAKE_INTERVAL: float = 0.5
+
+# inotify flags and event masks (see inotify(7))
+_IN_MOVED_FROM: int = 0x00000040
+_IN_MOVED_TO: int = 0x00000080
+_IN_CREATE: int = 0x00000100
+_IN_CLOSE_WRITE: int = 0x00000008
+_IN_IGNORED: int = 0x00008000
+_IN_ONLYDIR: int = 0x01000000
+_IN_ISDIR: int = 0x40000000
+_WATCH_MASK: int = (
+    _IN_CREATE | _IN_MOVED_TO | _IN_MOVED_FROM | _IN_CLOSE_WRITE | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE: int = 1 << 16
+
+# A filesystem event: the directory, the entry's name, whether the entry is a
+# directory and whether it arrived from outside the tree
+Event = tuple[str, str, bool, bool]
+
+
+class InotifyWatcher:
+    """Directories watched with Linux's inotify.
+
+    Files and directories moved from one watched directory to another, including
+    by the tool's own renames, are not arrivals; a directory moved within the
+    tree is reported so that its watches can be renewed. If the kernel's event
+    queue overflows, the events lost are not recovered.
+    """
+
+    supported: bool = sys.platform.startswith("linux")
+
+    __slots__ = ("__libc", "__fd", "__directories", "__cookies")
+
+    def __init__(self) -> None:
+        import ctypes
+
+        self.__libc = ctypes.CDLL(None, use_errno=True)
+        fd: int = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            error: int = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.__fd: int = fd
+        # Watched directories by watch descriptor
+        self.__directories: dict[int, str] = {}
+        # Cookies of entries moved away during this read and the one before
+        self.__cookies: tuple[set[int], set[int]] = (set(), set())
+
+    def add(self, directory: str) -> None:
+        """Start reporting the entries that arrive in directory."""
+
+        import ctypes
+
+        wd: int = self.__libc.inotify_add_watch(
+            self.__fd, os.fsencode(directory), _WATCH_MASK
+        )
+        if wd < 0:
+            error: int = ctypes.get_errno()
+            message: str = os.strerror(error)
+            if error == errno.ENOSPC:
+                message = "too many directories to watch (fs.inotify.max_user_watches)"
+            raise OSError(error, message, directory)
+        self.__directories[wd] = directory
+
+    def ignore(self, directory: str, name: str) -> None:
+        """Do not report name, given to an entry of directory by a rename."""
+
+        # Renames within a watched directory are never reported
+
+    def read(self, timeout: float) -> list[Event]:
+        """Return the events that occur within timeout seconds."""
+
+        import select
+
+        if not select.select([self.__fd], [], [], timeout)[0]:
+            return []
+        try:
+            data: bytes = os.read(self.__fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        cookies: set[int] = set()
+        moved: set[int] = cookies | self.__cookies[0]
+        self.__cookies = (cookies, self.__cookies[0])
+
+        events: list[Event] = []
+        offset: int = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name: str = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & _IN_IGNORED:
+                self.__directories.pop(wd, None)
+                continue
+            directory: str | None = self.__directories.get(wd)
+            if directory is None or not name:
+                continue
+            is_dir: bool = bool(mask & _IN_ISDIR)
+
+            if mask & _IN_MOVED_FROM:
+                cookies.add(cookie)
+                moved.add(cookie)
+                if is_dir:
+                    self.__forget(os.path.join(directory, name))
+            elif mask & _IN_MOVED_TO:
+                arrived: bool = cookie not in moved
+                # Files moved within the tree have already arrived
+                if is_dir or arrived:
+                    events.append((directory, name, is_dir, arrived))
+            elif mask & _IN_CREATE:
+                events.append((directory, name, is_dir, True))
+            elif mask & _IN_CLOSE_WRITE:
+                # Finishing a write delays the rename of a file not yet renamed
+                events.append((directory, name, False, False))
+        return events
+
+    def __forget(self, directory: str) -> None:
+        """Stop watching directory and every directory beneath it."""
+
+        inside: str = os.path.join(directory, "")
+        for wd, watched in list(self.__directories.items()):
+            if watched == directory or watched.startswith(inside):
+                del self.__directories[wd]
+                self.__libc.inotify_rm_watch(self.__fd, wd)
+
+    def close(self) -> None:
+        """Stop watching every directory."""
+
+        os.close(self.__fd)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__qualname__}(directories = {len(self.__directories)})"
+
+
+class PollingWatcher:
+    """Directories polled every interval seconds, where inotify is unavailable.
+
+    Each poll costs one stat per watched directory, and a directory is rescanned
+    only if it has been modified. Unlike with inotify, an entry moved from one
+    watched directory to another is reported as an arrival.
+    """
+
+    __slots__ = ("interval", "follow_symlinks", "__directories", "__next_poll")
+
+    def __init__(self, interval: float, follow_symlinks: bool = False) -> None:
+        # Confirm interval is valid
+        if interval <= 0:
+            raise ValueError(f"interval must be positive: '{interval}'")
+
+        self.interval: float = interval
+        self.follow_symlinks: bool = follow_symlinks
+        # Modification time and entry names of each watched directory
+        self.__directories: dict[str, tuple[int, set[str]]] = {}
+        self.__next_poll: float = time.monotonic() + interval
+
+    def add(self, directory: str) -> None:
+        """Start reporting the entries that arrive in directory."""
+
+        mtime_ns: int = _settled_mtime_ns(os.stat(directory))
+        self.__directories[directory] = (mtime_ns, set(os.listdir(directory)))
+
+    def ignore(self, directory: str, name: str) -> None:
+        """Do not report name, given to an entry of directory by a rename."""
+
+        watched: tuple[int, set[str]] | None = self.__directories.get(directory)
+        if watched is not None:
+            watched[1].add(name)
+
+    def read(self, timeout: float) -> list[Event]:
+        """Return the events found by the next poll, if due within timeout seconds."""
+
+        wait: float = self.__next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self.__next_poll = time.monotonic() + self.interval
+
+        events: list[Event] = []
+        for directory, (mtime_ns, names) in list(self.__directories.items()):
+            try:
+                stat: os.stat_result = os.stat(directory)
+                if stat.st_mtime_ns == mtime_ns:
+                    continue
+                with os.scandir(directory) as scan:
+                    entries: list[os.DirEntry[str]] = list(scan)
+            except OSError:
+                del self.__directories[directory]
+                continue
+
+            self.__directories[directory] = (
+                _settled_mtime_ns(stat),
+                {entry.name for entry in entries},
+            )
+            events.extend(
+                (
+                    directory,
+                    entry.name,
+                    entry.is_dir(follow_symlinks=self.follow_symlinks),
+                    True,
+                )
+                for entry in entries
+                if entry.name not in names
+            )
+        return events
+
+    def close(self) -> None:
+        """Stop watching every directory."""
+
+        self.__directories.clear()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__qualname__}(interval = {self.interval})"
+
+
+def _settled_mtime_ns(stat: os.stat_result) -> int:
+    """Return the mtime of a directory, or -1 if it may yet change within its tick.
+
+    Filesystems with coarse timestamps give a directory modified again in the
+    same tick an unchanged mtime, so such a directory is rescanned next poll.
+    """
+
+    if time.time_ns() - stat.st_mtime_ns < 2_000_000_000:
+        return -1
+    return stat.st_mtime_ns
+
+
+def watch_renames(
+    path: pathlib.Path,
+    plan: RenamePlan,
+    follow_symlinks: bool = False,
+    dry_run: bool = False,
+    workers: int = 1,
+    journal: Journal | None = None,
+    stats: RenameStats | None = None,
+    entry_filter: EntryFilter | None = None,
+    debounce: float = DEFAULT_DEBOUNCE,
+    poll_interval: float | None = None,
+    stop: threading.Event | None = None,
+) -> Iterator[RenameResult]:
+    """Rename files as they arrive in given path, yielding a result for each.
+
+    Runs until stop is set (or forever). Files already in the tree are left
+    alone. A file is renamed once debounce seconds pass without an event for it;
+    a batch whose renames collide is not renamed, and each of its files is
+    yielded as FAILED with the FileExistsError. With poll_interval, or where
+    inotify is unavailable, directories are polled every poll_interval seconds
+    (1 by default). Templates cannot be used, as a directory's files are not
+    numbered together. See iter_renames() for the remaining arguments.
+    """
+
+    # Confirm arguments are valid
+    if plan.template is not None:
+        raise ValueError("a template cannot be used when watching")
+    if not path.is_dir():
+        raise NotADirectoryError(f"Path must be a directory: '{path.absolute()}'")
+
+    watcher: InotifyWatcher | PollingWatcher
+    if poll_interval is None and InotifyWatcher.supported:
+        watcher = InotifyWatcher()
+    else:
+        watcher = PollingWatcher(poll_interval or 1.0, follow_symlinks)
+
+    root: str = os.fspath(path)
+    # Depth of each watched directory below path
+    depths: dict[str, int] = {}
+    visited: set[tuple[int, int]] = set()
+    if follow_symlinks:
+        root_stat: os.stat_result = os.stat(root)
+        visited.add((root_stat.st_dev, root_stat.st_ino))
+    # Files waiting to be renamed, with the time of their latest event
+    pending: dict[tuple[str, str], float] = {}
+
+    def add_tree(directory: str, depth: int, arrived: bool) -> None:
+        """Watch directory and those beneath it, queueing their files if arrived."""
+
+        stack: list[tuple[str, int]] = [(directory, depth)]
+        now: float = time.monotonic()
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                # Watch before scanning so that no arrival is missed in between
+                watcher.add(directory)
+                files, subdirs, _, _, _ = _scan_directory(
+                    directory, follow_symlinks, visited, entry_filter, depth
+                )
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            depths[directory] = depth
+            if arrived:
+                for entry in files:
+                    pending[(directory, entry.name)] = now
+            stack.extend((subdir, depth + 1) for subdir in subdirs)
+
+    try:
+        add_tree(root, 0, False)
+
+        while stop is None or not stop.is_set():
+            timeout: float = _WAKE_INTERVAL
+            if pending:
+                timeout = max(0.0, min(pending.values()) + debounce - time.monotonic())
+
+            now: float = time.monotonic()
+            for directory, name, is_dir, arrived in watcher.read(timeout):
+                depth: int | None = depths.get(directory)
+                if depth is None:
+                    continue
+                if is_dir:
+                    if entry_filter is None or entry_filter.descends(name, depth + 1):
+                        add_tree(os.path.join(directory, name), depth + 1, arrived)
+                elif arrived or (directory, name) in pending:
+                    if entry_filter is None or entry_filter.accepts_file(name):
+                        pending[(directory, name)] = now
+
+            now = time.monotonic()
+            due: dict[str, list[str]] = {}
+            for key, last_event in list(pending.items()):
+                if now - last_event >= debounce:
+                    del pending[key]
+                    due.setdefault(key[0], []).append(key[1])
+
+            for directory, names in due.items():
+                yield from _rename_arrivals(
+                    directory,
+                    names,
+                    plan,
+                    follow_symlinks,
+                    dry_run,
+                    workers,
+                    journal,
+                    stats,
+                    entry_filter,
+                    watcher.ignore,
+                )
+    finally:
+        watcher.close()
+
+
+def _rename_arrivals(
+    directory: str,
+    names: list[str],
+    plan: RenamePlan,
+    follow_symlinks: bool,
+    dry_run: bool,
+    workers: int,
+    journal: Journal | None,
+    stats: RenameStats | None,
+    entry_filter: EntryFilter | None,
+    ignore: Callable[[str, str], None],
+) -> Iterator[RenameResult]:
+    """Rename the files that arrived in one directory, as one batch."""
+
+    accepts_info: Callable[[FileInfo], bool] | None = None
+    if entry_filter is not None and entry_filter.uses_metadata:
+        from filename_manager.filters import FileInfo
+
+        accepts_info = entry_filter.accepts_info
+
+    paths: list[str] = []
+    for name in names:
+        path: str = os.path.join(directory, name)
+        # Files may be gone, or not be regular files, by the time they are due
+        try:
+            stat: os.stat_result = os.stat(path, follow_symlinks=follow_symlinks)
+        except OSError:
+            continue
+        if not stat_module.S_ISREG(stat.st_mode):
+            continue
+        if accepts_info is not None and not accepts_info(
+            FileInfo(stat.st_size, stat.st_mtime)
+        ):
+            continue
+        paths.append(path)
+
+    try:
+        for result in iter_manifest_renames(
+            paths, plan, dry_run, workers, journal, stats
+        ):
+            if result.status == RENAMED:
+                ignore(directory, os.path.basename(result.new))
+            yield result
+    except FileExistsError as e:
+        for path in paths:
+            yield RenameResult(path, path, FAILED, e)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import pathlib
+import sys
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+from filename_manager.aio import ConcurrencyLimit, aiter_renames, amodify_filenames
+import filename_manager.filename_manager as filename_manager
+
+
+def test_amodify_filenames(test_dir: pathlib.Path) -> None:
+    old_names = sorted(path.name for path in collect_filepaths(test_dir))
+
+    asyncio.run(amodify_filenames(test_dir, prefix="pre_"))
+
+    assert sorted(path.name for path in collect_filepaths(test_dir)) == [
+        f"pre_{name}" for name in old_names
+    ]
+
+
+def test_amodify_filenames_many_roots(test_dir: pathlib.Path) -> None:
+    roots = sorted(path for path in test_dir.iterdir() if path.is_dir())
+    old_names = sorted(path.name for path in collect_filepaths(test_dir))
+    limit = ConcurrencyLimit(2)
+
+    async def run_all() -> None:
+        await asyncio.gather(
+            *(amodify_filenames(root, suffix="_s", limit=limit) for root in roots)
+        )
+
+    try:
+        asyncio.run(run_all())
+    finally:
+        limit.shutdown()
+
+    assert sorted(path.name for path in collect_filepaths(test_dir)) == sorted(
+        f"{pathlib.Path(name).stem}_s{pathlib.Path(name).suffix}" for name in old_names
+    )
+
+
+def test_aiter_renames_dry_run(tmp_path: pathlib.Path) -> None:
+    for name in ("IMG_1.jpg", "notes.txt"):
+        (tmp_path / name).touch()
+    plan = filename_manager.RenamePlan(regex="^IMG_", sub="")
+
+    async def collect() -> list[filename_manager.RenameResult]:
+        return [r async for r in aiter_renames(tmp_path, plan, dry_run=True)]
+
+    statuses = {pathlib.Path(r.old).name: r.status for r in asyncio.run(collect())}
+
+    assert statuses == {
+        "IMG_1.jpg": filename_manager.PLANNED,
+        "notes.txt": filename_manager.UNCHANGED,
+    }
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["IMG_1.jpg", "notes.txt"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="symlinks need privileges")
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_amodify_filenames_spares_symlink(
+    tmp_path: pathlib.Path, dry_run: bool
+) -> None:
+    (tmp_path / "a").write_text("a")
+    (tmp_path / "target").mkdir()
+    (tmp_path / "b").symlink_to(tmp_path / "target", target_is_directory=True)
+
+    with pytest.raises(FileExistsError):
+        asyncio.run(amodify_filenames(tmp_path, regex="^a$", sub="b", dry_run=dry_run))
+
+    assert (tmp_path / "a").read_text() == "a"
+    assert (tmp_path / "b").is_symlink()
+
+
+def test_amodify_filenames_bad_path(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(NotADirectoryError):
+        asyncio.run(amodify_filenames(tmp_path / "missing", prefix="pre_"))
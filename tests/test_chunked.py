@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import pathlib
+from typing import Any
+from unittest import mock
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+from filename_manager.chunked import iter_chunked_renames
+import filename_manager.filename_manager as filename_manager
+from filename_manager.rules import RulePipeline
+
+
+def make_files(path: pathlib.Path, *names: str) -> None:
+    for name in names:
+        (path / name).write_text(name)
+
+
+def names(path: pathlib.Path) -> set[str]:
+    return {p.name for p in path.iterdir()}
+
+
+def failing_on(name: str) -> Any:
+    """Return a patch making renames of the file of given name fail."""
+
+    rename, replace = os.rename, os.replace
+
+    def fail(function: Any) -> Any:
+        def wrapper(src: Any, dst: Any, *args: Any, **kwargs: Any) -> None:
+            if os.path.basename(src) == name:
+                raise PermissionError(f"cannot rename '{src}'")
+            function(src, dst, *args, **kwargs)
+
+        return wrapper
+
+    return mock.patch.multiple(os, rename=fail(rename), replace=fail(replace))
+
+
+def test_chunks_match_whole_directories(test_dir: pathlib.Path) -> None:
+    filepaths = collect_filepaths(test_dir)
+
+    filename_manager.modify_filenames(test_dir, prefix="pre_", chunk_size=3)
+
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        path.with_name(f"pre_{path.name}") for path in filepaths
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_chain_across_chunks(tmp_path: pathlib.Path, chunk_size: int) -> None:
+    make_files(tmp_path, "bba.txt", "ba.txt", "c.txt")
+    plan = filename_manager.RenamePlan(regex="^b", sub="")
+
+    results = list(iter_chunked_renames(tmp_path, plan, chunk_size=chunk_size))
+
+    assert names(tmp_path) == {"ba.txt", "a.txt", "c.txt"}
+    assert (tmp_path / "ba.txt").read_text() == "bba.txt"
+    assert all(result.error is None for result in results)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100])
+def test_cycle_temp_name_spares_other_files(
+    tmp_path: pathlib.Path, chunk_size: int
+) -> None:
+    make_files(tmp_path, "ab", "ba", ".ab.tmp", ".ba.tmp")
+    # Swap ab and ba, so that one of them goes through a temporary name
+    plan = RulePipeline(
+        [
+            {"regex": "^ab$", "sub": "x"},
+            {"regex": "^ba$", "sub": "ab"},
+            {"regex": "^x$", "sub": "ba"},
+        ]
+    )
+
+    results = list(iter_chunked_renames(tmp_path, plan, chunk_size=chunk_size))
+
+    assert all(result.error is None for result in results)
+    assert {name: (tmp_path / name).read_text() for name in names(tmp_path)} == {
+        "ab": "ba",
+        "ba": "ab",
+        ".ab.tmp": ".ab.tmp",
+        ".ba.tmp": ".ba.tmp",
+    }
+
+
+@pytest.mark.parametrize(
+    "files, directories",
+    [(("a1.txt", "a2.txt"), ()), (("a1.txt", "a.txt"), ()), (("a1.txt",), ("a.txt",))],
+)
+def test_collision_before_any_rename(
+    tmp_path: pathlib.Path, files: tuple[str, ...], directories: tuple[str, ...]
+) -> None:
+    make_files(tmp_path, "b1.txt", *files)
+    for directory in directories:
+        (tmp_path / directory).mkdir()
+    plan = filename_manager.RenamePlan(regex=r"\d", sub="")
+
+    with pytest.raises(FileExistsError):
+        list(iter_chunked_renames(tmp_path, plan, chunk_size=1))
+
+    assert names(tmp_path) == {"b1.txt", *files, *directories}
+
+
+def test_template_rejected(tmp_path: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(template="{n}{ext}")
+
+    with pytest.raises(ValueError):
+        list(iter_chunked_renames(tmp_path, plan))
+
+
+@pytest.mark.parametrize("chunk_size", [0, 10])
+def test_atomic_reverts_batch(tmp_path: pathlib.Path, chunk_size: int) -> None:
+    make_files(tmp_path, "a.txt", "b.txt", "c.txt", "d.txt")
+    plan = filename_manager.RenamePlan(prefix="pre_")
+
+    with failing_on("c.txt"):
+        results = list(
+            filename_manager.iter_renames(
+                tmp_path, plan, chunk_size=chunk_size, atomic=True
+            )
+        )
+
+    assert names(tmp_path) == {"a.txt", "b.txt", "c.txt", "d.txt"}
+    statuses = sorted(result.status for result in results)
+    assert filename_manager.FAILED in statuses
+    assert filename_manager.RENAMED not in statuses
+    assert all(
+        result.status == filename_manager.REVERTED
+        for result in results
+        if result.status not in (filename_manager.FAILED, filename_manager.SKIPPED)
+    )
+
+
+def test_atomic_chunks_independent(tmp_path: pathlib.Path) -> None:
+    make_files(tmp_path, "a.txt", "b.txt", "c.txt", "d.txt")
+    plan = filename_manager.RenamePlan(prefix="pre_")
+
+    with failing_on("c.txt"):
+        results = list(iter_chunked_renames(tmp_path, plan, chunk_size=1, atomic=True))
+
+    assert names(tmp_path) == {"pre_a.txt", "pre_b.txt", "c.txt", "pre_d.txt"}
+    assert [r.status for r in results].count(filename_manager.RENAMED) == 3
+
+
+def test_held_rename_skipped_when_target_stays(tmp_path: pathlib.Path) -> None:
+    make_files(tmp_path, "bba.txt", "ba.txt")
+    plan = filename_manager.RenamePlan(regex="^b", sub="")
+
+    with failing_on("ba.txt"):
+        results = list(iter_chunked_renames(tmp_path, plan, chunk_size=1))
+
+    assert names(tmp_path) == {"bba.txt", "ba.txt"}
+    assert (tmp_path / "ba.txt").read_text() == "ba.txt"
+    assert sorted(result.status for result in results) == [
+        filename_manager.FAILED,
+        filename_manager.SKIPPED,
+    ]
+
+
+def test_cli_chunk_size_rejects_index(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    monkeypatch.setattr(
+        "sys.argv",
+        ["filename-manager", str(tmp_path), "-p", "x", "--chunk-size", "5"]
+        + ["--index", str(tmp_path / "index")],
+    )
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()
+
+
+@pytest.mark.parametrize("option", ["--manifest", "--watch"])
+def test_cli_atomic_rejects(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path, option: str
+) -> None:
+    argv = ["filename-manager", "-p", "x", "--atomic"]
+    if option == "--manifest":
+        argv += ["--manifest", str(tmp_path / "manifest")]
+    else:
+        argv += [str(tmp_path), "--watch"]
+    monkeypatch.setattr("sys.argv", argv)
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import os
+import pathlib
+from unittest import mock
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+from filename_manager.dirfd import DirectoryFdPool
+import filename_manager.filename_manager as filename_manager
+
+pytestmark = pytest.mark.skipif(
+    not DirectoryFdPool.supported, reason="renames relative to a descriptor"
+)
+
+
+def make_dirs(root: pathlib.Path, n: int) -> list[str]:
+    directories: list[str] = [str(root / f"dir{i}") for i in range(n)]
+    for directory in directories:
+        os.mkdir(directory)
+    return directories
+
+
+def test_pool_reuses_descriptors(tmp_path: pathlib.Path) -> None:
+    directory: str = make_dirs(tmp_path, 1)[0]
+
+    with DirectoryFdPool() as fds:
+        fd = fds.acquire(directory)
+        fds.release(directory)
+
+        assert fds.acquire(directory) == fd
+        fds.release(directory)
+        assert fds.opened == 1
+        assert len(fds) == 1
+
+    assert len(fds) == 0
+
+
+def test_pool_evicts_least_recently_used(tmp_path: pathlib.Path) -> None:
+    a, b, c = make_dirs(tmp_path, 3)
+
+    with DirectoryFdPool(size=2) as fds:
+        for directory in (a, b, a, c):
+            fds.acquire(directory)
+            fds.release(directory)
+
+        assert len(fds) == 2
+        fds.acquire(b)
+        fds.release(b)
+        assert fds.opened == 4
+
+
+def test_pool_keeps_descriptors_in_use(tmp_path: pathlib.Path) -> None:
+    a, b = make_dirs(tmp_path, 2)
+
+    with DirectoryFdPool(size=1) as fds:
+        fd = fds.acquire(a)
+        fds.acquire(b)
+
+        assert len(fds) == 2
+        os.fstat(fd)
+
+        fds.release(b)
+        assert len(fds) == 1
+        os.fstat(fd)
+        fds.release(a)
+
+
+def test_bad_size() -> None:
+    with pytest.raises(ValueError):
+        DirectoryFdPool(size=0)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_renames_relative_to_directory(test_dir: pathlib.Path, workers: int) -> None:
+    filepaths = collect_filepaths(test_dir)
+
+    with mock.patch("os.replace", side_effect=AssertionError) as replace:
+        filename_manager.modify_filenames(test_dir, prefix="pre_", workers=workers)
+
+    replace.assert_not_called()
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        path.with_name(f"pre_{path.name}") for path in filepaths
+    )
+
+
+def test_unopenable_directory_renamed_by_path(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "a.txt").touch()
+    renames = [filename_manager.Rename(str(tmp_path), "a.txt", "b.txt")]
+
+    with DirectoryFdPool() as fds, mock.patch("os.open", side_effect=PermissionError):
+        results, _ = filename_manager._run_batch(renames, False, fds)
+
+    assert [result.status for result in results] == [filename_manager.RENAMED]
+    assert (tmp_path / "b.txt").exists()
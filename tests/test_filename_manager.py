@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import io
+import os
 import pathlib
+import sys
 from typing import Callable
+from unittest import mock
 
 from file_extensions import FILE_EXTENSIONS
 import pytest
 
 import filename_manager.filename_manager as filename_manager
+from filename_manager.filters import EntryFilter
 
 # BEGIN TESTS
 
@@ -220,6 +225,417 @@ def test_bad_prefix_bad_suffix_bad_extension(
     )
 
 
+@pytest.mark.parametrize(
+    ("kwargs", "name", "expected"),
+    [
+        ({"prefix": "pre_"}, "file.txt", "pre_file.txt"),
+        ({"suffix": "_suf"}, "file.tar.gz", "file.tar_suf.gz"),
+        ({"extold": ".txt", "extnew": ".md"}, "file.txt", "file.md"),
+        ({"extold": "txt", "extnew": "md"}, "file.jpg", "file.jpg"),
+        ({"extold": filename_manager.ALL, "extnew": "md"}, "file", "file.md"),
+        ({"regex": r"^\d+\. ", "sub": ""}, "31. My File.mp3", "My File.mp3"),
+        (
+            {"regex": r"\d", "sub": "X", "prefix": "p", "suffix": "s"},
+            "f01.txt",
+            "pfXXs.txt",
+        ),
+        ({"template": "{stem}-{n:02d}{ext}"}, "file.txt", "file-01.txt"),
+        (
+            {"template": "{stem}{ext}", "extold": "txt", "extnew": "md"},
+            "file.txt",
+            "file.md",
+        ),
+    ],
+)
+def test_rename_plan_apply(kwargs: dict, name: str, expected: str) -> None:
+    assert filename_manager.RenamePlan(**kwargs).apply(name) == expected
+
+
+@pytest.mark.parametrize(
+    ("error", "kwargs"),
+    [
+        (ValueError, {"prefix": "a/b"}),
+        (TypeError, {"extnew": "md"}),
+        (TypeError, {"regex": "a"}),
+        (ValueError, {"template": "a/{n}"}),
+        (ValueError, {"template": "{name}"}),
+        (ValueError, {"template": "{n:%Y}"}),
+        (ValueError, {"template": "{n"}),
+    ],
+)
+def test_rename_plan_validation(error: type[Exception], kwargs: dict) -> None:
+    with pytest.raises(error):
+        filename_manager.RenamePlan(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"prefix": "pre_"},
+        {"prefix": "p.", "suffix": "_s"},
+        {"suffix": "_s"},
+        {"prefix": "pre_", "suffix": "_s"},
+        {"extold": "txt", "extnew": "md", "suffix": "_s"},
+        {"extold": ".", "extnew": "md"},
+        {"extold": filename_manager.ALL, "extnew": "md", "prefix": "a"},
+        {"regex": r"\d+", "sub": "N", "prefix": "x", "suffix": "y"},
+        {"template": "{stem}_{n}{ext}", "suffix": "_s"},
+    ],
+)
+def test_rename_plan_apply_many(kwargs: dict) -> None:
+    names = ["file.txt", "file", ".bashrc", ".txt", "a.", "a.b.txt", "a..txt", "9"]
+    plan = filename_manager.RenamePlan(**kwargs)
+
+    assert plan.apply_many(names) == [plan.apply(name) for name in names]
+
+
+def test_rename_plan_apply_directory(tmp_path: pathlib.Path) -> None:
+    names = ["IMG_10.jpg", "IMG_2.jpg", "IMG_1.jpg"]
+    for i, name in enumerate(names):
+        (tmp_path / name).touch()
+        os.utime(tmp_path / name, (0, 86400 * 365 * (i + 40)))
+    plan = filename_manager.RenamePlan(template="{parent}_{n:03d}_{mtime:%Y}{ext}")
+
+    assert plan.apply_directory(str(tmp_path), names) == [
+        f"{tmp_path.name}_002_2009.jpg",
+        f"{tmp_path.name}_003_2010.jpg",
+        f"{tmp_path.name}_001_2011.jpg",
+    ]
+
+
+def test_template_renames(test_dir: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(template="Vacation_{n:04d}{ext}")
+    filepaths = collect_filepaths(test_dir)
+
+    filename_manager.modify_filenames(test_dir, plan=plan)
+
+    by_directory: dict[pathlib.Path, list[pathlib.Path]] = {}
+    for path in filepaths:
+        by_directory.setdefault(path.parent, []).append(path)
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        path.with_name(f"Vacation_{n:04d}{path.suffix}")
+        for paths in by_directory.values()
+        for n, path in enumerate(sorted(paths, key=lambda p: p.name), 1)
+    )
+
+
+def test_walk_files(test_dir: pathlib.Path) -> None:
+    walked = sorted(entry.path for entry in filename_manager.walk_files(test_dir))
+    assert walked == sorted(str(path) for path in collect_filepaths(test_dir))
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="symlinks need privileges")
+@pytest.mark.parametrize("follow_symlinks", [False, True])
+def test_walk_files_symlinks(test_dir: pathlib.Path, follow_symlinks: bool) -> None:
+    target: pathlib.Path = collect_filepaths(test_dir)[0]
+    file_link: pathlib.Path = test_dir / "file_link"
+    dir_link: pathlib.Path = test_dir / "dir_link"
+    file_link.symlink_to(target.absolute())
+    dir_link.symlink_to(test_dir.absolute(), target_is_directory=True)
+
+    try:
+        names = [
+            entry.name
+            for entry in filename_manager.walk_files(test_dir, follow_symlinks)
+        ]
+    finally:
+        # Remove links so test directory cleanup doesn't follow them
+        file_link.unlink()
+        dir_link.unlink()
+
+    # The looping directory link is only ever descended into once
+    assert ("file_link" in names) == follow_symlinks
+    assert names.count(target.name) == 1
+
+
+def test_plan_renames(test_dir: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(prefix="pre_")
+    renames = filename_manager.plan_renames(test_dir, plan)
+
+    assert sorted(str(pathlib.Path(r.directory, r.old)) for r in renames) == sorted(
+        str(path) for path in collect_filepaths(test_dir)
+    )
+    assert all(r.new == f"pre_{r.old}" for r in renames)
+
+
+def test_plan_renames_processes(test_dir: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(regex=r"^(\d+)\. ", sub="num_")
+
+    # A tiny chunk size spreads even the small test tree over several chunks
+    with mock.patch.object(filename_manager, "PROCESS_CHUNK_SIZE", 3):
+        renames = filename_manager.plan_renames(test_dir, plan, processes=2)
+
+    assert renames == filename_manager.plan_renames(test_dir, plan)
+
+
+@pytest.mark.parametrize("workers", [4])
+def test_execute_renames_workers(test_dir: pathlib.Path, workers: int) -> None:
+    plan = filename_manager.RenamePlan(prefix="pre_")
+    renames = filename_manager.plan_renames(test_dir, plan)
+    filename_manager.execute_renames(renames, workers)
+
+    assert sorted(path.name for path in collect_filepaths(test_dir)) == sorted(
+        r.new for r in renames
+    )
+
+
+def test_execute_renames_dependent_order(test_dir: pathlib.Path) -> None:
+    (test_dir / "a").write_text("a")
+    (test_dir / "b").write_text("b")
+    directory = str(test_dir)
+    renames = [
+        filename_manager.Rename(directory, "b", "c"),
+        filename_manager.Rename(directory, "a", "b"),
+    ]
+
+    filename_manager.execute_renames(renames, workers=4)
+
+    assert (test_dir / "b").read_text() == "a"
+    assert (test_dir / "c").read_text() == "b"
+
+
+def test_unchanged_files_not_renamed(test_dir: pathlib.Path) -> None:
+    (test_dir / "a.txt").write_text("")
+    (test_dir / "b.jpg").write_text("")
+    plan = filename_manager.RenamePlan(extold="txt", extnew="md")
+
+    # Renames go through os.rename relative to directory descriptors where
+    # supported, and through os.replace otherwise
+    with mock.patch.object(os, "replace", wraps=os.replace) as replace:
+        with mock.patch.object(os, "rename", wraps=os.rename) as rename:
+            results = {
+                pathlib.Path(r.old).name: r.status
+                for r in filename_manager.iter_renames(
+                    test_dir, plan, entry_filter=EntryFilter(max_depth=0)
+                )
+            }
+
+    assert results == {
+        "a.txt": filename_manager.RENAMED,
+        "b.jpg": filename_manager.UNCHANGED,
+    }
+    renamed = [
+        os.path.basename(call.args[0])
+        for call in replace.call_args_list + rename.call_args_list
+    ]
+    assert renamed == ["a.txt"]
+
+
+def test_collision_detected(test_dir: pathlib.Path) -> None:
+    old_filepaths = collect_filepaths(test_dir)
+
+    with pytest.raises(FileExistsError):
+        filename_manager.modify_filenames(test_dir, regex=r"^.*$", sub="same")
+
+    assert collect_filepaths(test_dir) == old_filepaths
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_order_renames_cycles(test_dir: pathlib.Path, workers: int) -> None:
+    for name in ("a", "b", "c", "d"):
+        (test_dir / name).write_text(name)
+    directory = str(test_dir)
+    renames = [
+        filename_manager.Rename(directory, "a", "b"),
+        filename_manager.Rename(directory, "b", "a"),
+        filename_manager.Rename(directory, "c", "d"),
+        filename_manager.Rename(directory, "d", "e"),
+    ]
+
+    filename_manager.execute_renames(filename_manager.order_renames(renames), workers)
+
+    assert [(test_dir / name).read_text() for name in ("a", "b", "d", "e")] == [
+        "b",
+        "a",
+        "c",
+        "d",
+    ]
+    assert not (test_dir / "c").exists()
+
+
+@pytest.mark.parametrize("check_first", [False, True])
+def test_check_first(tmp_path: pathlib.Path, check_first: bool) -> None:
+    (tmp_path / "x1.txt").touch()
+    (tmp_path / "sub").mkdir()
+    for name in ("a1.txt", "a2.txt"):
+        (tmp_path / "sub" / name).touch()
+    plan = filename_manager.RenamePlan(regex=r"\d", sub="")
+
+    with pytest.raises(FileExistsError):
+        list(filename_manager.iter_renames(tmp_path, plan, check_first=check_first))
+
+    # The root directory is handled before the colliding subdirectory
+    assert (tmp_path / "x1.txt").exists() == check_first
+    assert sorted(p.name for p in (tmp_path / "sub").iterdir()) == ["a1.txt", "a2.txt"]
+
+
+def test_cycle_temp_name_spares_other_files(test_dir: pathlib.Path) -> None:
+    for name in ("ab", "ba", ".ab.tmp", ".ba.tmp"):
+        (test_dir / name).write_text(name)
+    directory = str(test_dir)
+    # The temporary files are not part of the renames, as when filtered out
+    renames = [
+        filename_manager.Rename(directory, "ab", "ba"),
+        filename_manager.Rename(directory, "ba", "ab"),
+    ]
+
+    filename_manager.execute_renames(filename_manager.order_renames(renames))
+
+    assert [(test_dir / name).read_text() for name in ("ab", "ba")] == ["ba", "ab"]
+    assert (test_dir / ".ab.tmp").read_text() == ".ab.tmp"
+    assert (test_dir / ".ba.tmp").read_text() == ".ba.tmp"
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_iter_renames(test_dir: pathlib.Path, dry_run: bool) -> None:
+    old_filepaths = collect_filepaths(test_dir)
+    plan = filename_manager.RenamePlan(suffix="_SUF")
+
+    results = list(filename_manager.iter_renames(test_dir, plan, dry_run=dry_run))
+
+    expected_status = filename_manager.PLANNED if dry_run else filename_manager.RENAMED
+    assert len(results) == len(old_filepaths)
+    assert all(r.status == expected_status and r.error is None for r in results)
+    assert all(
+        pathlib.Path(r.new).stem == f"{pathlib.Path(r.old).stem}_SUF" for r in results
+    )
+
+
+def test_iter_renames_failure(test_dir: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(prefix="pre_")
+    results = filename_manager.iter_renames(test_dir, plan)
+
+    # Remove a file after its directory is planned but before it is renamed
+    first = next(results)
+    victim = next(
+        path
+        for path in pathlib.Path(first.old).parent.iterdir()
+        if not path.name.startswith("pre_")
+    )
+    victim.unlink()
+
+    failed = [r for r in results if r.status == filename_manager.FAILED]
+    assert [r.old for r in failed] == [str(victim)]
+    assert isinstance(failed[0].error, FileNotFoundError)
+
+
+def test_dry_run(test_dir: pathlib.Path) -> None:
+    old_filepaths = collect_filepaths(test_dir)
+    filename_manager.modify_filenames(test_dir, prefix="pre_", dry_run=True)
+    assert collect_filepaths(test_dir) == old_filepaths
+
+
+def test_cli_dry_run(
+    test_dir: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    old_filepaths = collect_filepaths(test_dir)
+    monkeypatch.setattr(
+        sys, "argv", ["filename-manager", str(test_dir), "-p", "pre_", "--dry-run"]
+    )
+
+    filename_manager.main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert collect_filepaths(test_dir) == old_filepaths
+    assert (
+        f"{old_filepaths[0]} -> {old_filepaths[0].with_name('pre_' + old_filepaths[0].name)}"
+        in lines
+    )
+
+
+@pytest.mark.parametrize("separator", [b"\n", b"\0"])
+def test_read_manifest(separator: bytes) -> None:
+    paths = ["a/one.txt", "a/two words.txt", "b/three\udcff.txt"]
+    data = separator.join(os.fsencode(path) for path in paths) + separator * 2
+
+    # A tiny block size splits paths across reads
+    with mock.patch.object(filename_manager, "MANIFEST_BLOCK_SIZE", 4):
+        assert list(filename_manager.read_manifest(io.BytesIO(data), separator)) == (
+            paths
+        )
+
+
+def test_iter_manifest_renames(test_dir: pathlib.Path) -> None:
+    filepaths = collect_filepaths(test_dir)
+    listed = filepaths[::2]
+    plan = filename_manager.RenamePlan(prefix="pre_")
+
+    results = list(
+        filename_manager.iter_manifest_renames([str(p) for p in listed], plan)
+    )
+
+    assert [r.status for r in results] == [filename_manager.RENAMED] * len(listed)
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        [p.with_name(f"pre_{p.name}") for p in listed] + filepaths[1::2]
+    )
+
+
+def test_iter_manifest_renames_collision(test_dir: pathlib.Path) -> None:
+    old_filepaths = collect_filepaths(test_dir)
+    target = old_filepaths[0]
+    target.with_name(f"pre_{target.name}").write_text("")
+    plan = filename_manager.RenamePlan(prefix="pre_")
+
+    with pytest.raises(FileExistsError):
+        list(filename_manager.iter_manifest_renames([str(target)], plan))
+
+    assert target.exists()
+
+
+def test_iter_manifest_renames_interleaved(tmp_path: pathlib.Path) -> None:
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}.txt").write_text("")
+    # The first file is listed again after another directory's
+    paths = [str(tmp_path / name) for name in ("a/a.txt", "b/b.txt", "a/a.txt")]
+    plan = filename_manager.RenamePlan(prefix="pre_")
+
+    with pytest.raises(FileExistsError, match="each path once"):
+        list(filename_manager.iter_manifest_renames(paths, plan))
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--processes", "2"],
+        ["--include", "*.txt"],
+        ["--ext", "txt"],
+        ["--min-size", "1"],
+    ],
+)
+def test_cli_manifest_rejects_options(
+    monkeypatch: pytest.MonkeyPatch, options: list[str]
+) -> None:
+    monkeypatch.setattr(
+        sys, "argv", ["filename-manager", "--manifest", "m", "-p", "x", *options]
+    )
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()
+
+
+def test_cli_manifest(
+    test_dir: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    filepaths = collect_filepaths(test_dir)
+    manifest = tmp_path / "manifest"
+    manifest.write_bytes(b"\0".join(os.fsencode(p) for p in filepaths))
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["filename-manager", "--manifest", str(manifest), "-0", "-s", "_SUF"],
+    )
+
+    filename_manager.main()
+
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        p.with_name(f"{p.stem}_SUF{p.suffix}") for p in filepaths
+    )
+
+
 @pytest.mark.parametrize("regex", [""])
 @pytest.mark.parametrize("sub", [""])
 def test_regex_sub(test_dir: pathlib.Path, regex: str, sub: str) -> None:
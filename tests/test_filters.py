@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import sys
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.filters import EntryFilter, FileInfo
+
+
+@pytest.mark.parametrize(
+    "name, accepted",
+    [
+        ("photo.jpg", True),
+        ("photo.JPG", False),
+        ("notes.txt", False),
+        (".jpg", False),
+        ("draft.photo.jpg", False),
+        ("IMG_1.png", True),
+    ],
+)
+def test_accepts_file(name: str, accepted: bool) -> None:
+    entry_filter = EntryFilter(
+        include=["*.jpg", "IMG_*"], exclude=["draft.*"], extensions=["jpg", ".png"]
+    )
+
+    assert entry_filter.accepts_file(name) == accepted
+
+
+def test_descends() -> None:
+    entry_filter = EntryFilter(exclude=[".git", "node_*"], max_depth=2)
+
+    assert entry_filter.descends("src", 1)
+    assert entry_filter.descends("src", 2)
+    assert not entry_filter.descends("src", 3)
+    assert not entry_filter.descends(".git", 1)
+    assert not entry_filter.descends("node_modules", 1)
+
+
+def test_bad_max_depth() -> None:
+    with pytest.raises(ValueError):
+        EntryFilter(max_depth=-1)
+
+
+def test_walk_prunes_directories(test_dir: pathlib.Path) -> None:
+    subdirs = sorted(path for path in test_dir.iterdir() if path.is_dir())
+    excluded = subdirs[0]
+    entry_filter = EntryFilter(exclude=[excluded.name], max_depth=0)
+
+    walked = {pathlib.Path(e.path) for e in filename_manager.walk_files(test_dir)}
+    filtered = {
+        pathlib.Path(e.path)
+        for e in filename_manager.walk_files(test_dir, entry_filter=entry_filter)
+    }
+
+    assert filtered == {path for path in walked if path.parent == test_dir}
+
+
+def test_filtered_renames(test_dir: pathlib.Path) -> None:
+    filepaths = collect_filepaths(test_dir)
+    ext = filepaths[0].suffix.lstrip(".")
+
+    filename_manager.modify_filenames(
+        test_dir, prefix="pre_", entry_filter=EntryFilter(extensions=[ext])
+    )
+
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        path.with_name(f"pre_{path.name}") if path.suffix == f".{ext}" else path
+        for path in filepaths
+    )
+
+
+def test_rename_onto_excluded_file(test_dir: pathlib.Path) -> None:
+    (test_dir / "a.txt").write_text("a")
+    (test_dir / "a.md").write_text("b")
+    old_filepaths = collect_filepaths(test_dir)
+
+    with pytest.raises(FileExistsError):
+        filename_manager.modify_filenames(
+            test_dir,
+            extold="txt",
+            extnew="md",
+            entry_filter=EntryFilter(extensions=["txt"], max_depth=0),
+        )
+
+    assert collect_filepaths(test_dir) == old_filepaths
+
+
+def test_cli_filters(test_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (test_dir / "root.txt").write_text("")
+    filepaths = collect_filepaths(test_dir)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["filename-manager", str(test_dir), "-p", "pre_", "--max-depth", "0"],
+    )
+
+    filename_manager.main()
+
+    assert sorted(collect_filepaths(test_dir)) == sorted(
+        path.with_name(f"pre_{path.name}") if path.parent == test_dir else path
+        for path in filepaths
+    )
+
+
+def test_accepts_info() -> None:
+    entry_filter = EntryFilter(min_size=10, max_size=100, min_age=60, max_age=3600)
+    now = entry_filter.now
+
+    assert entry_filter.uses_metadata
+    assert not EntryFilter(include=["*"]).uses_metadata
+    assert entry_filter.accepts_info(FileInfo(50, now - 600))
+    assert not entry_filter.accepts_info(FileInfo(5, now - 600))
+    assert not entry_filter.accepts_info(FileInfo(500, now - 600))
+    assert not entry_filter.accepts_info(FileInfo(50, now))
+    assert not entry_filter.accepts_info(FileInfo(50, now - 7200))
+
+
+def test_arguments_round_trip() -> None:
+    entry_filter = EntryFilter(["IMG_*"], [".git"], [".jpg"], 2, 10, 100, 60, 3600)
+
+    rebuilt = EntryFilter(**json.loads(json.dumps(entry_filter.arguments)))
+
+    assert repr(rebuilt) == repr(entry_filter)
+    assert rebuilt.now == entry_filter.now
+
+
+def test_metadata_filter(test_dir: pathlib.Path) -> None:
+    filepaths = collect_filepaths(test_dir)
+    big, old = filepaths[0], filepaths[1]
+    big.write_bytes(b"x" * 1024)
+    os.utime(old, (0, 0))
+
+    walked = {
+        pathlib.Path(e.path)
+        for e in filename_manager.walk_files(
+            test_dir, entry_filter=EntryFilter(min_size=1024)
+        )
+    }
+    assert walked == {big}
+
+    walked = {
+        pathlib.Path(e.path)
+        for e in filename_manager.walk_files(
+            test_dir, entry_filter=EntryFilter(min_age=365 * 24 * 60 * 60)
+        )
+    }
+    assert walked == {old}
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import sys
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.index import DirectoryIndex
+
+
+def run(
+    directory: pathlib.Path, index_path: pathlib.Path, prefix: str
+) -> list[filename_manager.RenameResult]:
+    plan = filename_manager.RenamePlan(prefix=prefix)
+    with DirectoryIndex(index_path, plan.fingerprint) as index:
+        return list(filename_manager.iter_renames(directory, plan, index=index))
+
+
+def test_unchanged_tree_skipped(test_dir: pathlib.Path, tmp_path: pathlib.Path) -> None:
+    index_path = tmp_path / "index.sqlite"
+    first = run(test_dir, index_path, "pre_")
+    filepaths = collect_filepaths(test_dir)
+
+    assert len(first) == len(filepaths)
+    assert run(test_dir, index_path, "pre_") == []
+    assert collect_filepaths(test_dir) == filepaths
+
+
+def test_only_new_files_renamed(test_dir: pathlib.Path, tmp_path: pathlib.Path) -> None:
+    index_path = tmp_path / "index.sqlite"
+    run(test_dir, index_path, "pre_")
+    subdir = collect_filepaths(test_dir)[0].parent
+    (subdir / "new.txt").touch()
+    # Make sure the directory's mtime differs even on coarse-grained filesystems
+    os.utime(subdir, ns=(0, 0))
+
+    second = run(test_dir, index_path, "pre_")
+
+    renamed = [r for r in second if r.old != r.new]
+    assert [(r.old, r.new) for r in renamed] == [
+        (str(subdir / "new.txt"), str(subdir / "pre_new.txt"))
+    ]
+    assert not any(
+        path.name.startswith("pre_pre_") for path in collect_filepaths(test_dir)
+    )
+
+
+def test_changed_rules_invalidate(
+    test_dir: pathlib.Path, tmp_path: pathlib.Path
+) -> None:
+    index_path = tmp_path / "index.sqlite"
+    run(test_dir, index_path, "pre_")
+
+    second = run(test_dir, index_path, "other_")
+
+    assert len(second) == len(collect_filepaths(test_dir))
+    assert all(pathlib.Path(r.new).name.startswith("other_pre_") for r in second)
+
+
+def test_late_files_renamed_next_run(tmp_path: pathlib.Path) -> None:
+    for name in ("a", "b"):
+        (tmp_path / "tree" / name).mkdir(parents=True)
+        (tmp_path / "tree" / name / f"{name}.txt").touch()
+    index_path = tmp_path / "index.sqlite"
+    plan = filename_manager.RenamePlan(prefix="pre_")
+
+    with DirectoryIndex(index_path, plan.fingerprint) as index:
+        seen: list[str] = []
+        for result in filename_manager.iter_renames(
+            tmp_path / "tree", plan, index=index
+        ):
+            directory = os.path.dirname(result.old)
+            if seen and directory != seen[0]:
+                # A file arrives in a directory already handled by this run
+                (pathlib.Path(seen[0]) / "late.txt").touch()
+                os.utime(seen[0], ns=(0, 0))
+            seen.append(directory)
+
+    second = run(tmp_path / "tree", index_path, "pre_")
+
+    assert [pathlib.Path(r.new).name for r in second if r.old != r.new] == [
+        "pre_late.txt"
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_aborted_run_keeps_finished_directories(
+    tmp_path: pathlib.Path, workers: int
+) -> None:
+    tree = tmp_path / "tree"
+    (tree / "sub").mkdir(parents=True)
+    for name in ("x.txt", "sub/a1.txt", "sub/a2.txt"):
+        (tree / name).touch()
+    index_path = tmp_path / "index.sqlite"
+    plan = filename_manager.RenamePlan(prefix="p_", regex=r"\d", sub="")
+
+    # The renames of sub collide once the top directory has been renamed
+    with DirectoryIndex(index_path, plan.fingerprint) as index:
+        with pytest.raises(FileExistsError):
+            list(
+                filename_manager.iter_renames(tree, plan, workers=workers, index=index)
+            )
+    assert (tree / "p_x.txt").exists()
+    (tree / "sub" / "a2.txt").unlink()
+
+    with DirectoryIndex(index_path, plan.fingerprint) as index:
+        list(filename_manager.iter_renames(tree, plan, workers=workers, index=index))
+
+    assert sorted(p.name for p in collect_filepaths(tree)) == ["p_a.txt", "p_x.txt"]
+
+
+def test_long_patterns_fingerprinted_whole() -> None:
+    first = filename_manager.RenamePlan(regex="a" * 300 + "b", sub="")
+    second = filename_manager.RenamePlan(regex="a" * 300 + "c", sub="")
+
+    assert first.fingerprint != second.fingerprint
+
+
+def test_template_rejected(tmp_path: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(template="{n}{ext}")
+
+    with DirectoryIndex(tmp_path / "index.sqlite", plan.fingerprint) as index:
+        with pytest.raises(ValueError):
+            list(filename_manager.iter_renames(tmp_path, plan, index=index))
+
+
+def test_cli_template_rejected(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (tmp_path / "a.txt").touch()
+    argv = ["filename-manager", str(tmp_path), "--template", "{n}{ext}"]
+    monkeypatch.setattr(sys, "argv", argv + ["--index", str(tmp_path / "i")])
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()
+
+    assert [p.name for p in tmp_path.iterdir()] == ["a.txt"]
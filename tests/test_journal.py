@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from itertools import islice
+import pathlib
+import sys
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.filters import EntryFilter
+from filename_manager.journal import Journal, resume_journal, undo_journal
+
+
+def start_job(
+    directory: pathlib.Path, journal_path: pathlib.Path
+) -> tuple[Journal, filename_manager.RenamePlan]:
+    plan = filename_manager.RenamePlan(prefix="pre_")
+    journal = Journal(journal_path, fsync_every=3)
+    journal.write_header(directory, plan)
+    return journal, plan
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_undo(test_dir: pathlib.Path, tmp_path: pathlib.Path, workers: int) -> None:
+    old_names = sorted(path.name for path in collect_filepaths(test_dir))
+    journal_path = tmp_path / "journal"
+    journal, plan = start_job(test_dir, journal_path)
+    with journal:
+        for _ in filename_manager.iter_renames(
+            test_dir, plan, workers=workers, journal=journal
+        ):
+            pass
+
+    results = list(undo_journal(journal_path))
+
+    assert len(results) == len(old_names)
+    assert all(r.status == filename_manager.RENAMED for r in results)
+    assert sorted(path.name for path in collect_filepaths(test_dir)) == old_names
+
+
+def test_resume(test_dir: pathlib.Path, tmp_path: pathlib.Path) -> None:
+    old_names = sorted(path.name for path in collect_filepaths(test_dir))
+    journal_path = tmp_path / "journal"
+    journal, plan = start_job(test_dir, journal_path)
+    with journal:
+        # Stop part way through, as if the process had died
+        results = filename_manager.iter_renames(test_dir, plan, journal=journal)
+        list(islice(results, 2))
+
+    list(resume_journal(journal_path))
+
+    assert sorted(path.name for path in collect_filepaths(test_dir)) == [
+        f"pre_{name}" for name in old_names
+    ]
+
+
+def test_undo_batches_last_first(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    directory = tmp_path / "files"
+    directory.mkdir()
+    for name in ("bba.txt", "ba.txt"):
+        (directory / name).write_text(name)
+    journal_path = str(tmp_path / "journal")
+
+    # One rename per batch, the second renaming the name the first gave out
+    argv = ["fm", str(directory), "-r", "^b", "--sub", "", "--chunk-size", "1"]
+    monkeypatch.setattr(sys, "argv", argv + ["--journal", journal_path])
+    filename_manager.main()
+    assert sorted(p.name for p in directory.iterdir()) == ["a.txt", "ba.txt"]
+
+    results = list(undo_journal(journal_path))
+
+    assert all(r.status == filename_manager.RENAMED for r in results)
+    for name in ("bba.txt", "ba.txt"):
+        assert (directory / name).read_text() == name
+
+
+@pytest.mark.parametrize("n_made", [0, 1, 2])
+def test_resume_chain(tmp_path: pathlib.Path, n_made: int) -> None:
+    for name in ("a", "b"):
+        (tmp_path / name).write_text(name)
+    renames = [
+        filename_manager.Rename(str(tmp_path), "b", "c"),
+        filename_manager.Rename(str(tmp_path), "a", "b"),
+    ]
+    journal_path = tmp_path / "journal"
+    with Journal(journal_path) as journal:
+        journal.write_header(None, filename_manager.RenamePlan(prefix="x"))
+        journal.write_batch(renames)
+    # Make some of the batch's renames before the run is interrupted
+    for rename in renames[:n_made]:
+        (tmp_path / rename.old).rename(tmp_path / rename.new)
+
+    results = list(resume_journal(journal_path))
+
+    assert [r.status for r in results] == [filename_manager.SKIPPED] * n_made + [
+        filename_manager.RENAMED
+    ] * (2 - n_made)
+    assert (tmp_path / "b").read_text() == "a"
+    assert (tmp_path / "c").read_text() == "b"
+    assert not (tmp_path / "a").exists()
+
+
+@pytest.mark.parametrize("n_made", [0, 1, 2])
+def test_undo_chain(tmp_path: pathlib.Path, n_made: int) -> None:
+    for name in ("a", "b"):
+        (tmp_path / name).write_text(name)
+    renames = [
+        filename_manager.Rename(str(tmp_path), "b", "c"),
+        filename_manager.Rename(str(tmp_path), "a", "b"),
+    ]
+    journal_path = tmp_path / "journal"
+    with Journal(journal_path) as journal:
+        journal.write_header(None, filename_manager.RenamePlan(prefix="x"))
+        journal.write_batch(renames)
+    # Make some of the batch's renames before the run is interrupted
+    for rename in renames[:n_made]:
+        (tmp_path / rename.old).rename(tmp_path / rename.new)
+
+    results = list(undo_journal(journal_path))
+
+    # Renames are undone last first
+    assert [r.status for r in results] == [filename_manager.SKIPPED] * (2 - n_made) + [
+        filename_manager.RENAMED
+    ] * n_made
+    assert (tmp_path / "a").read_text() == "a"
+    assert (tmp_path / "b").read_text() == "b"
+    assert not (tmp_path / "c").exists()
+
+
+def test_resume_template(tmp_path: pathlib.Path) -> None:
+    directory = tmp_path / "files"
+    directory.mkdir()
+    # Numbered in order, 2.txt and 3.txt keep their names
+    for name in ("0.txt", "2.txt", "3.txt"):
+        (directory / name).write_text(name)
+    journal_path = tmp_path / "journal"
+    plan = filename_manager.RenamePlan(template="{n}{ext}")
+    with Journal(journal_path) as journal:
+        journal.write_header(directory, plan)
+        list(filename_manager.iter_renames(directory, plan, journal=journal))
+
+    results = list(resume_journal(journal_path))
+
+    assert all(r.status == filename_manager.UNCHANGED for r in results)
+    assert (directory / "1.txt").read_text() == "0.txt"
+    assert (directory / "2.txt").read_text() == "2.txt"
+
+
+def test_resume_filtered(tmp_path: pathlib.Path) -> None:
+    directory = tmp_path / "files"
+    (directory / "node_modules").mkdir(parents=True)
+    for name in ("a.txt", "b.jpg", "c.txt", "node_modules/x.txt"):
+        (directory / name).write_text(name)
+    journal_path = tmp_path / "journal"
+    plan = filename_manager.RenamePlan(prefix="pre_")
+    entry_filter = EntryFilter(exclude=["node_modules"], extensions=["txt"])
+    with Journal(journal_path) as journal:
+        journal.write_header(directory, plan, entry_filter=entry_filter)
+        # Stop part way through, as if the process had died
+        results = filename_manager.iter_renames(
+            directory, plan, journal=journal, entry_filter=entry_filter
+        )
+        list(islice(results, 1))
+
+    list(resume_journal(journal_path))
+
+    assert sorted(
+        path.relative_to(directory).as_posix() for path in collect_filepaths(directory)
+    ) == sorted(["b.jpg", "node_modules/x.txt", "pre_a.txt", "pre_c.txt"])
+
+
+def test_journal_exists(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "journal").touch()
+    with pytest.raises(FileExistsError):
+        Journal(tmp_path / "journal")
+
+
+def test_cli_undo(
+    test_dir: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    old_filepaths = sorted(collect_filepaths(test_dir))
+    journal_path = str(tmp_path / "journal")
+
+    monkeypatch.setattr(
+        sys, "argv", ["fm", str(test_dir), "-s", "_x", "--journal", journal_path]
+    )
+    filename_manager.main()
+    assert sorted(collect_filepaths(test_dir)) != old_filepaths
+
+    monkeypatch.setattr(sys, "argv", ["fm", "undo", journal_path])
+    filename_manager.main()
+    assert sorted(collect_filepaths(test_dir)) == old_filepaths
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import sys
+from unittest import mock
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.memo import MemoizedPlan, RuleMemo
+from filename_manager.stats import RenameStats
+
+
+def test_least_recently_used_dropped() -> None:
+    memo = RuleMemo(size=2)
+    memo.store("f", [("a", "A"), ("b", "B")])
+
+    assert memo.lookup("f", ["a"]) == ["A"]
+    memo.store("f", [("c", "C")])
+
+    assert len(memo) == 2
+    assert memo.lookup("f", ["a", "b", "c"]) == ["A", None, "C"]
+    assert (memo.hits, memo.misses) == (3, 1)
+
+
+def test_keyed_by_fingerprint() -> None:
+    memo = RuleMemo(size=2)
+    memo.store("f", [("a", "A")])
+
+    assert memo.lookup("g", ["a"]) == [None]
+    memo.store("g", [("a", "a"), ("b", "b")])
+
+    # The least recently used rules lose their entries first
+    assert memo.lookup("f", ["a"]) == [None]
+    assert memo.lookup("g", ["a", "b"]) == ["a", "b"]
+
+
+def test_bad_size() -> None:
+    with pytest.raises(ValueError):
+        RuleMemo(0)
+
+
+def test_rules_applied_once() -> None:
+    plan = filename_manager.RenamePlan(regex=r"^IMG_", sub="", prefix="pre_")
+    stats = RenameStats()
+    memoized = MemoizedPlan(plan, RuleMemo(), stats)
+    names = ["IMG_1.jpg", "IMG_2.jpg", "x.txt"]
+    expected = plan.apply_many(names)
+    assert memoized.fingerprint == plan.fingerprint
+    assert memoized.arguments == plan.arguments
+    plan.pattern = mock.Mock(wraps=plan.pattern)
+
+    assert memoized.apply_many(names) == expected
+    assert memoized.apply_many(names[::-1]) == expected[::-1]
+    assert memoized.apply("IMG_1.jpg") == "pre_1.jpg"
+
+    assert plan.pattern.sub.call_count == 2
+    assert stats.counts["memo_hits"] == 4
+    assert stats.counts["memo_misses"] == 3
+
+
+def test_template_bypasses_memo(tmp_path: pathlib.Path) -> None:
+    memo = RuleMemo()
+    memoized = MemoizedPlan(filename_manager.RenamePlan(template="{n}{ext}"), memo)
+
+    assert memoized.apply_directory(str(tmp_path), ["b.txt", "a.txt"]) == [
+        "2.txt",
+        "1.txt",
+    ]
+    assert len(memo) == 0
+
+
+def test_save_and_load(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "memo.json"
+    memo = RuleMemo()
+    memo.store("f", [("a", "A"), ("caf\udcff", "B")])
+    memo.store("g", [("c", "C")])
+    memo.save(path)
+
+    loaded = RuleMemo.load(path)
+    assert loaded.lookup("f", ["a", "caf\udcff"]) == ["A", "B"]
+    assert loaded.lookup("g", ["c"]) == ["C"]
+
+    # Only the most recently used entries fit a smaller memo
+    smaller = RuleMemo.load(path, size=1)
+    assert smaller.lookup("g", ["c"]) == ["C"]
+    assert len(smaller) == 1
+
+
+def test_save_spares_other_files(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "memo.json"
+    (tmp_path / "memo.json.tmp").write_text("keep")
+    memo = RuleMemo()
+    memo.store("f", [("a", "A")])
+    memo.save(path)
+
+    with mock.patch("json.dump", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            memo.save(path)
+
+    assert RuleMemo.load(path).lookup("f", ["a"]) == ["A"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["memo.json", "memo.json.tmp"]
+    assert (tmp_path / "memo.json.tmp").read_text() == "keep"
+
+
+def test_load_missing_or_invalid(tmp_path: pathlib.Path) -> None:
+    assert len(RuleMemo.load(tmp_path / "missing.json")) == 0
+
+    for content in ("{", '{"format": 0}'):
+        (tmp_path / "memo.json").write_text(content)
+        with pytest.raises(ValueError):
+            RuleMemo.load(tmp_path / "memo.json")
+
+
+def test_cli_memo(
+    test_dir: pathlib.Path,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    path = tmp_path / "memo.json"
+    n_files: int = len(collect_filepaths(test_dir))
+    argv: list[str] = ["filename-manager", str(test_dir), "-p", "pre_", "--dry-run"]
+    argv += ["--memo", str(path), "--stats", "json"]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    counts: list[dict[str, int]] = []
+    for _ in range(2):
+        filename_manager.main()
+        counts.append(json.loads(capsys.readouterr().err)["counts"])
+
+    unique: int = len({p.name for p in collect_filepaths(test_dir)})
+    assert counts[0]["memo_misses"] == unique
+    assert counts[0]["memo_hits"] == n_files - unique
+    assert counts[1]["memo_hits"] == n_files
+    assert counts[1]["memo_misses"] == 0
+
+
+def test_cli_memo_rejects_processes(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    argv: list[str] = ["filename-manager", str(tmp_path), "-p", "x"]
+    argv += ["--memo", str(tmp_path / "m.json"), "--processes", "2"]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()
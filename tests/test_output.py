@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import pathlib
+import sys
+from typing import Any
+from unittest import mock
+
+import pytest
+from test_filename_manager import collect_filepaths
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.output import RecordWriter
+
+RESULTS: list[filename_manager.RenameResult] = [
+    filename_manager.RenameResult("d/a.txt", "d/pre_a.txt", filename_manager.RENAMED),
+    filename_manager.RenameResult(
+        "d/tab\tline\nback\\slash",
+        "d/café\udcff",
+        filename_manager.FAILED,
+        PermissionError("denied"),
+    ),
+]
+
+
+def write(output: str, results: list[filename_manager.RenameResult]) -> bytes:
+    file = io.BytesIO()
+    with RecordWriter(file, output) as writer:
+        for result in results:
+            writer.write(result)
+    return file.getvalue()
+
+
+def test_jsonl() -> None:
+    records = [json.loads(line) for line in write("jsonl", RESULTS).splitlines()]
+
+    assert records == [
+        {
+            "old": "d/a.txt",
+            "new": "d/pre_a.txt",
+            "status": "renamed",
+            "error": None,
+        },
+        {
+            "old": "d/tab\tline\nback\\slash",
+            "new": "d/café\udcff",
+            "status": "failed",
+            "error": "denied",
+        },
+    ]
+
+
+def test_tsv() -> None:
+    lines = write("tsv", RESULTS).split(b"\n")
+
+    assert lines == [
+        b"renamed\td/a.txt\td/pre_a.txt\t",
+        b"failed\td/tab\\tline\\nback\\\\slash\t"
+        + os.fsencode("d/café\udcff")
+        + b"\tdenied",
+        b"",
+    ]
+
+
+def test_null() -> None:
+    fields = write("null", RESULTS).split(b"\0")
+
+    assert fields[:4] == [b"renamed", b"d/a.txt", b"d/pre_a.txt", b""]
+    assert [os.fsdecode(field) for field in fields[4:8]] == [
+        "failed",
+        "d/tab\tline\nback\\slash",
+        "d/café\udcff",
+        "denied",
+    ]
+    assert fields[8:] == [b""]
+
+
+def test_writes_in_batches() -> None:
+    file = mock.Mock()
+
+    with RecordWriter(file, "jsonl", batch_size=2) as writer:
+        for result in RESULTS * 3:
+            writer.write(result)
+        assert file.write.call_count == 3
+
+    assert file.write.call_count == 3
+
+
+def test_bad_format() -> None:
+    with pytest.raises(ValueError):
+        RecordWriter(io.BytesIO(), "xml")
+
+
+@pytest.mark.parametrize(
+    "counts, aborted, status",
+    [
+        ({"renamed": 3, "unchanged": 1}, False, filename_manager.EXIT_SUCCESS),
+        ({}, False, filename_manager.EXIT_SUCCESS),
+        ({"renamed": 3, "failed": 1}, False, filename_manager.EXIT_PARTIAL),
+        ({"planned": 3}, True, filename_manager.EXIT_PARTIAL),
+        ({"failed": 1, "skipped": 2}, False, filename_manager.EXIT_FAILURE),
+        ({"unchanged": 2}, True, filename_manager.EXIT_FAILURE),
+    ],
+)
+def test_exit_status(counts: dict[str, int], aborted: bool, status: int) -> None:
+    assert filename_manager._exit_status(counts, aborted) == status
+
+
+def run_cli(monkeypatch: pytest.MonkeyPatch, *args: str) -> int:
+    monkeypatch.setattr(sys, "argv", ["filename-manager", *args])
+    return filename_manager.main()
+
+
+def test_cli_jsonl(
+    test_dir: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsysbinary: pytest.CaptureFixture[bytes],
+) -> None:
+    filepaths = collect_filepaths(test_dir)
+
+    status = run_cli(monkeypatch, str(test_dir), "-p", "pre_", "--output", "jsonl")
+
+    records = [json.loads(line) for line in capsysbinary.readouterr().out.splitlines()]
+    assert status == filename_manager.EXIT_SUCCESS
+    assert sorted(pathlib.Path(record["old"]) for record in records) == sorted(
+        filepaths
+    )
+    assert {record["status"] for record in records} == {"renamed"}
+
+
+def test_cli_partial_failure(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsysbinary: pytest.CaptureFixture[bytes],
+) -> None:
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).touch()
+    rename = os.rename
+
+    def fail_on_a(src: Any, dst: Any, *args: Any, **kwargs: Any) -> None:
+        if os.path.basename(src) == "a.txt":
+            raise PermissionError("denied")
+        rename(src, dst, *args, **kwargs)
+
+    with mock.patch("os.rename", fail_on_a), mock.patch("os.replace", fail_on_a):
+        status = run_cli(monkeypatch, str(tmp_path), "-p", "pre_", "--output", "tsv")
+
+    assert status == filename_manager.EXIT_PARTIAL
+    assert sorted(capsysbinary.readouterr().out.splitlines()) == [
+        f"failed\t{tmp_path / 'a.txt'}\t{tmp_path / 'pre_a.txt'}\tdenied".encode(),
+        f"renamed\t{tmp_path / 'b.txt'}\t{tmp_path / 'pre_b.txt'}\t".encode(),
+    ]
+
+
+def test_cli_collision_fails(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsysbinary: pytest.CaptureFixture[bytes],
+) -> None:
+    for name in ("a1.txt", "a2.txt"):
+        (tmp_path / name).touch()
+
+    status = run_cli(
+        monkeypatch, str(tmp_path), "-r", r"\d", "--sub", "", "--output", "null"
+    )
+
+    captured = capsysbinary.readouterr()
+    assert status == filename_manager.EXIT_FAILURE
+    assert captured.out == b""
+    assert b"would overwrite" in captured.err
+
+
+@pytest.mark.parametrize(
+    "files, args, message",
+    [
+        ((), ["-p", "pre_"], "No files found"),
+        (("a.txt",), ["--extold", "txt"], "missing 1 argument"),
+        (("a.txt",), ["-r", "(", "--sub", ""], "missing )"),
+        (("a.txt",), ["--rules", "{tmp}"], "Is a directory"),
+        (("a.txt",), ["-p", "x", "--index", "{tmp}/missing/i.db"], "unable to open"),
+    ],
+)
+def test_cli_invalid_run_fails(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    files: tuple[str, ...],
+    args: list[str],
+    message: str,
+) -> None:
+    for name in files:
+        (tmp_path / name).touch()
+
+    args = [arg.format(tmp=tmp_path) for arg in args]
+
+    status = run_cli(monkeypatch, str(tmp_path), *args)
+
+    assert status == filename_manager.EXIT_FAILURE
+    assert message in capsys.readouterr().out
+    assert sorted(p.name for p in tmp_path.iterdir()) == list(files)
+
+
+def test_cli_unreadable_journal_fails(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    status = run_cli(monkeypatch, "undo", str(tmp_path))
+
+    assert status == filename_manager.EXIT_FAILURE
+    assert "Is a directory" in capsys.readouterr().out
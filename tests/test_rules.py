@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import re
+import sys
+from typing import Any
+from unittest import mock
+
+import pytest
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.rules import RulePipeline, load_rules
+
+RULES: list[dict[str, str]] = [
+    {"regex": "^IMG_", "sub": ""},
+    {"case": "lower"},
+    {"extold": "jpeg", "extnew": "jpg"},
+    {"prefix": "vacation_"},
+    {"suffix": "_v2"},
+]
+
+TOML: str = """
+[[rules]]
+regex = "^IMG_"
+sub = ""
+
+[[rules]]
+case = "lower"
+
+[[rules]]
+extold = "jpeg"
+extnew = "jpg"
+
+[[rules]]
+prefix = "vacation_"
+
+[[rules]]
+suffix = "_v2"
+"""
+
+
+def test_rules_applied_in_order() -> None:
+    pipeline = RulePipeline(RULES)
+    names = ["IMG_0001.JPEG", "IMG_0002.jpeg", "Notes.TXT"]
+
+    assert pipeline.apply_many(names) == [
+        "vacation_0001_v2.jpg",
+        "vacation_0002_v2.jpg",
+        "vacation_notes_v2.txt",
+    ]
+    assert [pipeline.apply(name) for name in names] == pipeline.apply_many(names)
+
+
+@pytest.mark.parametrize("suffix", [".toml", ".json"])
+def test_load_rules(tmp_path: pathlib.Path, suffix: str) -> None:
+    path = tmp_path / f"rules{suffix}"
+    path.write_text(TOML if suffix == ".toml" else json.dumps({"rules": RULES}))
+
+    if suffix == ".toml" and sys.version_info < (3, 11):
+        pytest.importorskip("tomli")
+    pipeline = load_rules(path)
+
+    assert pipeline.rules == RULES
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["rules = 1", "[rules", '[[rules]]\nprefix = "a"\nsuffix = "b"', "x = 1"],
+)
+def test_load_invalid_file(tmp_path: pathlib.Path, content: str) -> None:
+    path = tmp_path / "rules.toml"
+    path.write_text(content)
+
+    if sys.version_info < (3, 11):
+        pytest.importorskip("tomli")
+    with pytest.raises(ValueError):
+        load_rules(path)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        [],
+        [{"regex": "a"}],
+        [{"color": "red"}],
+        [{"prefix": 1}],
+        ["prefix"],
+        [{"case": "title"}],
+        [{"regex": "(", "sub": ""}],
+        [{"prefix": "a/b"}],
+        [{"template": "{n}{ext}"}, {"template": "{stem}"}],
+    ],
+)
+def test_invalid_rules(rules: list[Any]) -> None:
+    with pytest.raises(ValueError):
+        RulePipeline(rules)
+
+
+def test_template_numbers_rule_output(tmp_path: pathlib.Path) -> None:
+    for name in ("b.TXT", "a.TXT"):
+        (tmp_path / name).touch()
+    os.utime(tmp_path / "b.TXT", (0, 0))
+    pipeline = RulePipeline(
+        [
+            {"case": "lower"},
+            {"template": "{n}_{mtime:%Y}{ext}"},
+            {"prefix": "x"},
+        ]
+    )
+
+    new_names = pipeline.apply_directory(str(tmp_path), ["b.TXT", "a.TXT"])
+
+    assert pipeline.template == "{n}_{mtime:%Y}{ext}"
+    assert new_names[0] == "x2_1970.txt"
+    assert new_names[1].startswith("x1_") and new_names[1].endswith(".txt")
+
+
+def test_arguments_round_trip() -> None:
+    pipeline = RulePipeline(RULES)
+    plan = filename_manager._plan_from_arguments(pipeline.arguments)
+
+    assert isinstance(plan, RulePipeline)
+    assert plan.rules == RULES
+    assert plan.fingerprint == pipeline.fingerprint
+    assert pipeline.fingerprint != RulePipeline(RULES[:1]).fingerprint
+
+
+def test_pipeline_in_processes(test_dir: pathlib.Path) -> None:
+    pipeline = RulePipeline([{"regex": r"^(\d+)\. ", "sub": "num_"}, {"case": "upper"}])
+
+    with mock.patch.object(filename_manager, "PROCESS_CHUNK_SIZE", 3):
+        renames = filename_manager.plan_renames(test_dir, pipeline, processes=2)
+
+    assert renames == filename_manager.plan_renames(test_dir, pipeline)
+
+
+@pytest.mark.parametrize(
+    "regex, literal",
+    [
+        ("^IMG_", "IMG_"),
+        (r"a(bc)+d", "bc"),
+        (r"(?:DSC)?_(\d+)_final", "_final"),
+        (r"\.jpe?g$", ".jp"),
+        ("foo|bar", None),
+        ("x*", None),
+        ("(?i)abc", None),
+    ],
+)
+def test_required_literal(regex: str, literal: str | None) -> None:
+    assert filename_manager._required_literal(re.compile(regex)) == literal
+
+
+def test_prefilter_skips_regex() -> None:
+    plan = filename_manager.RenamePlan(regex=r"_(\d+)_final", sub="")
+    names = ["a_1_final.txt", "b_2.txt", "c.txt"]
+    pattern = mock.Mock(wraps=plan.pattern)
+    plan.pattern = pattern
+
+    assert plan.apply_many(names) == ["a.txt", "b_2.txt", "c.txt"]
+    assert pattern.sub.call_count == 1
+    assert plan.apply("b_2.txt") == "b_2.txt"
+    assert pattern.sub.call_count == 1
+
+
+def test_cli_rules(
+    test_dir: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"prefix": "a_"}, {"prefix": "b_"}]}))
+    names = {p.name for p in test_dir.rglob("*") if p.is_file()}
+    monkeypatch.setattr(
+        sys, "argv", ["filename-manager", str(test_dir), "--rules", str(path)]
+    )
+
+    assert filename_manager.main() == filename_manager.EXIT_SUCCESS
+    assert {p.name for p in test_dir.rglob("*") if p.is_file()} == {
+        f"b_a_{name}" for name in names
+    }
+
+
+def test_cli_rules_rejects_prefix(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"prefix": "a_"}]}))
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["filename-manager", str(tmp_path), "--rules", str(path), "-p", "x"],
+    )
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()
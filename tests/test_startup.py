@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+# Modules too slow to import for a CLI run that doesn't need them
+DEFERRED: tuple[str, ...] = (
+    "asyncio",
+    "concurrent.futures",
+    "datetime",
+    "hashlib",
+    "importlib.metadata",
+    "json",
+    "multiprocessing",
+    "sqlite3",
+)
+
+
+def imported_modules(code: str) -> set[str]:
+    """Return the modules a fresh interpreter imports to run code."""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time: self [us] | cumulative | imported package"
+    return {
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+
+
+@pytest.mark.parametrize(
+    "module", ["filename_manager", "filename_manager.filename_manager"]
+)
+def test_import_defers_heavy_modules(module: str) -> None:
+    assert imported_modules(f"import {module}").isdisjoint(DEFERRED)
+
+
+def test_cli_run_defers_heavy_modules(test_dir: pathlib.Path) -> None:
+    code = (
+        "import sys\n"
+        "from filename_manager.filename_manager import main\n"
+        f"sys.argv = ['filename-manager', {str(test_dir)!r}, '-p', 'pre_', '--dry-run']\n"
+        "main()\n"
+    )
+
+    assert imported_modules(code).isdisjoint(DEFERRED)
+
+
+def test_version() -> None:
+    import filename_manager
+
+    assert filename_manager.__version__
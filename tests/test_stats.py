@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import json
+import pathlib
+
+from test_filename_manager import collect_filepaths
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.stats import PHASES, RenameStats
+
+
+def test_stats_counts(test_dir: pathlib.Path) -> None:
+    files = len(collect_filepaths(test_dir))
+    directories = sum(1 for path in test_dir.rglob("*") if path.is_dir()) + 1
+    events: list[str] = []
+    stats = RenameStats(callback=lambda phase, seconds, counts: events.append(phase))
+
+    plan = filename_manager.RenamePlan(prefix="pre_")
+    list(filename_manager.iter_renames(test_dir, plan, stats=stats))
+
+    assert stats.counts["directories"] == directories
+    assert stats.counts["rules_applied"] == files
+    assert stats.counts["renamed"] == files
+    assert stats.counts["failed"] == 0
+    assert set(events) == {"scan", "rules", "order", "rename"}
+
+
+def test_stats_output(test_dir: pathlib.Path) -> None:
+    stats = RenameStats()
+    plan = filename_manager.RenamePlan(suffix="_s")
+    list(filename_manager.iter_renames(test_dir, plan, dry_run=True, stats=stats))
+
+    assert stats.counts["planned"] == len(collect_filepaths(test_dir))
+    assert set(json.loads(stats.to_json())["seconds"]) == set(PHASES)
+    assert all(phase in stats.summary() for phase in PHASES)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+import contextlib
+import os
+import pathlib
+import sys
+import threading
+import time
+
+import pytest
+
+import filename_manager.filename_manager as filename_manager
+from filename_manager.filters import EntryFilter
+from filename_manager.watch import InotifyWatcher, watch_renames
+
+POLL_INTERVAL: float = 0.05
+
+
+@pytest.fixture(
+    params=[
+        pytest.param(
+            None,
+            id="inotify",
+            marks=pytest.mark.skipif(not InotifyWatcher.supported, reason="Linux"),
+        ),
+        pytest.param(POLL_INTERVAL, id="polling"),
+    ]
+)
+def poll_interval(request: pytest.FixtureRequest) -> float | None:
+    return request.param
+
+
+@contextlib.contextmanager
+def watching(
+    path: pathlib.Path, poll_interval: float | None, **kwargs: object
+) -> Iterator[list[filename_manager.RenameResult]]:
+    results: list[filename_manager.RenameResult] = []
+    stop = threading.Event()
+
+    def run() -> None:
+        results.extend(
+            watch_renames(
+                path,
+                filename_manager.RenamePlan(prefix="pre_"),
+                debounce=0.05,
+                poll_interval=poll_interval,
+                stop=stop,
+                **kwargs,  # type: ignore[arg-type]
+            )
+        )
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    # Let the tree's directories be watched before anything arrives
+    time.sleep(0.2)
+    try:
+        yield results
+    finally:
+        stop.set()
+        thread.join()
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline: float = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def names(path: pathlib.Path) -> set[str]:
+    return {p.relative_to(path).as_posix() for p in path.rglob("*") if p.is_file()}
+
+
+def test_arrivals_renamed(tmp_path: pathlib.Path, poll_interval: float | None) -> None:
+    (tmp_path / "old.txt").touch()
+    (tmp_path / "sub").mkdir()
+
+    with watching(tmp_path, poll_interval):
+        (tmp_path / "a.txt").write_text("a")
+        (tmp_path / "sub" / "b.txt").touch()
+        wait_for(lambda: names(tmp_path) >= {"pre_a.txt", "sub/pre_b.txt"})
+        # Give the tool's own renames time to be (not) picked up again
+        time.sleep(0.3)
+
+    assert names(tmp_path) == {"old.txt", "pre_a.txt", "sub/pre_b.txt"}
+
+
+def test_new_directories_watched(
+    tmp_path: pathlib.Path, poll_interval: float | None
+) -> None:
+    with watching(tmp_path, poll_interval):
+        (tmp_path / "new").mkdir()
+        (tmp_path / "new" / "a.txt").touch()
+        wait_for(lambda: names(tmp_path) == {"new/pre_a.txt"})
+        (tmp_path / "new" / "b.txt").touch()
+        wait_for(lambda: names(tmp_path) == {"new/pre_a.txt", "new/pre_b.txt"})
+
+
+def test_moved_in_renamed(tmp_path: pathlib.Path, poll_interval: float | None) -> None:
+    watched = tmp_path / "watched"
+    watched.mkdir()
+    (tmp_path / "a.txt").touch()
+
+    with watching(watched, poll_interval):
+        os.rename(tmp_path / "a.txt", watched / "a.txt")
+        wait_for(lambda: names(watched) == {"pre_a.txt"})
+
+
+def test_arrivals_filtered(tmp_path: pathlib.Path, poll_interval: float | None) -> None:
+    (tmp_path / ".git").mkdir()
+
+    with watching(
+        tmp_path, poll_interval, entry_filter=EntryFilter(exclude=[".git", "*.tmp"])
+    ):
+        (tmp_path / ".git" / "HEAD").touch()
+        (tmp_path / "a.tmp").touch()
+        (tmp_path / "a.txt").touch()
+        wait_for(lambda: "pre_a.txt" in names(tmp_path))
+        time.sleep(0.2)
+
+    assert names(tmp_path) == {".git/HEAD", "a.tmp", "pre_a.txt"}
+
+
+def test_collision_reported(
+    tmp_path: pathlib.Path, poll_interval: float | None
+) -> None:
+    (tmp_path / "pre_a.txt").touch()
+
+    with watching(tmp_path, poll_interval) as results:
+        (tmp_path / "a.txt").touch()
+        wait_for(lambda: bool(results))
+        (tmp_path / "b.txt").touch()
+        wait_for(lambda: "pre_b.txt" in names(tmp_path))
+
+    assert results[0].status == filename_manager.FAILED
+    assert isinstance(results[0].error, FileExistsError)
+    assert names(tmp_path) == {"a.txt", "pre_a.txt", "pre_b.txt"}
+
+
+def test_template_rejected(tmp_path: pathlib.Path) -> None:
+    plan = filename_manager.RenamePlan(template="{n}{ext}")
+
+    with pytest.raises(ValueError):
+        next(watch_renames(tmp_path, plan))
+
+
+def test_cli_watch_rejects_index(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    argv: list[str] = ["filename-manager", str(tmp_path), "-p", "x", "--watch"]
+    monkeypatch.setattr(sys, "argv", argv + ["--index", str(tmp_path / "i")])
+
+    with pytest.raises(SystemExit):
+        filename_manager.main()